@@ -1,6 +1,8 @@
 import os
 import pandas as pd
 
+from coords import fill_coordinates
+
 PROJECT_DIR = r"C:\damsafe"
 IN_CSV = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
 OUT_CSV = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset_with_coords.csv")
@@ -18,9 +20,15 @@ for col in ["Blast_Easting", "Blast_Northing"]:
     if col not in df.columns:
         df[col] = ""   # empty cells
 
+# Rows that already have one style get the other one (UTM zone picked from the data)
+df, crs, filled = fill_coordinates(df)
+
 df.to_csv(OUT_CSV, index=False)
 
-print("✅ Added coordinate columns (empty).")
+if filled:
+    print(f"✅ Added coordinate columns; converted {filled} rows ({crs}).")
+else:
+    print("✅ Added coordinate columns (empty).")
 print("Saved:", OUT_CSV)
 print("Now open this CSV and fill either Lat/Lon or Easting/Northing.")
 
@@ -0,0 +1,322 @@
+# ==========================================================
+# Benchmark harness: synthetic blast logs and DEMs at production scale
+# Times Modules 1-4, slope sampling and the raster chain and writes a JSON
+# report. peak_mb is tracemalloc (Python + NumPy only, GDAL's native buffers
+# are not traced); peak_rss_mb is the process RSS growth sampled during the
+# run. Set BASELINE_JSON to an earlier report to flag regressions.
+# ==========================================================
+
+import os
+import gc
+import json
+import time
+import platform
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from compute_modules_1_2_3 import compute_modules
+from compute_module4_dam_state import compute_module4
+from coords import DEFAULT_UTM
+from generate_demo_blast_coords import MARGIN_M, SEED, XMAX, XMIN, YMAX, YMIN
+from instrumentation import rss_mb
+from raster_output import load_gdal
+from raster_sampling import sample_points
+from terrain_engine import FINAL_OUTPUTS, compute_window_layers
+from terrain_tiles import TILE_SIZE, TILED_OPTIONS, iter_windows, run_tiled
+
+PROJECT_DIR = r"C:\damsafe"
+BENCH_DIR = os.path.join(PROJECT_DIR, "outputs", "benchmarks")
+
+# Earlier report to compare against (None = no comparison)
+BASELINE_JSON = None
+# Slower than baseline by more than this fraction → regression
+REGRESSION_TOLERANCE = 0.10
+
+# Problem sizes (trim these for a quick run)
+TABLE_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+DEM_SIZES = [1_000, 2_000, 5_000, 10_000, 20_000]      # cells per side
+SAMPLE_POINTS = 100_000                                # slope lookups per DEM size
+
+# Larger DEMs are written to a temporary GeoTIFF tile by tile and timed
+# through terrain_tiles.run_tiled; the whole-raster chain holds several
+# float64 copies of the grid (~8 GB at 10_000², ~30 GB at 20_000²)
+WHOLE_RASTER_MAX_SIDE = 5_000
+
+# RSS polling interval while a benchmark runs
+RSS_INTERVAL_S = 0.01
+
+REPEATS = 3
+
+# Synthetic DEMs cover the demo extent (XMIN..YMAX, generate_demo_blast_coords.py)
+# in the project UTM CRS, so the real dam lat/lon falls inside them
+DEM_CRS = DEFAULT_UTM
+
+
+# =========================
+# SYNTHETIC DATA
+# =========================
+def synth_blast_table(n, seed=SEED):
+    """Blast log with the dataset's columns, value ranges and demo coordinates."""
+    rng = np.random.default_rng(seed)
+    holes = rng.integers(10, 65, size=n)
+    depth = rng.uniform(2.5, 6.5, size=n)
+    charge_factor = rng.uniform(1.0, 8.0, size=n)
+    return pd.DataFrame({
+        "Burden_m": rng.uniform(1.5, 3.0, size=n),
+        "Spacing_m": rng.uniform(2.0, 4.0, size=n),
+        "Number_of_Holes": holes,
+        "Hole_Depth_m": depth,
+        "Total_Explosives_kg": holes * depth * charge_factor / 4.0,
+        "Charge_Factor_kg_per_m": charge_factor,
+        "Powder_Factor_kg_per_m3": rng.uniform(0.3, 1.2, size=n),
+        "PPV_mm_per_s": rng.uniform(2.0, 25.0, size=n),
+        "Time_to_Peak_ms": rng.uniform(5.0, 200.0, size=n),
+        "Distance_from_Dam_m": rng.uniform(50.0, 500.0, size=n),
+        "Blast_Easting": rng.uniform(XMIN + MARGIN_M, XMAX - MARGIN_M, size=n),
+        "Blast_Northing": rng.uniform(YMIN + MARGIN_M, YMAX - MARGIN_M, size=n),
+    })
+
+
+def synth_relief(n, seed=SEED):
+    """Coarse relief grid shared by every window of an n × n synthetic DEM."""
+    rng = np.random.default_rng(seed)
+    coarse = max(n // 64, 2)
+    return rng.normal(0.0, 40.0, size=(coarse, coarse)).astype("float32"), -(-n // coarse)
+
+
+def synth_dem_window(n, x0, y0, w, h, relief=None, seed=SEED):
+    """
+    Window of an n × n float32 terrain over the demo extent: a regional tilt
+    plus smooth relief (coarse noise upsampled) plus fine noise. Any window
+    can be generated on its own, so large DEMs never exist in memory whole.
+    """
+    relief, reps = relief or synth_relief(n, seed)
+    rows, cols = np.arange(y0, y0 + h) // reps, np.arange(x0, x0 + w) // reps
+    dem = relief[rows[:, None], cols[None, :]]
+    dem += np.linspace(150.0, 400.0, n, dtype="float32")[None, x0:x0 + w]
+    rng = np.random.default_rng([seed, y0, x0])
+    dem += rng.normal(0.0, 0.5, size=(h, w)).astype("float32")
+    return dem
+
+
+def dem_geotransform(n):
+    return (XMIN, (XMAX - XMIN) / n, 0.0, YMAX, 0.0, -(YMAX - YMIN) / n)
+
+
+def synth_dem(n, seed=SEED):
+    """Whole n × n synthetic DEM. Returns (dem, geotransform)."""
+    return synth_dem_window(n, 0, 0, n, n, seed=seed), dem_geotransform(n)
+
+
+def write_synth_dem(path, n, tile=TILE_SIZE, seed=SEED):
+    """Write an n × n synthetic DEM to a tiled GeoTIFF one window at a time."""
+    from osgeo import osr
+
+    relief = synth_relief(n, seed)
+    options = TILED_OPTIONS + [f"BLOCKXSIZE={tile}", f"BLOCKYSIZE={tile}"]
+    gdal = load_gdal()
+    ds = gdal.GetDriverByName("GTiff").Create(path, n, n, 1, gdal.GDT_Float32, options=options)
+    ds.SetGeoTransform(dem_geotransform(n))
+    srs = osr.SpatialReference()
+    srs.SetFromUserInput(DEM_CRS)
+    ds.SetProjection(srs.ExportToWkt())
+    band = ds.GetRasterBand(1)
+    for x0, y0, w, h in iter_windows(n, n, tile):
+        band.WriteArray(synth_dem_window(n, x0, y0, w, h, relief, seed), x0, y0)
+    ds.FlushCache()
+    ds = None
+
+
+def mem_raster(arr, gt):
+    """In-memory GDAL dataset holding `arr` (no disk I/O in the timings)."""
+    gdal = load_gdal()
+    ds = gdal.GetDriverByName("MEM").Create("", arr.shape[1], arr.shape[0], 1, gdal.GDT_Float32)
+    ds.SetGeoTransform(gt)
+    ds.GetRasterBand(1).WriteArray(arr)
+    return ds
+
+
+# =========================
+# MEASUREMENT
+# =========================
+class RssSampler:
+    """Polls the process RSS on a thread and keeps the highest value seen."""
+
+    def __init__(self, interval=RSS_INTERVAL_S):
+        self.interval = interval
+        self.start_mb = self.peak_mb = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def __enter__(self):
+        if self.start_mb is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start_mb is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def growth_mb(self):
+        return None if self.start_mb is None else self.peak_mb - self.start_mb
+
+
+def measure(fn, repeats=REPEATS):
+    """Best wall time over `repeats`, and the peak traced memory and RSS growth (MB) of the first run."""
+    times = []
+    peak = rss = None
+    for i in range(repeats):
+        gc.collect()
+        if i == 0:
+            tracemalloc.start()
+            with RssSampler() as sampler:
+                t0 = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - t0)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rss = sampler.growth_mb()
+        else:
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+    return min(times), peak / 1024 ** 2, rss
+
+
+def record(results, bench, size, units, fn):
+    seconds, peak_mb, rss_growth_mb = measure(fn)
+    row = {
+        "bench": bench,
+        "size": int(size),
+        "units": units,
+        "seconds": seconds,
+        "peak_mb": peak_mb,
+        "peak_rss_mb": rss_growth_mb,
+        "throughput_per_s": size / seconds if seconds > 0 else None,
+    }
+    results.append(row)
+    rss = f"{rss_growth_mb:9.1f} MB RSS" if rss_growth_mb is not None else "      n/a RSS"
+    print(f"  {bench:<16} {size:>12,} {units:<6} {seconds:9.4f} s  {peak_mb:9.1f} MB  {rss}")
+    return row
+
+
+def run_table_benchmarks(results, sizes=TABLE_SIZES):
+    for n in sizes:
+        df = synth_blast_table(n)
+        record(results, "modules_1_2_3", n, "rows", lambda: compute_modules(df.copy()))
+        m123 = compute_modules(df.copy())
+        record(results, "module4", n, "rows", lambda: compute_module4(m123[["SDI"]].copy()))
+        df = m123 = None
+
+
+def run_raster_benchmarks(results, sizes=DEM_SIZES, n_points=SAMPLE_POINTS):
+    rng = np.random.default_rng(SEED)
+    xs = rng.uniform(XMIN + MARGIN_M, XMAX - MARGIN_M, size=n_points)
+    ys = rng.uniform(YMIN + MARGIN_M, YMAX - MARGIN_M, size=n_points)
+
+    for n in sizes:
+        if n > WHOLE_RASTER_MAX_SIDE:
+            run_tiled_benchmark(results, n, xs, ys)
+            continue
+        dem, gt = synth_dem(n)
+        dam_rc = (n // 2, n // 2)
+        record(results, "raster_chain", n * n, "pixels", lambda: compute_window_layers(dem, gt, dam_rc))
+
+        ds = mem_raster(dem, gt)
+        record(results, "slope_sampling", n_points, "points",
+               lambda: sample_points(ds, xs, ys, method="nearest"))
+        record(results, "slope_bilinear", n_points, "points",
+               lambda: sample_points(ds, xs, ys, method="bilinear"))
+        ds = dem = None
+
+
+def run_tiled_benchmark(results, n, xs, ys, tile=TILE_SIZE):
+    """Raster chain and sampling for a DEM too large to hold whole, from a temporary GeoTIFF."""
+    with tempfile.TemporaryDirectory(dir=BENCH_DIR) as tmp:
+        dem_path = os.path.join(tmp, "dem.tif")
+        write_synth_dem(dem_path, n, tile)
+        record(results, "raster_chain_tiled", n * n, "pixels",
+               lambda: run_tiled(dem_path, os.path.join(tmp, "out"), names=list(FINAL_OUTPUTS), tile=tile))
+
+        ds = load_gdal().Open(dem_path)
+        record(results, "slope_sampling", len(xs), "points",
+               lambda: sample_points(ds, xs, ys, method="nearest"))
+        record(results, "slope_bilinear", len(xs), "points",
+               lambda: sample_points(ds, xs, ys, method="bilinear"))
+        ds = None
+
+
+# =========================
+# REPORT
+# =========================
+def compare(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Rows of (bench, size, baseline s, current s, ratio) slower than tolerance."""
+    base = {(r["bench"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["bench"], r["size"]))
+        if b and b["seconds"] > 0:
+            ratio = r["seconds"] / b["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append((r["bench"], r["size"], b["seconds"], r["seconds"], ratio))
+    return regressions
+
+
+def main():
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    results = []
+    print("Table benchmarks (Modules 1-4):")
+    run_table_benchmarks(results)
+    print("Raster benchmarks (slope sampling, raster chain):")
+    run_raster_benchmarks(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "gdal": load_gdal().__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "repeats": REPEATS,
+            "seed": SEED,
+        },
+        "results": results,
+    }
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    out_json = os.path.join(BENCH_DIR, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(out_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n✅ Benchmarks completed.")
+    print("Saved:", out_json)
+
+    if BASELINE_JSON:
+        with open(BASELINE_JSON, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} regression(s) vs", BASELINE_JSON)
+            for bench, size, old, new, ratio in regressions:
+                print(f"   {bench:<16} {size:>12,}  {old:.4f} s → {new:.4f} s  (x{ratio:.2f})")
+        else:
+            print("\n✅ No regressions vs", BASELINE_JSON)
+
+
+if __name__ == "__main__":
+    main()
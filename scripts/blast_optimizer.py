@@ -0,0 +1,284 @@
+# ==========================================================
+# Maximum safe charge per location
+# Largest Total_Explosives_kg whose next blast keeps SDI below the Module 2
+# limit (and, with RESPECT_M4, keeps Module 4 from "Failed"), starting from
+# the sdi_state.py checkpoint. Solved by bisection on [W_MIN_KG, W_MAX_KG].
+# Outputs: max_charge_kg.tif, max_charge_binding.tif,
+#          max_safe_charge.csv (if CANDIDATES_CSV exists)
+# ==========================================================
+
+import os
+import math
+import numpy as np
+import pandas as pd
+
+import sdi_state
+from compute_modules_1_2_3 import (
+    CSV_PATH, SDI_GAIN, Tsafe, Twarn, W_CHARGE, W_DIST, W_PPV, norm_stats, prepare_inputs,
+)
+from compute_module4_dam_state import FAILURE_PERSISTENCE, SDI_WARNING
+from instrumentation import stage
+from raster_sampling import ArrayGrid, inv_geotransform, sample_grid
+from sdi_timeline import DECAY, DEFAULT_DT
+from terrain_engine import (
+    DEM_PATH, OUT_DIR, dam_point_in_dem, distance_to_cell, ppv_from_distance, read_dem, site_law_params,
+    warn_dam_outside, world_to_cell, write_raster,
+)
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+# Points to evaluate (Blast_Easting/Blast_Northing, or Distance_from_Dam_m)
+CANDIDATES_CSV = os.path.join(PROJECT_DIR, "data", "candidate_blasts.csv")
+OUT_CSV = os.path.join(PROJECT_DIR, "outputs", "tables", "max_safe_charge.csv")
+OUT_TIF = os.path.join(OUT_DIR, "max_charge_kg.tif")
+# Which limit sets each cell's charge (BINDING_LABELS codes)
+OUT_BINDING_TIF = os.path.join(OUT_DIR, "max_charge_binding.tif")
+
+# Distance raster on the DEM grid (e.g. cost_distance.tif from cost_distance.py);
+# None = straight-line distance to the dam cell
+DIST_TIF = None
+
+# Blast design: fixed hole depth and charge per hole → Number_of_Holes = W / charge per hole.
+# Set HOLES to fix the hole count instead (charge factor then grows with W).
+HOLE_DEPTH_M = 5.0
+CHARGE_PER_HOLE_KG = 5.0
+HOLES = None
+
+# Search range and precision
+W_MIN_KG = 1.0
+W_MAX_KG = 1000.0
+TOL_KG = 0.1
+
+# SDI must stay below Tsafe ("safe") or Twarn ("warn") after the blast
+LIMIT = "safe"
+# Also keep a blast from completing a Module 4 FAILURE_PERSISTENCE run, by
+# capping SDI at SDI_WARNING. Mind the scales: Module 4 compares the same
+# cumulative SDI against 0.30 / 0.60 while Module 2 uses Tsafe / Twarn =
+# 50 / 120, so once SDI passes 0.60 every blast is an exceedance and this
+# cap binds long before Tsafe does (as in the baseline Module 4 table).
+RESPECT_M4 = True
+
+# Time since the last blast, in TIME_UNIT (compute_modules uses 1 without timestamps)
+PLAN_DELTA_T = DEFAULT_DT
+
+# Cells solved per block
+BLOCK_CELLS = 1 << 20
+
+# Binding constraint codes (0 = no data)
+BINDING_LABELS = np.array(["none", "W_MAX_KG", "Tsafe", "Twarn", "M4_persistence"])
+
+
+# =========================
+# CURRENT STATE
+# =========================
+def current_state():
+    """(norm stats, SDI now, Module 4 failure counter) from the checkpoint, or a fresh start."""
+    state = sdi_state.load_state()
+    if state is not None:
+        return state["norm_stats"], state["last_sdi"], state["failure_counter"]
+    # No checkpoint yet: normalize like a full run over the blast log
+    return norm_stats(prepare_inputs(pd.read_csv(CSV_PATH))), 0.0, 0
+
+
+# =========================
+# PPV → BVII → SDI CHAIN
+# =========================
+def _norm(x, bounds):
+    """compute_modules.minmax on arrays: clipped to 0..1, zero for an empty range."""
+    lo, hi = bounds
+    if hi - lo == 0:
+        return np.zeros_like(x)
+    return np.clip((x - lo) / (hi - lo), 0.0, 1.0)
+
+
+def charge_factor(w, hole_depth=HOLE_DEPTH_M, charge_per_hole=CHARGE_PER_HOLE_KG, holes=HOLES):
+    """Charge_Factor_kg_per_m of a blast of total charge w under the design."""
+    if holes is not None:
+        return w / (holes * hole_depth)
+    return np.full_like(w, charge_per_hole / hole_depth)
+
+
+def sdi_after(w, dist, stats, sdi0=0.0, delta_t=PLAN_DELTA_T, decay=DECAY, design=None, law=None):
+    """
+    SDI right after one blast of charge w at distance dist (arrays broadcast).
+    law: (K, alpha); None = site_law_params().
+    """
+    design = design or {}
+    K, alpha = law or site_law_params()
+    w, dist = np.broadcast_arrays(np.asarray(w, dtype=float), np.asarray(dist, dtype=float))
+    ppv = ppv_from_distance(dist, W=w, K=K, alpha=alpha)
+    bvii = W_PPV * _norm(ppv, stats["PPV_mm_per_s"])
+    bvii += W_DIST * (1.0 - _norm(dist, stats["Distance_from_Dam_m"]))
+    if "Charge_Factor_kg_per_m" in stats:
+        bvii += W_CHARGE * _norm(charge_factor(w, **design), stats["Charge_Factor_kg_per_m"])
+    return carried_sdi(sdi0, delta_t, decay) + SDI_GAIN * bvii * delta_t
+
+
+def carried_sdi(sdi0, delta_t=PLAN_DELTA_T, decay=DECAY):
+    """SDI left from earlier blasts when the next one fires (no blast of its own)."""
+    return sdi0 * math.exp(-decay * delta_t) if decay else sdi0
+
+
+def sdi_cap(failure_counter=0, limit=LIMIT, respect_m4=RESPECT_M4):
+    """
+    SDI the next blast must stay below: the Module 2 limit, and the Module 4
+    warning threshold when one more exceedance would complete a
+    FAILURE_PERSISTENCE run (the only way a single blast turns M4 "Failed").
+    SDI_WARNING is on Module 4's 0..1 scale (see RESPECT_M4).
+    """
+    return binding_cap(failure_counter, limit, respect_m4)[0]
+
+
+def binding_cap(failure_counter=0, limit=LIMIT, respect_m4=RESPECT_M4):
+    """(sdi_cap, name of the constraint that sets it: "Tsafe", "Twarn" or "M4_persistence")."""
+    cap, name = (Tsafe, "Tsafe") if limit == "safe" else (Twarn, "Twarn")
+    if respect_m4 and failure_counter + 1 >= FAILURE_PERSISTENCE and SDI_WARNING < cap:
+        cap, name = SDI_WARNING, "M4_persistence"
+    return cap, name
+
+
+def check_state(sdi0, failure_counter=0, delta_t=PLAN_DELTA_T, decay=DECAY, **limits):
+    """
+    Raise ValueError when the carried-in SDI alone already reaches the cap:
+    then no charge is allowed anywhere and every cell would come out 0.
+    """
+    cap, name = binding_cap(failure_counter, **limits)
+    carried = carried_sdi(sdi0, delta_t, decay)
+    if carried >= cap:
+        hint = (f"Module 4 SDI_WARNING: the next exceedance would complete a {FAILURE_PERSISTENCE}-event run"
+                if name == "M4_persistence" else "Module 2 limit")
+        raise ValueError(
+            f"Carried-in SDI {carried:.4g} already reaches the {name} cap ({cap:g}); "
+            f"no blast size is allowed anywhere ({hint}).")
+
+
+def binding_codes(dist, w, w_max=W_MAX_KG, failure_counter=0, **limits):
+    """
+    Per-cell BINDING_LABELS code: W_MAX_KG where the search bound is allowed,
+    otherwise the SDI cap that stops the charge; 0 where dist is unknown.
+    """
+    name = binding_cap(failure_counter, **limits)[1]
+    code = int(np.flatnonzero(BINDING_LABELS == name)[0])
+    out = np.where(np.asarray(w) >= w_max, 1, code).astype(np.uint8)
+    out[~(np.asarray(dist, dtype=float) > 0)] = 0
+    return out
+
+
+def max_safe_charge(dist, stats, sdi0=0.0, failure_counter=0, w_min=W_MIN_KG, w_max=W_MAX_KG,
+                    tol=TOL_KG, design=None, law=None, **limits):
+    """
+    Largest allowed charge (kg) for every distance in `dist`, to within tol.
+    0 where even w_min is not allowed, w_max where w_max is; NaN where the
+    distance is unknown or zero (the dam itself).
+    """
+    dist = np.asarray(dist, dtype=float)
+    cap = sdi_cap(failure_counter, **limits)
+    law = law or site_law_params()
+
+    def ok(w):
+        return sdi_after(w, dist, stats, sdi0, design=design, law=law) < cap
+
+    lo = np.full(dist.shape, float(w_min))
+    hi = np.full(dist.shape, float(w_max))
+    ok_lo, ok_hi = ok(lo), ok(hi)
+
+    # Invariant: lo allowed, hi not (only meaningful where ok_lo & ~ok_hi)
+    for _ in range(max(int(math.ceil(math.log2((w_max - w_min) / tol))), 0)):
+        mid = 0.5 * (lo + hi)
+        good = ok(mid)
+        lo = np.where(good, mid, lo)
+        hi = np.where(good, hi, mid)
+
+    out = np.where(ok_hi, w_max, np.where(ok_lo, lo, 0.0))
+    out[~(dist > 0)] = np.nan
+    return out
+
+
+def solve_blocks(dist, stats, sdi0, failure_counter, block=BLOCK_CELLS, law=None):
+    """max_safe_charge over a large array, BLOCK_CELLS cells at a time."""
+    law = law or site_law_params()
+    flat = dist.ravel()
+    out = np.empty(flat.shape)
+    for i in range(0, flat.size, block):
+        out[i:i + block] = max_safe_charge(flat[i:i + block], stats, sdi0, failure_counter, law=law)
+    return out.reshape(dist.shape)
+
+
+def design_table(dist, w_max, stats, sdi0, law=None):
+    """
+    Max_Charge_kg with its hole count and the PPV / SDI a blast of that size
+    gives. With CHARGE_PER_HOLE_KG per hole the charge is rounded down to
+    whole holes, so the reported blast can actually be loaded.
+    """
+    K, alpha = law = law or site_law_params()
+    dist, w_max = np.broadcast_arrays(np.asarray(dist, dtype=float), np.asarray(w_max, dtype=float))
+    if HOLES is not None:
+        holes = np.full(w_max.shape, float(HOLES))
+    else:
+        holes = np.floor(w_max / CHARGE_PER_HOLE_KG)
+        w_max = holes * CHARGE_PER_HOLE_KG
+    w = np.where(w_max > 0, w_max, np.nan)
+    ppv = ppv_from_distance(dist, W=w, K=K, alpha=alpha)
+    return pd.DataFrame({
+        "Max_Charge_kg": w_max,
+        "Max_Holes": holes,
+        "PPV_at_Max_mm_per_s": ppv,
+        "SDI_at_Max": sdi_after(w, dist, stats, sdi0, law=law),
+    })
+
+
+# =========================
+# MAIN
+# =========================
+def main():
+    if not os.path.exists(DEM_PATH):
+        raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    stats, sdi0, failure_counter = current_state()
+    check_state(sdi0, failure_counter)
+    law = site_law_params()
+
+    dem, gt, proj = read_dem(DEM_PATH)
+    if DIST_TIF:
+        dist = read_dem(DIST_TIF)[0]
+    else:
+        x, y, dam_inside = dam_point_in_dem(gt, dem.shape, proj)
+        warn_dam_outside(dam_inside)
+        dist = distance_to_cell(dem.shape, gt, *world_to_cell(gt, x, y, dem.shape))
+        dist[np.isnan(dem)] = np.nan
+
+    with stage("blast_optimizer.max_safe_charge", items=dist.size, unit="cells"):
+        w_max = solve_blocks(dist, stats, sdi0, failure_counter, law=law)
+    write_raster(OUT_TIF, w_max, gt, proj)
+    binding = binding_codes(dist, w_max, failure_counter=failure_counter)
+    write_raster(OUT_BINDING_TIF, np.where(binding > 0, binding, np.nan), gt, proj)
+
+    cap, name = binding_cap(failure_counter)
+    print(f"✅ Max safe charge computed from SDI {sdi0:.4f} (failure counter {failure_counter}, "
+          f"cap {cap:g} from {name}).")
+    print("Saved:", OUT_TIF)
+    print("Saved:", OUT_BINDING_TIF, "(codes:", ", ".join(f"{i} = {s}" for i, s in enumerate(BINDING_LABELS)) + ")")
+    n_zero = int(np.sum(w_max == 0))
+    if n_zero:
+        print(f"   {n_zero} cell(s) allow no blast at all (even {W_MIN_KG:g} kg exceeds the limit).")
+
+    if os.path.exists(CANDIDATES_CSV):
+        cand = pd.read_csv(CANDIDATES_CSV)
+        if "Distance_from_Dam_m" in cand.columns:
+            d = cand["Distance_from_Dam_m"].to_numpy(float)
+        else:
+            d = sample_grid(ArrayGrid(dist), inv_geotransform(gt),
+                            cand["Blast_Easting"].to_numpy(float), cand["Blast_Northing"].to_numpy(float))
+        w = max_safe_charge(d, stats, sdi0, failure_counter, law=law)
+        out = pd.concat([cand.reset_index(drop=True), design_table(d, w, stats, sdi0, law)], axis=1)
+        out["Binding_Constraint"] = BINDING_LABELS[binding_codes(d, w, failure_counter=failure_counter)]
+        os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
+        out.to_csv(OUT_CSV, index=False)
+        print("Saved:", OUT_CSV)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,111 @@
-import pandas as pd
+import numpy as np
 from pathlib import Path
 
+from instrumentation import stage
+from table_io import stage_inputs, write_stage
+
 # ---------------- CONFIG ----------------
 PROJDIR = Path(r"C:\damsafe")
 INPUT_CSV = PROJDIR / "outputs" / "tables" / "modules_1_2_3_outputs.csv"
 OUTPUT_CSV = PROJDIR / "outputs" / "tables" / "module4_dam_state.csv"
+# With a .parquet OUTPUT_CSV only Blast_Row + SDI are read and only Blast_Row +
+# the Module 4 columns are written (join on Blast_Row, no duplicated columns)
 
 # SDI thresholds
 SDI_SAFE = 0.30
 SDI_WARNING = 0.60
 FAILURE_PERSISTENCE = 3   # consecutive events
 
-# ---------------- LOAD DATA ----------------
-df = pd.read_csv(INPUT_CSV)
-
-if "SDI" not in df.columns:
-    raise ValueError("SDI column not found. Run Module 2 first.")
+# State codes used by the vectorized classifier
+INTACT, DAMAGED, FAILED = 0, 1, 2
+STATE_LABELS = np.array(["Intact", "Damaged", "Failed"])
 
 # ---------------- DAM STATE COMPUTATION ----------------
-states = []
-failure_counter = 0
+def dam_state_codes(sdi, failure_counter=0, safe=SDI_SAFE, warning=SDI_WARNING,
+                    persistence=FAILURE_PERSISTENCE):
+    """
+    Vectorized Module 4 classifier.
+
+    sdi: 1-D (events) or 2-D (events × dams/channels) array in event order.
+    failure_counter: consecutive exceedances carried in from earlier events
+    (scalar, or one per channel).
+    safe / warning / persistence default to the module thresholds; for
+    2-D input they may also be one value per channel (sensitivity sweeps).
+    An event at or above `warning` extends the current exceedance run; the
+    run length comes from a running maximum of the last reset index instead
+    of a Python loop. Returns (int8 state codes, failure_counter after the
+    last event).
+    """
+    sdi = np.asarray(sdi, dtype=float)
+    n = sdi.shape[0]
+    counter0 = np.asarray(failure_counter, dtype=np.int64)
+
+    # NaN falls through both comparisons in the original loop → counts as exceedance
+    exceed = ~(sdi < warning)
+
+    idx = np.arange(n).reshape((n,) + (1,) * (sdi.ndim - 1))
+    last_reset = np.maximum.accumulate(np.where(exceed, -1, idx), axis=0)
+    run = idx - last_reset + np.where(last_reset < 0, counter0, 0)
+    run = np.where(exceed, run, 0)
+
+    codes = np.where(sdi < safe, INTACT, DAMAGED).astype(np.int8)
+    codes[exceed & (run >= persistence)] = FAILED
+
+    counter = run[-1] if n else np.broadcast_to(counter0, sdi.shape[1:]).copy()
+    return codes, (int(counter) if np.ndim(counter) == 0 else counter)
+
+
+def state_transitions(codes):
+    """
+    Indices where the state changes from the previous event.
+    1-D codes → event indices; 2-D → (event indices, channel indices).
+    """
+    codes = np.asarray(codes)
+    changed = codes[1:] != codes[:-1]
+    hits = np.nonzero(changed)
+    return (hits[0] + 1,) + hits[1:] if codes.ndim > 1 else hits[0] + 1
+
+
+def classify_dam_state_m4(sdi_values, failure_counter=0):
+    """
+    Module 4 states for a sequence of SDI values.
+    failure_counter carries the consecutive-exceedance count from earlier
+    events. Returns (states, failure_flags, failure_counter).
+    """
+    codes, failure_counter = dam_state_codes(sdi_values, failure_counter)
+    return STATE_LABELS[codes], (codes == FAILED).astype(int), failure_counter
+
+
+def compute_module4(df, failure_counter=0):
+    """Add Dam_State_M4 / Failure_Flag_M4 to df. Returns (df, failure_counter)."""
+    if "SDI" not in df.columns:
+        raise ValueError("SDI column not found. Run Module 2 first.")
+
+    states, flags, failure_counter = classify_dam_state_m4(df["SDI"], failure_counter)
+    df["Dam_State_M4"] = states
+    df["Failure_Flag_M4"] = flags
+    return df, failure_counter
 
-for sdi in df["SDI"]:
-    if sdi < SDI_SAFE:
-        states.append("Intact")
-        failure_counter = 0
 
-    elif SDI_SAFE <= sdi < SDI_WARNING:
-        states.append("Damaged")
-        failure_counter = 0
+def main():
+    # ---------------- LOAD DATA ----------------
+    with stage("compute_module4_dam_state.csv_load") as rec:
+        df = stage_inputs(str(INPUT_CSV), "module4", str(OUTPUT_CSV))
+        rec["items"] = len(df)
 
-    else:
-        failure_counter += 1
-        if failure_counter >= FAILURE_PERSISTENCE:
-            states.append("Failed")
-        else:
-            states.append("Damaged")
+    with stage("compute_module4_dam_state.dam_state_m4", items=len(df)):
+        df, _ = compute_module4(df)
 
-df["Dam_State_M4"] = states
-df["Failure_Flag_M4"] = df["Dam_State_M4"].apply(lambda x: 1 if x == "Failed" else 0)
+    # ---------------- SAVE ----------------
+    OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
+    with stage("compute_module4_dam_state.write", items=len(df)):
+        write_stage(df, str(OUTPUT_CSV), "module4")
 
-# ---------------- SAVE ----------------
-OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-df.to_csv(OUTPUT_CSV, index=False)
+    print("✅ Module 4 completed: Dam State computed")
+    print("Saved:", OUTPUT_CSV)
+    print("\nPreview:")
+    print(df[["SDI", "Dam_State_M4", "Failure_Flag_M4"]].head(10))
 
-print("✅ Module 4 completed: Dam State computed")
-print("Saved:", OUTPUT_CSV)
-print("\nPreview:")
-print(df[["SDI", "Dam_State_M4", "Failure_Flag_M4"]].head(10))
 
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,18 @@ import os
 import numpy as np
 import pandas as pd
 
+from instrumentation import stage
+from sdi_timeline import TIME_COL, DECAY, decayed_cumsum, order_by_time, real_delta_t, time_values
+from table_io import stage_inputs, write_stage
+
 # =========================
 # CONFIG
 # =========================
 PROJECT_DIR = r"C:\damsafe"
 CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
 OUT_DIR = os.path.join(PROJECT_DIR, "outputs", "tables")
-os.makedirs(OUT_DIR, exist_ok=True)
 
+# Use a .parquet path for columnar output (see table_io.py)
 OUT_CSV = os.path.join(OUT_DIR, "modules_1_2_3_outputs.csv")
 
 # ---- Weights (tune later) ----
@@ -29,101 +33,163 @@ W_RDI_SLOPE = 0.15
 # If you don't have slope per blast yet, use a constant (degrees)
 DEFAULT_SLOPE_DEG = 10.0
 
+# Threshold-based dam state (edit thresholds later)
+Tsafe, Twarn, Tcrit = 50, 120, 200
+
+# Input columns that get min-max normalized
+NORM_COLUMNS = ["PPV_mm_per_s", "Distance_from_Dam_m", "Charge_Factor_kg_per_m", "Slope_deg"]
+
 # =========================
 # HELPERS
 # =========================
-def minmax(series: pd.Series, clip=True) -> pd.Series:
-    """Min-max normalize to 0..1 safely."""
+def minmax(series: pd.Series, clip=True, bounds=None) -> pd.Series:
+    """Min-max normalize to 0..1 safely. bounds=(min, max) overrides the column's own range."""
     s = series.astype(float)
-    mn, mx = np.nanmin(s), np.nanmax(s)
+    mn, mx = bounds if bounds is not None else (np.nanmin(s), np.nanmax(s))
     if mx - mn == 0:
         out = pd.Series(np.zeros(len(s)), index=s.index)
     else:
         out = (s - mn) / (mx - mn)
     return out.clip(0, 1) if clip else out
 
-def inv_distance_norm(dist_m: pd.Series) -> pd.Series:
+def inv_distance_norm(dist_m: pd.Series, bounds=None) -> pd.Series:
     """Convert distance to 'risk' (closer = higher), normalized 0..1."""
-    d_norm = minmax(dist_m)
+    d_norm = minmax(dist_m, bounds=bounds)
     return 1.0 - d_norm
 
+def norm_stats(df: pd.DataFrame) -> dict:
+    """(min, max) of every normalized input column present in df."""
+    return {
+        c: (float(np.nanmin(df[c].astype(float))), float(np.nanmax(df[c].astype(float))))
+        for c in NORM_COLUMNS if c in df.columns
+    }
+
+def prepare_inputs(df: pd.DataFrame) -> pd.DataFrame:
+    """Check required columns and add the demo slope column if missing."""
+    # ---- Basic checks (your dataset uses these names) ----
+    required = ["PPV_mm_per_s", "Distance_from_Dam_m"]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns in CSV: {missing}")
+
+    # If slope not present, create a demo slope column
+    # (you can add it later after sampling from raster)
+    if "Slope_deg" not in df.columns:
+        df["Slope_deg"] = DEFAULT_SLOPE_DEG
+    return df
+
+def compute_modules(df: pd.DataFrame, stats=None, sdi0=0.0, t0=None, decay=DECAY) -> pd.DataFrame:
+    """
+    Modules 1-3 on a blast table (in place, returned for chaining; with a
+    TIME_COL column the returned table is sorted by blast time).
+
+    stats: {column: (min, max)} used for normalization; defaults to the
+    table's own ranges. sdi0: SDI carried in from earlier blasts, t0: time
+    of the last of them. decay: SDI recovery rate (see sdi_timeline.py).
+    """
+    n = len(df)
+    df = prepare_inputs(df)
+    has_time = TIME_COL in df.columns
+    if has_time:
+        df = order_by_time(df)
+    if stats is None:
+        stats = norm_stats(df)
+
+    # Optional features
+    has_charge = "Charge_Factor_kg_per_m" in df.columns and "Charge_Factor_kg_per_m" in stats
+
+    with stage("compute_modules_1_2_3.normalization", items=n):
+        ppv_n = minmax(df["PPV_mm_per_s"], bounds=stats["PPV_mm_per_s"])
+        dist_risk = inv_distance_norm(df["Distance_from_Dam_m"], bounds=stats["Distance_from_Dam_m"])
+
+        if has_charge:
+            charge_n = minmax(df["Charge_Factor_kg_per_m"], bounds=stats["Charge_Factor_kg_per_m"])
+        else:
+            charge_n = 0.0  # if missing, contributes nothing
+
+        slope_n = minmax(df["Slope_deg"], bounds=stats["Slope_deg"])
+
+    # -------------------------
+    # MODULE 1: BVII
+    # -------------------------
+    with stage("compute_modules_1_2_3.bvii", items=n):
+        df["BVII"] = (W_PPV * ppv_n) + (W_DIST * dist_risk) + (W_CHARGE * charge_n)
+
+    # Optional label
+    with stage("compute_modules_1_2_3.bvii_labels", items=n):
+        df["BVII_Level"] = pd.cut(
+            df["BVII"],
+            bins=[-0.01, 0.33, 0.66, 1.01],
+            labels=["Low", "Moderate", "High"]
+        )
+
+    # -------------------------
+    # MODULE 2: SDI (cumulative damage)
+    # -------------------------
+    # With real timestamps (TIME_COL) blasts are in time order and Delta_t is
+    # the gap to the previous blast; otherwise row order is blast order.
+    if has_time:
+        # Missing times inherit the previous blast's time (they sort last)
+        t = np.fmax.accumulate(time_values(df[TIME_COL]))
+        if t0 is not None and t.size and t[0] < t0:
+            raise ValueError(
+                f"Blasts at {TIME_COL} {t[0]:g} predate the carried-in state (t0 = {t0:g}); "
+                "recompute from the full blast log instead of continuing from sdi0."
+            )
+        df["Delta_t"] = real_delta_t(t, t0)
+    else:
+        t = None
+        df["Delta_t"] = 1.0  # placeholder time step
+
+    with stage("compute_modules_1_2_3.sdi_cumsum", items=n):
+        # SDI(t) = SDI(t-1) * exp(-decay * Delta_t) + SDI_GAIN * BVII(t) * Delta_t
+        if has_time and decay:
+            df["SDI"] = decayed_cumsum((SDI_GAIN * df["BVII"] * df["Delta_t"]).to_numpy(), t, decay, sdi0, t0)
+        else:
+            df["SDI"] = sdi0 + (SDI_GAIN * df["BVII"] * df["Delta_t"]).cumsum()
+
+        df["Dam_State"] = np.select(
+            [df["SDI"] < Tsafe, (df["SDI"] >= Tsafe) & (df["SDI"] < Twarn), (df["SDI"] >= Twarn) & (df["SDI"] < Tcrit), df["SDI"] >= Tcrit],
+            ["Safe", "Warning", "Critical", "Failed"],
+            default="Safe"
+        )
+
+    # -------------------------
+    # MODULE 3: RDI (rock mass disturbance)
+    # -------------------------
+    with stage("compute_modules_1_2_3.rdi", items=n):
+        df["RDI"] = (W_RDI_PPV * ppv_n) + (W_RDI_DIST * dist_risk) + (W_RDI_SLOPE * slope_n)
+
+    with stage("compute_modules_1_2_3.rdi_labels", items=n):
+        df["RDI_Level"] = pd.cut(
+            df["RDI"],
+            bins=[-0.01, 0.33, 0.66, 1.01],
+            labels=["Low", "Moderate", "High"]
+        )
+    return df
+
 # =========================
 # MAIN
 # =========================
-df = pd.read_csv(CSV_PATH)
-
-# ---- Basic checks (your dataset uses these names) ----
-required = ["PPV_mm_per_s", "Distance_from_Dam_m"]
-missing = [c for c in required if c not in df.columns]
-if missing:
-    raise ValueError(f"Missing required columns in CSV: {missing}")
-
-# Optional features
-has_charge = "Charge_Factor_kg_per_m" in df.columns
-has_slope = "Slope_deg" in df.columns  # you can add later after sampling from raster
-
-# If slope not present, create a demo slope column
-if not has_slope:
-    df["Slope_deg"] = DEFAULT_SLOPE_DEG
-
-# -------------------------
-# MODULE 1: BVII
-# -------------------------
-ppv_n = minmax(df["PPV_mm_per_s"])
-dist_risk = inv_distance_norm(df["Distance_from_Dam_m"])
-
-if has_charge:
-    charge_n = minmax(df["Charge_Factor_kg_per_m"])
-else:
-    charge_n = 0.0  # if missing, contributes nothing
-
-df["BVII"] = (W_PPV * ppv_n) + (W_DIST * dist_risk) + (W_CHARGE * charge_n)
-
-# Optional label
-df["BVII_Level"] = pd.cut(
-    df["BVII"],
-    bins=[-0.01, 0.33, 0.66, 1.01],
-    labels=["Low", "Moderate", "High"]
-)
-
-# -------------------------
-# MODULE 2: SDI (cumulative damage)
-# -------------------------
-# If you have real timestamps later, sort by time first.
-# For now, we treat row order as blast order.
-df["Delta_t"] = 1.0  # placeholder time step (can be hours/days later)
-
-# SDI(t) = SDI(t-1) + SDI_GAIN * BVII(t) * Delta_t
-df["SDI"] = (SDI_GAIN * df["BVII"] * df["Delta_t"]).cumsum()
+def main():
+    os.makedirs(OUT_DIR, exist_ok=True)
+    with stage("compute_modules_1_2_3.csv_load") as rec:
+        df = stage_inputs(CSV_PATH, "modules_1_2_3", OUT_CSV)
+        rec["items"] = len(df)
+
+    df = compute_modules(df)
+
+    # -------------------------
+    # SAVE OUTPUTS
+    # -------------------------
+    with stage("compute_modules_1_2_3.write", items=len(df)):
+        write_stage(df, OUT_CSV, "modules_1_2_3")
+
+    print("✅ Modules 1,2,3 computed successfully.")
+    print("Saved:", OUT_CSV)
+    print("\nQuick preview:")
+    print(df[["PPV_mm_per_s", "Distance_from_Dam_m", "BVII", "BVII_Level", "SDI", "Dam_State", "RDI", "RDI_Level"]].head(10))
 
-# Threshold-based dam state (edit thresholds later)
-Tsafe, Twarn, Tcrit = 50, 120, 200
-df["Dam_State"] = np.select(
-    [df["SDI"] < Tsafe, (df["SDI"] >= Tsafe) & (df["SDI"] < Twarn), (df["SDI"] >= Twarn) & (df["SDI"] < Tcrit), df["SDI"] >= Tcrit],
-    ["Safe", "Warning", "Critical", "Failed"],
-    default="Safe"
-)
-
-# -------------------------
-# MODULE 3: RDI (rock mass disturbance)
-# -------------------------
-slope_n = minmax(df["Slope_deg"])
-df["RDI"] = (W_RDI_PPV * ppv_n) + (W_RDI_DIST * dist_risk) + (W_RDI_SLOPE * slope_n)
-
-df["RDI_Level"] = pd.cut(
-    df["RDI"],
-    bins=[-0.01, 0.33, 0.66, 1.01],
-    labels=["Low", "Moderate", "High"]
-)
-
-# -------------------------
-# SAVE OUTPUTS
-# -------------------------
-cols_to_save = list(df.columns)  # or choose specific columns
-df.to_csv(OUT_CSV, index=False)
-
-print("✅ Modules 1,2,3 computed successfully.")
-print("Saved:", OUT_CSV)
-print("\nQuick preview:")
-print(df[["PPV_mm_per_s", "Distance_from_Dam_m", "BVII", "BVII_Level", "SDI", "Dam_State", "RDI", "RDI_Level"]].head(10))
 
+if __name__ == "__main__":
+    main()
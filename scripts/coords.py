@@ -0,0 +1,101 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+
+# =========================
+# CONFIG
+# =========================
+WGS84 = "EPSG:4326"
+# Project UTM CRS (Bhavanisagar, zone 43N); used when it can't be picked from the data
+DEFAULT_UTM = "EPSG:32643"
+
+LON_COL, LAT_COL = "Blast_Lon", "Blast_Lat"
+E_COL, N_COL = "Blast_Easting", "Blast_Northing"
+
+# Rows transformed per call when filling big tables
+CHUNK_ROWS = 500_000
+
+
+@lru_cache(maxsize=32)
+def get_transformer(src, dst):
+    """Shared pyproj Transformer per (src, dst) pair, x/y = lon/lat order."""
+    return Transformer.from_crs(src, dst, always_xy=True)
+
+
+def utm_epsg(lon, lat):
+    """WGS84 UTM EPSG code (e.g. 'EPSG:32643') for the zone containing lon/lat."""
+    zone = int(math.floor((lon + 180.0) / 6.0)) % 60 + 1
+    return f"EPSG:{(32600 if lat >= 0 else 32700) + zone}"
+
+
+def utm_epsg_for(lons, lats):
+    """UTM zone for a set of points, chosen at their median lon/lat."""
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    ok = np.isfinite(lons) & np.isfinite(lats)
+    if not ok.any():
+        return None
+    return utm_epsg(float(np.median(lons[ok])), float(np.median(lats[ok])))
+
+
+def to_utm(lons, lats, crs=DEFAULT_UTM):
+    """Vectorized lon/lat → easting/northing."""
+    return get_transformer(WGS84, crs).transform(np.asarray(lons, float), np.asarray(lats, float))
+
+
+def to_lonlat(xs, ys, crs=DEFAULT_UTM):
+    """Vectorized easting/northing → lon/lat."""
+    return get_transformer(crs, WGS84).transform(np.asarray(xs, float), np.asarray(ys, float))
+
+
+def _transform_rows(df, rows, fn, in_cols, out_cols, crs, chunk):
+    """Fill out_cols at positional rows (safe with duplicate index labels)."""
+    a = df[in_cols[0]].to_numpy(float)
+    b = df[in_cols[1]].to_numpy(float)
+    iu, iv = df.columns.get_loc(out_cols[0]), df.columns.get_loc(out_cols[1])
+    for start in range(0, rows.size, chunk):
+        sel = rows[start:start + chunk]
+        u, v = fn(a[sel], b[sel], crs)
+        df.iloc[sel, iu] = u
+        df.iloc[sel, iv] = v
+
+
+def fill_coordinates(df, crs="auto", chunk=CHUNK_ROWS):
+    """
+    Fill whichever of Lat/Lon or Easting/Northing is missing on each row.
+
+    Blank cells (as written by add_coordinate_columns.py) count as missing.
+    crs="auto" picks the UTM zone from the lon/lat already present, falling
+    back to DEFAULT_UTM. Returns (df, crs used, rows filled).
+    """
+    for col in (LON_COL, LAT_COL, E_COL, N_COL):
+        if col not in df.columns:
+            df[col] = np.nan
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    lons, lats = df[LON_COL].to_numpy(float), df[LAT_COL].to_numpy(float)
+    has_ll = np.isfinite(lons) & np.isfinite(lats)
+    has_en = df[E_COL].notna().to_numpy() & df[N_COL].notna().to_numpy()
+
+    if crs == "auto":
+        crs = utm_epsg_for(lons[has_ll], lats[has_ll]) or DEFAULT_UTM
+
+    need_en = np.flatnonzero(has_ll & ~has_en)
+    need_ll = np.flatnonzero(has_en & ~has_ll)
+
+    _transform_rows(df, need_en, to_utm, (LON_COL, LAT_COL), (E_COL, N_COL), crs, chunk)
+    _transform_rows(df, need_ll, to_lonlat, (E_COL, N_COL), (LON_COL, LAT_COL), crs, chunk)
+    return df, crs, int(need_en.size + need_ll.size)
+
+
+def fill_csv(in_csv, out_csv, crs=DEFAULT_UTM, chunksize=CHUNK_ROWS):
+    """Stream a large CSV through fill_coordinates chunk by chunk. Returns rows filled."""
+    filled = 0
+    for i, chunk in enumerate(pd.read_csv(in_csv, chunksize=chunksize)):
+        chunk, _, n = fill_coordinates(chunk, crs=crs, chunk=chunksize)
+        chunk.to_csv(out_csv, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        filled += n
+    return filled
@@ -0,0 +1,186 @@
+# ==========================================================
+# Terrain-aware propagation distance (cost distance)
+# Least-cost path length to the dam over the DEM grid (8-connected Dijkstra,
+# scipy.sparse.csgraph), weighted by slope and rock quality, fed into the
+# terrain_engine PPV/BVII formulas. Requires scipy.
+# Outputs: cost_distance.tif, ppv_cost.tif, bvii_cost.tif
+# ==========================================================
+
+import os
+import numpy as np
+import pandas as pd
+
+from raster_sampling import ArrayGrid, inv_geotransform, sample_grid
+from terrain_engine import (
+    DEM_PATH,
+    OUT_DIR,
+    SLOPE_MAX,
+    bvii_from_layers,
+    dam_point_in_dem,
+    horn_slope,
+    ppv_from_distance,
+    read_dem,
+    warn_dam_outside,
+    world_to_cell,
+    write_raster,
+)
+
+PROJECT_DIR = r"C:\damsafe"
+# Blasts with Blast_Easting/Blast_Northing get a Cost_Distance_m column
+BLASTS_CSV = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset_DEMOcoords.csv")
+OUT_CSV = os.path.join(PROJECT_DIR, "outputs", "tables", "blast_cost_distance.csv")
+
+# Optional rock-mass raster on the DEM grid: dimensionless attenuation
+# factor per cell (1 = reference rock, >1 = more attenuating / costlier)
+ROCK_TIF = None
+
+# Cost per metre = (1 + SLOPE_COST * slope / SLOPE_MAX) * rock factor
+SLOPE_COST = 1.0
+
+# Only cells within this many metres (straight line) of a source are solved;
+# None = whole grid
+MAX_RADIUS_M = 2000.0
+
+# Edge weights are floored here (metres): csgraph treats a zero-weight edge as
+# no edge, so a zero-cost cell (rock factor 0) would otherwise cut the graph
+MIN_EDGE_COST = 1e-9
+
+# 8-connected neighbour offsets (row, col)
+NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def cost_surface(slope, rock=None, slope_cost=SLOPE_COST):
+    """Cost per metre of travel through each cell; NaN cells are impassable."""
+    cost = 1.0 + slope_cost * np.clip(slope, 0.0, None) / SLOPE_MAX
+    if rock is not None:
+        if np.any(rock < 0):
+            raise ValueError("Rock factors must be >= 0 (NaN = impassable); check ROCK_TIF.")
+        cost = cost * rock
+    return cost
+
+
+def source_window(shape, gt, sources_rc, radius):
+    """(row0, col0, h, w) covering every source ± radius, clipped to the grid."""
+    if radius is None:
+        return 0, 0, shape[0], shape[1]
+    rows = np.array([r for r, _ in sources_rc])
+    cols = np.array([c for _, c in sources_rc])
+    rr = int(np.ceil(radius / abs(gt[5])))
+    rc = int(np.ceil(radius / abs(gt[1])))
+    r0, c0 = max(rows.min() - rr, 0), max(cols.min() - rc, 0)
+    r1, c1 = min(rows.max() + rr + 1, shape[0]), min(cols.max() + rc + 1, shape[1])
+    return r0, c0, r1 - r0, c1 - c0
+
+
+def _edge_steps(gt):
+    dx, dy = abs(gt[1]), abs(gt[5])
+    return [(dr, dc, float(np.hypot(dr * dy, dc * dx))) for dr, dc in NEIGHBOURS]
+
+
+def _solve(cost, gt, sources):
+    """
+    Dijkstra over the 8-connected grid; edge weight = step length × mean cost
+    of its two cells (at least MIN_EDGE_COST). Built vectorized and solved by
+    scipy.sparse.csgraph.
+    """
+    try:
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import dijkstra
+    except ImportError:
+        raise ImportError("cost_distance needs scipy (pip install scipy).") from None
+
+    ny, nx = cost.shape
+    idx = np.arange(ny * nx).reshape(ny, nx)
+    src, dst, w = [], [], []
+    # Half the neighbours (dr >= 0); the graph is undirected
+    for dr, dc, step in _edge_steps(gt):
+        if (dr, dc) <= (0, 0):
+            continue
+        ca = slice(0, nx - dc) if dc >= 0 else slice(-dc, nx)
+        cb = slice(dc, nx) if dc >= 0 else slice(0, nx + dc)
+        a, b = cost[:ny - dr, ca], cost[dr:, cb]
+        ok = np.isfinite(a) & np.isfinite(b)
+        src.append(idx[:ny - dr, ca][ok])
+        dst.append(idx[dr:, cb][ok])
+        w.append(np.maximum(step * 0.5 * (a[ok] + b[ok]), MIN_EDGE_COST))
+
+    graph = coo_matrix((np.concatenate(w), (np.concatenate(src), np.concatenate(dst))),
+                       shape=(ny * nx, ny * nx)).tocsr()
+    starts = [r * nx + c for r, c in sources if np.isfinite(cost[r, c])]
+    if not starts:
+        return np.full(cost.shape, np.inf)
+    dist = dijkstra(graph, directed=False, indices=starts, min_only=True)
+    return dist.reshape(ny, nx)
+
+
+def cost_distance(cost, gt, sources_rc, radius=MAX_RADIUS_M):
+    """
+    Least-cost distance from the nearest source cell to every cell.
+
+    sources_rc: list of (row, col). Only the window around the sources
+    (± radius metres) is solved; cells outside it and unreachable cells
+    are NaN. Returns an array shaped like `cost`.
+    """
+    if np.any(cost < 0):
+        raise ValueError("Travel cost must be >= 0 (NaN = impassable).")
+    r0, c0, h, w = source_window(cost.shape, gt, sources_rc, radius)
+    sub = cost[r0:r0 + h, c0:c0 + w]
+    local = [(r - r0, c - c0) for r, c in sources_rc]
+
+    d = _solve(sub, gt, local)
+
+    out = np.full(cost.shape, np.nan)
+    out[r0:r0 + h, c0:c0 + w] = np.where(np.isfinite(d), d, np.nan)
+    return out
+
+
+def cost_layers(dem, gt, dam_rc, rock=None, radius=MAX_RADIUS_M):
+    """Slope, cost distance and the PPV/BVII driven by it, for one dam cell."""
+    slope = horn_slope(dem, gt)
+    dist = cost_distance(cost_surface(slope, rock), gt, [dam_rc], radius)
+    ppv = ppv_from_distance(dist)
+    bvii = bvii_from_layers(ppv, dist, slope)
+    return {"slope_deg": slope, "cost_distance": dist, "ppv_cost": ppv, "bvii_cost": bvii}
+
+
+def blast_cost_distance(dist, gt, blasts):
+    """
+    Cost distance from the dam at each blast (costs are symmetric, so one
+    solve from the dam serves every blast). NaN outside the solved window.
+    """
+    return sample_grid(ArrayGrid(dist), inv_geotransform(gt),
+                       blasts["Blast_Easting"].to_numpy(float), blasts["Blast_Northing"].to_numpy(float))
+
+
+def main():
+    if not os.path.exists(DEM_PATH):
+        raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    dem, gt, proj = read_dem(DEM_PATH)
+    x, y, dam_inside = dam_point_in_dem(gt, dem.shape, proj)
+    warn_dam_outside(dam_inside)
+    dam_rc = world_to_cell(gt, x, y, dem.shape)
+
+    rock = read_dem(ROCK_TIF)[0] if ROCK_TIF else None
+    layers = cost_layers(dem, gt, dam_rc, rock)
+
+    for name in ("cost_distance", "ppv_cost", "bvii_cost"):
+        write_raster(os.path.join(OUT_DIR, name + ".tif"), layers[name], gt, proj)
+
+    print("\n✅ SUCCESS — Cost-distance outputs created in:")
+    print("   ", OUT_DIR)
+    print("   cost_distance.tif")
+    print("   ppv_cost.tif")
+    print("   bvii_cost.tif")
+
+    if os.path.exists(BLASTS_CSV):
+        blasts = pd.read_csv(BLASTS_CSV)
+        blasts["Cost_Distance_m"] = blast_cost_distance(layers["cost_distance"], gt, blasts)
+        os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
+        blasts.to_csv(OUT_CSV, index=False)
+        print("Saved:", OUT_CSV, "(use Cost_Distance_m as Distance_from_Dam_m for terrain-aware Modules 1-3)")
+
+
+if __name__ == "__main__":
+    main()
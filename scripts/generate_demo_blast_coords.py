@@ -1,7 +1,8 @@
 import os
 import numpy as np
 import pandas as pd
-from pyproj import Transformer
+
+from coords import to_lonlat
 
 PROJECT_DIR = r"C:\damsafe"
 IN_CSV = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
@@ -13,26 +14,36 @@ YMIN = 1267736.280
 XMAX = 733266.521
 YMAX = 1272548.710
 
-df = pd.read_csv(IN_CSV)
-n = len(df)
-
 # Keep points away from edges by margin
 MARGIN_M = 100
 
-rng = np.random.default_rng(42)
-xs = rng.uniform(XMIN + MARGIN_M, XMAX - MARGIN_M, size=n)
-ys = rng.uniform(YMIN + MARGIN_M, YMAX - MARGIN_M, size=n)
+SEED = 42
+
+
+def demo_coords(df, seed=SEED):
+    """Add random Easting/Northing (and Lon/Lat) inside the DEM extent to df."""
+    n = len(df)
+
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(XMIN + MARGIN_M, XMAX - MARGIN_M, size=n)
+    ys = rng.uniform(YMIN + MARGIN_M, YMAX - MARGIN_M, size=n)
+
+    df["Blast_Easting"] = xs
+    df["Blast_Northing"] = ys
+
+    # Convert to lat/lon too (optional)
+    lons, lats = to_lonlat(xs, ys, "EPSG:32643")
+    df["Blast_Lon"] = lons
+    df["Blast_Lat"] = lats
+    return df
 
-df["Blast_Easting"] = xs
-df["Blast_Northing"] = ys
 
-# Convert to lat/lon too (optional)
-transformer = Transformer.from_crs("EPSG:32643", "EPSG:4326", always_xy=True)
-lons, lats = transformer.transform(xs, ys)
-df["Blast_Lon"] = lons
-df["Blast_Lat"] = lats
+def main():
+    df = demo_coords(pd.read_csv(IN_CSV))
+    df.to_csv(OUT_CSV, index=False)
+    print("✅ Demo blast coordinates generated inside DEM extent.")
+    print("Saved:", OUT_CSV)
 
-df.to_csv(OUT_CSV, index=False)
-print("✅ Demo blast coordinates generated inside DEM extent.")
-print("Saved:", OUT_CSV)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# =========================
+# CONFIG (environment)
+# =========================
+# DAMSAFE_METRICS=<file.jsonl> appends one JSON record per stage;
+# DAMSAFE_METRICS=stderr prints them. Unset: records are only kept in RECORDS.
+METRICS_TARGET = os.environ.get("DAMSAFE_METRICS", "")
+# How many recent records RECORDS keeps (long-running services emit forever)
+MAX_RECORDS = int(os.environ.get("DAMSAFE_MAX_RECORDS", "1000"))
+
+# DAMSAFE_PROFILE=cprofile → <stage>-<pid>-<n>.prof per stage run (open with pstats/snakeviz)
+# DAMSAFE_PROFILE=sampling → <stage>-<pid>-<n>.folded collapsed stacks (flamegraph.pl / speedscope)
+PROFILE_MODE = os.environ.get("DAMSAFE_PROFILE", "")
+PROFILE_DIR = os.environ.get("DAMSAFE_PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL_S = float(os.environ.get("DAMSAFE_SAMPLE_INTERVAL", "0.005"))
+
+SCRIPT = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "interactive"
+
+# The most recent MAX_RECORDS records emitted in this process
+RECORDS = deque(maxlen=MAX_RECORDS)
+
+# Runs per stage name so far, so repeated stages get their own profile files
+_PROFILE_RUNS = Counter()
+
+
+def rss_mb():
+    """Current resident set size in MB (None if the platform can't tell)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def emit(record):
+    """Store a record and send it to METRICS_TARGET."""
+    RECORDS.append(record)
+    if not METRICS_TARGET:
+        return
+    line = json.dumps(record)
+    if METRICS_TARGET == "stderr":
+        print(line, file=sys.stderr)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(METRICS_TARGET)), exist_ok=True)
+        with open(METRICS_TARGET, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# =========================
+# PROFILING HOOKS
+# =========================
+class StackSampler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_S, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+@contextmanager
+def profiled(name):
+    """Run the block under the profiler selected by DAMSAFE_PROFILE (no-op if unset)."""
+    if PROFILE_MODE not in ("cprofile", "sampling"):
+        yield
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    _PROFILE_RUNS[safe] += 1
+    base = os.path.join(PROFILE_DIR, f"{safe}-{os.getpid()}-{_PROFILE_RUNS[safe]}")
+    if PROFILE_MODE == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(base + ".prof")
+    else:
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(base + ".folded")
+
+
+# =========================
+# STAGES
+# =========================
+@contextmanager
+def stage(name, items=None, unit="rows"):
+    """
+    Time a pipeline stage and emit a JSON record with wall time, CPU time,
+    RSS change over the stage, items processed and throughput. The yielded
+    dict can be updated inside the block (e.g. rec["items"] = len(df)).
+    Name stages "<script>.<step>" so every record identifies where it ran.
+    """
+    rec = {"stage": name, "items": items, "unit": unit}
+    rss0 = rss_mb()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    ok = True
+    try:
+        with profiled(name):
+            yield rec
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        wall = time.perf_counter() - wall0
+        rss1 = rss_mb()
+        n = rec.get("items")
+        emit({
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "script": SCRIPT,
+            "stage": name,
+            "ok": ok,
+            "wall_s": wall,
+            "cpu_s": time.process_time() - cpu0,
+            "rss_mb": rss1,
+            "rss_delta_mb": (rss1 - rss0) if rss0 is not None and rss1 is not None else None,
+            "items": n,
+            "unit": rec.get("unit", unit),
+            "throughput_per_s": (n / wall) if n and wall > 0 else None,
+        })
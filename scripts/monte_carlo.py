@@ -0,0 +1,257 @@
+import os
+import numpy as np
+import pandas as pd
+
+from compute_modules_1_2_3 import (
+    W_PPV, W_DIST, W_CHARGE, SDI_GAIN, Tsafe, Twarn, Tcrit,
+    minmax, inv_distance_norm,
+)
+from compute_module4_dam_state import STATE_LABELS, dam_state_codes
+from terrain_engine import (
+    PPV_MIN, PPV_MAX, DIST_MIN, DIST_MAX, SLOPE_MIN, SLOPE_MAX,
+    w_ppv, w_dist, w_slope, W_charge_kg, site_law_params,
+)
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
+OUT_CSV = os.path.join(PROJECT_DIR, "outputs", "tables", "monte_carlo_outputs.csv")
+
+N_SAMPLES = 5000
+BATCH = 250            # draws evaluated per broadcast (memory ~ BATCH × blasts)
+SEED = 42
+
+# ---- Parameter uncertainty (placeholders, tune later) ----
+K_LOG_SD = 0.30        # K ~ lognormal with median K
+ALPHA_SD = 0.10        # alpha ~ normal(alpha, ALPHA_SD)
+WEIGHT_CONCENTRATION = 200.0   # Dirichlet around the nominal weights (higher = tighter)
+
+# Logged blasts keep their measured PPV_mm_per_s, so only the weight draws
+# vary for them; blasts without a measurement get PPV predicted from the
+# drawn K / alpha
+USE_MEASURED_PPV = True
+
+PERCENTILES = (5, 50, 95)
+# Per-blast histogram resolution for streaming percentiles; memory is
+# blasts × HIST_BINS × 2 bytes per histogram (4 bytes above 65_535 draws)
+HIST_BINS = 64
+
+DAM_STATES = ["Safe", "Warning", "Critical", "Failed"]
+
+
+# =========================
+# SAMPLING
+# =========================
+def draw_parameters(rng, n, base_weights, law=None):
+    """
+    n draws of (K, alpha, weights) around law = (K, alpha) (None =
+    site_law_params()); weights rows sum to the nominal total.
+    """
+    K, alpha = law or site_law_params()
+    ks = K * np.exp(rng.normal(0.0, K_LOG_SD, size=n))
+    alphas = rng.normal(alpha, ALPHA_SD, size=n)
+    base = np.asarray(base_weights, dtype=float)
+    weights = rng.dirichlet(base / base.sum() * WEIGHT_CONCENTRATION, size=n) * base.sum()
+    return ks, alphas, weights
+
+
+def predicted_ppv(ks, alphas, dist_m, charge_kg):
+    """PPV = K * (D / sqrt(W))^(-alpha) broadcast to (draws × points)."""
+    sd = np.asarray(dist_m, dtype=float) / np.sqrt(np.asarray(charge_kg, dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return ks[:, None] * np.power(sd[None, :], -alphas[:, None])
+
+
+# =========================
+# STREAMING REDUCTIONS
+# =========================
+class StreamingHistogram:
+    """
+    Per-element histogram over draws, so percentiles come out without
+    keeping every draw. lo/hi may be scalars or per-element arrays;
+    values outside land in the edge bins (exact min/max are tracked) and
+    NaN draws are skipped. max_count sizes the bin counters (the number of draws).
+    """
+
+    def __init__(self, lo, hi, n, nbins=HIST_BINS, max_count=N_SAMPLES):
+        self.lo = np.broadcast_to(np.asarray(lo, dtype=float), (n,)).copy()
+        self.hi = np.broadcast_to(np.asarray(hi, dtype=float), (n,)).copy()
+        self.hi = np.where(self.hi > self.lo, self.hi, self.lo + 1e-9)
+        self.nbins = nbins
+        self.n = n
+        self.counts = np.zeros((n, nbins), dtype=np.uint16 if max_count <= np.iinfo(np.uint16).max else np.uint32)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.total = np.zeros(n, dtype=np.int64)
+
+    def update(self, x):
+        """x: (draws × n) batch."""
+        ok = ~np.isnan(x)
+        xb = np.clip(np.where(ok, x, self.lo), self.lo, self.hi)
+        idx = ((xb - self.lo) / (self.hi - self.lo) * self.nbins).astype(np.int64)
+        np.clip(idx, 0, self.nbins - 1, out=idx)
+        idx += np.arange(self.n)[None, :] * self.nbins
+        # Scatter-add in place: no (n × nbins) temporary per batch
+        np.add.at(self.counts.reshape(-1), idx[ok], 1)
+        self.min = np.minimum(self.min, np.where(ok, x, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(ok, x, -np.inf).max(axis=0))
+        self.total += ok.sum(axis=0)
+
+    def percentile(self, p):
+        """Per-element p-th percentile (linear within the bin); NaN where every draw was NaN."""
+        target = p / 100.0 * self.total
+        cum = np.cumsum(self.counts, axis=1, dtype=np.int64)
+        b = np.minimum((cum < target[:, None]).sum(axis=1), self.nbins - 1)
+        rows = np.arange(self.n)
+        before = np.where(b > 0, cum[rows, np.maximum(b - 1, 0)], 0)
+        in_bin = np.maximum(self.counts[rows, b], 1)
+        frac = np.clip((target - before) / in_bin, 0.0, 1.0)
+        width = (self.hi - self.lo) / self.nbins
+        with np.errstate(invalid="ignore"):
+            out = np.clip(self.lo + (b + frac) * width, self.min, self.max)
+        return np.where(self.total > 0, out, np.nan)
+
+
+# =========================
+# TABLE MODE (Modules 1, 2, 4)
+# =========================
+def monte_carlo_table(df, n_samples=N_SAMPLES, batch=BATCH, seed=SEED, use_measured=USE_MEASURED_PPV):
+    """
+    Draw (K, alpha, weights), take PPV per blast from the log (or predict it
+    from distance and charge), and reduce BVII/SDI percentiles plus
+    Dam_State / Dam_State_M4 probabilities batch by batch. Returns one row per blast.
+    """
+    for col in ("Distance_from_Dam_m", "Total_Explosives_kg"):
+        if col not in df.columns:
+            raise ValueError(f"Missing column: {col}")
+
+    n = len(df)
+    rng = np.random.default_rng(seed)
+    law = site_law_params()
+
+    # Deterministic features, normalized once
+    dist_risk = inv_distance_norm(df["Distance_from_Dam_m"]).to_numpy()
+    has_charge = "Charge_Factor_kg_per_m" in df.columns
+    charge_n = minmax(df["Charge_Factor_kg_per_m"]).to_numpy() if has_charge else np.zeros(n)
+
+    # Measured PPV, normalized over the log's range as in Module 1
+    measured = np.full(n, np.nan)
+    ppv_bounds = (PPV_MIN, PPV_MAX)
+    if use_measured and "PPV_mm_per_s" in df.columns:
+        logged = df["PPV_mm_per_s"].astype(float)
+        if logged.notna().any():
+            ppv_bounds = (float(logged.min()), float(logged.max()))
+            measured = np.where(logged.notna(), minmax(logged, bounds=ppv_bounds), np.nan)
+    has_ppv = np.isfinite(measured)
+
+    # Every normalized term is in 0..1 and the weights sum to their nominal
+    # total, so BVII and SDI stay inside these per-blast bounds for any draw
+    w_total = W_PPV + W_DIST + W_CHARGE
+    terms = np.stack([np.where(has_ppv, measured, 0.0), dist_risk, charge_n])
+    terms_hi = np.stack([np.where(has_ppv, measured, 1.0), dist_risk, charge_n])
+    bvii_lo, bvii_hi = w_total * terms.min(axis=0), w_total * terms_hi.max(axis=0)
+
+    state_counts = np.zeros((n, len(DAM_STATES)), dtype=np.int64)
+    m4_counts = np.zeros((n, len(STATE_LABELS)), dtype=np.int64)
+    bvii_hist = StreamingHistogram(bvii_lo, bvii_hi, n, max_count=n_samples)
+    sdi_hist = StreamingHistogram(np.cumsum(SDI_GAIN * bvii_lo), np.cumsum(SDI_GAIN * bvii_hi), n,
+                                  max_count=n_samples)
+
+    done = 0
+    while done < n_samples:
+        b = min(batch, n_samples - done)
+        ks, alphas, w = draw_parameters(rng, b, (W_PPV, W_DIST, W_CHARGE), law)
+
+        if has_ppv.all():
+            ppv_n = measured[None, :]
+        else:
+            ppv = predicted_ppv(ks, alphas, df["Distance_from_Dam_m"], df["Total_Explosives_kg"])
+            ppv_n = np.clip((ppv - ppv_bounds[0]) / (ppv_bounds[1] - ppv_bounds[0]), 0.0, 1.0)
+            ppv_n = np.where(has_ppv[None, :], measured[None, :], ppv_n)
+
+        bvii = w[:, :1] * ppv_n + w[:, 1:2] * dist_risk + w[:, 2:3] * charge_n
+        sdi = np.cumsum(SDI_GAIN * bvii, axis=1)      # Delta_t = 1.0 as in Module 2
+
+        bvii_hist.update(bvii)
+        sdi_hist.update(sdi)
+
+        state = np.searchsorted([Tsafe, Twarn, Tcrit], sdi, side="right")
+        state_counts += np.stack([(state == s).sum(axis=0) for s in range(len(DAM_STATES))], axis=1)
+
+        m4, _ = dam_state_codes(sdi.T)                # events × draws
+        m4_counts += np.stack([(m4 == s).sum(axis=1) for s in range(len(STATE_LABELS))], axis=1)
+
+        done += b
+
+    out = pd.DataFrame(index=df.index)
+    for p in PERCENTILES:
+        out[f"BVII_P{p}"] = bvii_hist.percentile(p)
+    for p in PERCENTILES:
+        out[f"SDI_P{p}"] = sdi_hist.percentile(p)
+    for s, name in enumerate(DAM_STATES):
+        out[f"P_{name}"] = state_counts[:, s] / n_samples
+    for s, name in enumerate(STATE_LABELS):
+        out[f"P_M4_{name}"] = m4_counts[:, s] / n_samples
+    return out
+
+
+# =========================
+# RASTER MODE (optional)
+# =========================
+def monte_carlo_raster(dist, slope, threshold=0.66, n_samples=N_SAMPLES, batch=16, seed=SEED,
+                       charge_kg=W_charge_kg):
+    """
+    Per-cell BVII percentiles and P(BVII >= threshold) for the terrain
+    pipeline's distance/slope grids. Memory ~ batch × cells.
+    Each normalized term is clipped to 0..1 as in table mode, so BVII stays
+    within 0..(w_ppv + w_dist + w_slope) however close a cell is to the dam.
+    """
+    shape = dist.shape
+    d = dist.ravel()
+    rng = np.random.default_rng(seed)
+    law = site_law_params()
+
+    dist_term = np.clip(1.0 - (d - DIST_MIN) / (DIST_MAX - DIST_MIN), 0.0, 1.0)
+    slope_term = np.clip((slope.ravel() - SLOPE_MIN) / (SLOPE_MAX - SLOPE_MIN), 0.0, 1.0)
+
+    hist = StreamingHistogram(0.0, w_ppv + w_dist + w_slope, d.size, max_count=n_samples)
+    exceed = np.zeros(d.size, dtype=np.int64)
+
+    done = 0
+    while done < n_samples:
+        b = min(batch, n_samples - done)
+        ks, alphas, w = draw_parameters(rng, b, (w_ppv, w_dist, w_slope), law)
+        ppv = predicted_ppv(ks, alphas, d, np.full(d.size, charge_kg))
+        ppv_n = np.clip((ppv - PPV_MIN) / (PPV_MAX - PPV_MIN), 0.0, 1.0)
+        bvii = w[:, :1] * ppv_n + w[:, 1:2] * dist_term + w[:, 2:3] * slope_term
+        hist.update(bvii)
+        exceed += (bvii >= threshold).sum(axis=0)
+        done += b
+
+    out = {f"bvii_p{p}": hist.percentile(p).reshape(shape) for p in PERCENTILES}
+    out["p_exceed"] = (exceed / n_samples).reshape(shape)
+    nodata = ~np.isfinite(dist) | (dist <= 0) | ~np.isfinite(slope)
+    for arr in out.values():
+        arr[nodata] = np.nan
+    return out
+
+
+def main():
+    df = pd.read_csv(CSV_PATH)
+    mc = monte_carlo_table(df)
+    out = pd.concat([df, mc], axis=1)
+
+    os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
+    out.to_csv(OUT_CSV, index=False)
+
+    ppv_src = "measured PPV where logged" if USE_MEASURED_PPV else "predicted PPV"
+    print(f"✅ Monte Carlo completed: {N_SAMPLES} draws of (K, alpha, weights), {ppv_src}.")
+    print("Saved:", OUT_CSV)
+    print("\nPreview:")
+    print(mc.head(10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import numpy as np
+import pandas as pd
+
+from compute_modules_1_2_3 import DEFAULT_SLOPE_DEG, compute_modules
+from compute_module4_dam_state import compute_module4
+from terrain_engine import site_law_params
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+BLASTS_CSV = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset_DEMOcoords.csv")
+# One row per dam / spillway / structure: Structure_ID, Easting, Northing (EPSG:32643)
+# and optionally Radius_m to override RADIUS_M for that structure
+REGISTRY_CSV = os.path.join(PROJECT_DIR, "data", "structures.csv")
+OUT_DIR = os.path.join(PROJECT_DIR, "outputs", "tables", "structures")
+
+# Blasts farther than this from a structure are ignored for it
+RADIUS_M = 2000.0
+
+ID_COL = "Structure_ID"
+SX_COL, SY_COL = "Easting", "Northing"
+RADIUS_COL = "Radius_m"
+BX_COL, BY_COL = "Blast_Easting", "Blast_Northing"
+CHARGE_COL = "Total_Explosives_kg"
+
+
+# =========================
+# SPATIAL INDEX
+# =========================
+class GridIndex:
+    """
+    Uniform-grid index over points. Points are sorted by cell key so a
+    radius query touches only the few grid columns it overlaps, each one a
+    contiguous slice found with searchsorted.
+    """
+
+    def __init__(self, xs, ys, cell):
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        self.cell = float(cell)
+
+        ok = np.isfinite(self.xs) & np.isfinite(self.ys)
+        ids = np.flatnonzero(ok)
+        ix = np.floor(self.xs[ok] / self.cell).astype(np.int64)
+        iy = np.floor(self.ys[ok] / self.cell).astype(np.int64)
+
+        self.ix0 = ix.min() if ids.size else 0
+        self.iy0 = iy.min() if ids.size else 0
+        self.ny = (iy.max() - self.iy0 + 1) if ids.size else 1
+
+        keys = (ix - self.ix0) * self.ny + (iy - self.iy0)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.ids = ids[order]
+
+    def query(self, x, y, r):
+        """Indices of points within r of (x, y), ascending, with their distances."""
+        cx0 = int(np.floor((x - r) / self.cell)) - self.ix0
+        cx1 = int(np.floor((x + r) / self.cell)) - self.ix0
+        cy0 = max(int(np.floor((y - r) / self.cell)) - self.iy0, 0)
+        cy1 = min(int(np.floor((y + r) / self.cell)) - self.iy0, self.ny - 1)
+
+        parts = []
+        if cy0 <= cy1:
+            for cx in range(max(cx0, 0), cx1 + 1):
+                lo = np.searchsorted(self.keys, cx * self.ny + cy0, side="left")
+                hi = np.searchsorted(self.keys, cx * self.ny + cy1, side="right")
+                if hi > lo:
+                    parts.append(self.ids[lo:hi])
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        cand = np.sort(np.concatenate(parts))
+        d = np.hypot(self.xs[cand] - x, self.ys[cand] - y)
+        keep = d <= r
+        return cand[keep], d[keep]
+
+
+def structure_blast_pairs(blasts, registry, radius=RADIUS_M):
+    """
+    (structure row, blast index, distance) for every blast within each
+    structure's radius. Returns a DataFrame sorted by structure then blast order.
+    """
+    radii = registry[RADIUS_COL].fillna(radius).to_numpy(float) if RADIUS_COL in registry.columns \
+        else np.full(len(registry), float(radius))
+
+    index = GridIndex(blasts[BX_COL], blasts[BY_COL], cell=max(float(np.nanmax(radii)), 1.0))
+
+    s_idx, b_idx, dist = [], [], []
+    for s, (x, y, r) in enumerate(zip(registry[SX_COL].to_numpy(float), registry[SY_COL].to_numpy(float), radii)):
+        ids, d = index.query(x, y, r)
+        s_idx.append(np.full(ids.size, s))
+        b_idx.append(ids)
+        dist.append(d)
+
+    return pd.DataFrame({
+        "structure": np.concatenate(s_idx) if s_idx else np.empty(0, dtype=np.int64),
+        "blast": np.concatenate(b_idx) if b_idx else np.empty(0, dtype=np.int64),
+        "distance": np.concatenate(dist) if dist else np.empty(0),
+    })
+
+
+# =========================
+# PER-STRUCTURE MODULES
+# =========================
+def _finite_range(values):
+    v = np.asarray(values, dtype=float)
+    v = v[np.isfinite(v)]
+    return (float(v.min()), float(v.max())) if v.size else (0.0, 0.0)
+
+
+def shared_stats(blasts, pairs):
+    """
+    One set of normalization ranges for every structure: PPV and distance
+    over all structure-blast pairs, charge factor and slope over the log.
+    Per-structure ranges would scale every structure to its own 0..1 and
+    make their BVII / SDI incomparable.
+    """
+    stats = {
+        "PPV_mm_per_s": _finite_range(pairs["ppv"]),
+        "Distance_from_Dam_m": _finite_range(pairs["distance"]),
+        "Slope_deg": _finite_range(blasts["Slope_deg"]) if "Slope_deg" in blasts.columns
+        else (DEFAULT_SLOPE_DEG, DEFAULT_SLOPE_DEG),
+    }
+    if "Charge_Factor_kg_per_m" in blasts.columns:
+        stats["Charge_Factor_kg_per_m"] = _finite_range(blasts["Charge_Factor_kg_per_m"])
+    return stats
+
+
+def evaluate_structures(blasts, registry, radius=RADIUS_M, stats=None, law=None):
+    """
+    Modules 1-4 for every structure from the blasts around it.
+    Distance_from_Dam_m becomes the blast-to-structure distance and
+    PPV_mm_per_s the site-law prediction K*(D/sqrt(W))^-alpha there
+    (the measured value is kept as PPV_measured_mm_per_s).
+    stats: {column: (min, max)} used for every structure (default shared_stats()).
+    law: (K, alpha) (default site_law_params()).
+    Returns {Structure_ID: DataFrame}.
+    """
+    for col in (BX_COL, BY_COL, CHARGE_COL):
+        if col not in blasts.columns:
+            raise ValueError(f"Missing column in blast table: {col}")
+    for col in (ID_COL, SX_COL, SY_COL):
+        if col not in registry.columns:
+            raise ValueError(f"Missing column in structure registry: {col}")
+
+    pairs = structure_blast_pairs(blasts, registry, radius)
+
+    # Site-law PPV for every pair in one pass
+    w = blasts[CHARGE_COL].to_numpy(float)[pairs["blast"].to_numpy()]
+    d = pairs["distance"].to_numpy()
+    K, alpha = law or site_law_params()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pairs["ppv"] = K * np.power(np.maximum(d, 1.0) / np.sqrt(w), -alpha)
+    if stats is None:
+        stats = shared_stats(blasts, pairs)
+
+    results = {}
+    for s, grp in pairs.groupby("structure", sort=True):
+        df = blasts.iloc[grp["blast"].to_numpy()].reset_index(names="Blast_Index")
+        if "PPV_mm_per_s" in df.columns:
+            df["PPV_measured_mm_per_s"] = df["PPV_mm_per_s"]
+        df["Distance_from_Dam_m"] = grp["distance"].to_numpy()
+        df["PPV_mm_per_s"] = grp["ppv"].to_numpy()
+
+        df = compute_modules(df, stats=stats)
+        df, _ = compute_module4(df)
+        results[registry[ID_COL].iloc[s]] = df
+    return results
+
+
+def main():
+    blasts = pd.read_csv(BLASTS_CSV)
+    registry = pd.read_csv(REGISTRY_CSV)
+
+    results = evaluate_structures(blasts, registry)
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+    summary = []
+    for sid, df in results.items():
+        path = os.path.join(OUT_DIR, f"{sid}_module4_dam_state.csv")
+        df.to_csv(path, index=False)
+        summary.append({
+            ID_COL: sid,
+            "Blasts": len(df),
+            "Final_SDI": df["SDI"].iloc[-1],
+            "Dam_State": df["Dam_State"].iloc[-1],
+            "Dam_State_M4": df["Dam_State_M4"].iloc[-1],
+            "Failed_Events_M4": int(df["Failure_Flag_M4"].sum()),
+        })
+    summary = pd.DataFrame(summary)
+    summary.to_csv(os.path.join(OUT_DIR, "structures_summary.csv"), index=False)
+
+    print(f"✅ Multi-structure batch completed: {len(results)} of {len(registry)} structures had blasts within range.")
+    print("Saved:", OUT_DIR)
+    print("\nSummary:")
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
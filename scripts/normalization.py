@@ -0,0 +1,312 @@
+import os
+import json
+import math
+import numpy as np
+import pandas as pd
+
+from compute_modules_1_2_3 import NORM_COLUMNS, compute_modules, prepare_inputs
+from sdi_state import last_time
+from sdi_timeline import TIME_COL, time_values
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
+OUT_CSV = os.path.join(PROJECT_DIR, "outputs", "tables", "modules_1_2_3_streamed.csv")
+NORM_STATE = os.path.join(PROJECT_DIR, "outputs", "tables", "norm_state.json")
+
+# "fixed"    → FIXED_RANGES below (same numbers every run)
+# "running"  → min/max of everything seen so far; earlier rows never change
+# "quantile" → robust Q_LOW..Q_HIGH range from a quantile sketch, fitted on a
+#              first pass over the whole file and frozen before any row is
+#              written; saved to NORM_STATE and reused by later runs
+NORM_MODE = "fixed"
+
+# Rows per chunk read from the CSV
+CHUNK_ROWS = 100_000
+
+# Reference ranges (placeholders, tune later); PPV/Distance/Slope match terrain_bvii_sdi.py
+FIXED_RANGES = {
+    "PPV_mm_per_s": (0.0, 50.0),
+    "Distance_from_Dam_m": (0.0, 2000.0),
+    "Charge_Factor_kg_per_m": (0.0, 10.0),
+    "Slope_deg": (0.0, 30.0),
+}
+
+# Columns that may be all-NaN: they are left out of the BVII (like a missing column)
+OPTIONAL_COLUMNS = ("Charge_Factor_kg_per_m",)
+
+# Quantile mode settings
+Q_LOW, Q_HIGH = 0.01, 0.99
+SKETCH_REL_ACC = 0.01
+
+
+# =========================
+# NORMALIZERS
+# =========================
+# Every normalizer exposes update(values) and bounds() → (lo, hi);
+# compute_modules() then applies clipped min-max scaling with those bounds.
+class FixedRange:
+    """Constant reference range."""
+
+    def __init__(self, lo, hi):
+        self.lo, self.hi = float(lo), float(hi)
+
+    def update(self, values):
+        pass
+
+    def bounds(self):
+        return self.lo, self.hi
+
+    def to_dict(self):
+        return {"kind": "fixed", "lo": self.lo, "hi": self.hi}
+
+
+class RunningMinMax:
+    """Min/max over every value seen so far."""
+
+    def __init__(self, lo=math.inf, hi=-math.inf):
+        self.lo, self.hi = float(lo), float(hi)
+
+    def update(self, values):
+        v = np.asarray(values, dtype=float)
+        v = v[np.isfinite(v)]
+        if v.size:
+            self.lo = min(self.lo, float(v.min()))
+            self.hi = max(self.hi, float(v.max()))
+
+    def bounds(self):
+        return self.lo, self.hi
+
+    def to_dict(self):
+        return {"kind": "running", "lo": self.lo, "hi": self.hi}
+
+
+class QuantileSketch:
+    """
+    Mergeable log-bucket quantile sketch (DDSketch style).
+    Quantiles are within `rel_acc` relative error; memory grows with the
+    log of the value range, not with the number of values.
+    """
+
+    def __init__(self, rel_acc=SKETCH_REL_ACC):
+        self.rel_acc = rel_acc
+        self.gamma = (1 + rel_acc) / (1 - rel_acc)
+        self.log_gamma = math.log(self.gamma)
+        self.pos = {}
+        self.neg = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _add(self, store, values):
+        idx = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        keys, counts = np.unique(idx, return_counts=True)
+        for k, c in zip(keys.tolist(), counts.tolist()):
+            store[k] = store.get(k, 0) + c
+
+    def update(self, values):
+        v = np.asarray(values, dtype=float)
+        v = v[np.isfinite(v)]
+        if not v.size:
+            return
+        self._add(self.pos, v[v > 0])
+        self._add(self.neg, -v[v < 0])
+        self.zeros += int((v == 0).sum())
+        self.count += int(v.size)
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+
+    def _value(self, k):
+        return 2.0 * self.gamma ** k / (self.gamma + 1)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return max(-self._value(k), self.min)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return min(self._value(k), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "rel_acc": self.rel_acc,
+            "pos": {str(k): c for k, c in self.pos.items()},
+            "neg": {str(k): c for k, c in self.neg.items()},
+            "zeros": self.zeros,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        sk = cls(d["rel_acc"])
+        sk.pos = {int(k): c for k, c in d["pos"].items()}
+        sk.neg = {int(k): c for k, c in d["neg"].items()}
+        sk.zeros, sk.count = d["zeros"], d["count"]
+        sk.min, sk.max = d["min"], d["max"]
+        return sk
+
+
+class QuantileRange:
+    """Robust q_lo..q_hi range from a quantile sketch; frozen sketches stop updating."""
+
+    def __init__(self, q_lo=Q_LOW, q_hi=Q_HIGH, sketch=None, frozen=False):
+        self.q_lo, self.q_hi = q_lo, q_hi
+        self.sketch = sketch or QuantileSketch()
+        self.frozen = frozen
+
+    def update(self, values):
+        if not self.frozen:
+            self.sketch.update(values)
+
+    def freeze(self):
+        self.frozen = True
+
+    def bounds(self):
+        return self.sketch.quantile(self.q_lo), self.sketch.quantile(self.q_hi)
+
+    def to_dict(self):
+        return {"kind": "quantile", "q_lo": self.q_lo, "q_hi": self.q_hi, "sketch": self.sketch.to_dict()}
+
+
+def normalizer_from_dict(d, frozen=True):
+    """Rebuild a normalizer saved with to_dict()."""
+    if d["kind"] == "fixed":
+        return FixedRange(d["lo"], d["hi"])
+    if d["kind"] == "running":
+        return RunningMinMax(d["lo"], d["hi"])
+    if d["kind"] == "quantile":
+        return QuantileRange(d["q_lo"], d["q_hi"], QuantileSketch.from_dict(d["sketch"]), frozen=frozen)
+    raise ValueError(f"Unknown normalizer kind: {d['kind']}")
+
+
+def make_normalizers(mode=NORM_MODE, state_path=NORM_STATE):
+    """One normalizer per NORM_COLUMNS entry for the chosen mode."""
+    if mode == "fixed":
+        return {c: FixedRange(*FIXED_RANGES[c]) for c in NORM_COLUMNS}
+    if mode == "running":
+        return {c: RunningMinMax() for c in NORM_COLUMNS}
+    if mode == "quantile":
+        if state_path and os.path.exists(state_path):
+            return load_normalizers(state_path)
+        return {c: QuantileRange() for c in NORM_COLUMNS}
+    raise ValueError(f"Unknown NORM_MODE: {mode}")
+
+
+def save_normalizers(normalizers, path=NORM_STATE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({c: n.to_dict() for c, n in normalizers.items()}, f, indent=2)
+
+
+def load_normalizers(path=NORM_STATE, frozen=True):
+    with open(path, "r", encoding="utf-8") as f:
+        return {c: normalizer_from_dict(d, frozen) for c, d in json.load(f).items()}
+
+
+def current_bounds(normalizers, columns):
+    """
+    {column: (lo, hi)} for the columns present. A column with no finite value
+    yet is dropped if optional, otherwise it is an error (NaN bounds would turn
+    every index NaN).
+    """
+    stats = {}
+    for c in columns:
+        if c not in normalizers:
+            continue
+        lo, hi = normalizers[c].bounds()
+        if np.isfinite(lo) and np.isfinite(hi):
+            stats[c] = (lo, hi)
+        elif c not in OPTIONAL_COLUMNS:
+            raise ValueError(f"No finite {c} values to normalize with.")
+    return stats
+
+
+def update_normalizers(df, normalizers):
+    for col, norm in normalizers.items():
+        if col in df.columns:
+            norm.update(df[col].to_numpy(dtype=float))
+
+
+def table_bounds(df, normalizers):
+    """Update normalizers with df's columns and return their current bounds."""
+    update_normalizers(df, normalizers)
+    return current_bounds(normalizers, [c for c in normalizers if c in df.columns])
+
+
+# =========================
+# STREAMING MODULES 1-3
+# =========================
+def fit_normalizers(csv_path, normalizers, chunksize=CHUNK_ROWS):
+    """
+    First pass for quantile mode: feed the whole file to the sketches and
+    freeze them, so every row is normalized with the same range regardless
+    of chunking.
+    """
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, usecols=lambda c: c in normalizers):
+        update_normalizers(prepare_inputs(chunk), normalizers)
+    for norm in normalizers.values():
+        if isinstance(norm, QuantileRange):
+            norm.freeze()
+    return normalizers
+
+
+def stream_modules(csv_path, out_csv, normalizers, chunksize=CHUNK_ROWS):
+    """
+    Single pass over a chunked CSV: update normalizers, compute BVII/SDI/RDI
+    per chunk with the current bounds, carry SDI (and, with TIME_COL, the
+    last blast time) across chunks and append each chunk to out_csv.
+    Rows are sorted within a chunk, so with TIME_COL the file must be in
+    time order across chunks. Returns (rows written, last SDI).
+    """
+    os.makedirs(os.path.dirname(out_csv), exist_ok=True)
+    sdi, t0 = 0.0, None
+    rows = 0
+    for i, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize)):
+        chunk = prepare_inputs(chunk)
+        if t0 is not None and (time_values(chunk[TIME_COL]) < t0).any():
+            raise ValueError(
+                f"{csv_path}: rows {rows}-{rows + len(chunk) - 1} have {TIME_COL} before the last blast "
+                f"of the previous chunk ({t0:g}); sort the file by {TIME_COL} before streaming."
+            )
+        stats = table_bounds(chunk, normalizers)
+
+        out = compute_modules(chunk, stats=stats, sdi0=sdi, t0=t0)
+        if len(out):
+            sdi = float(out["SDI"].iloc[-1])
+            t0 = last_time(out) if last_time(out) is not None else t0
+        out.to_csv(out_csv, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        rows += len(out)
+    return rows, sdi
+
+
+def main():
+    normalizers = make_normalizers()
+    if NORM_MODE == "quantile" and not os.path.exists(NORM_STATE):
+        fit_normalizers(CSV_PATH, normalizers)
+        save_normalizers(normalizers)
+        print("Saved quantile sketches (frozen for later runs):", NORM_STATE)
+
+    rows, sdi = stream_modules(CSV_PATH, OUT_CSV, normalizers)
+
+    print(f"✅ Modules 1,2,3 streamed ({NORM_MODE} normalization).")
+    print("Saved:", OUT_CSV)
+    print(f"Rows: {rows}  Final SDI: {sdi:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# ==========================================================
+# Single entry point for the whole chain
+#   blast_log → demo_coords, site_law → (dem) terrain → rdi_terrain,
+#   modules_1_2_3 → module4
+# A stage is skipped when its inputs, parameters and upstream keys are
+# unchanged and its outputs still exist.
+# ==========================================================
+
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+
+PROJECT_DIR = r"C:\damsafe"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+TABLE_DIR = os.path.join(PROJECT_DIR, "outputs", "tables")
+RASTER_DIR = os.path.join(PROJECT_DIR, "outputs", "rasters")
+
+BLAST_CSV = os.path.join(DATA_DIR, "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
+DEMO_CSV = os.path.join(DATA_DIR, "Bhavani_Sagar_Controlled_Blasting_Dataset_DEMOcoords.csv")
+DEM_PATH = os.path.join(PROJECT_DIR, r"data\dem\processed\bhavanisagar_dem_utm.tif")
+SLOPE_TIF = os.path.join(RASTER_DIR, "slope_deg.tif")
+M123_CSV = os.path.join(TABLE_DIR, "modules_1_2_3_outputs.csv")
+M4_CSV = os.path.join(TABLE_DIR, "module4_dam_state.csv")
+RDI_CSV = os.path.join(TABLE_DIR, "module3_rdi_terrain.csv")
+SITE_LAW_JSON = os.path.join(TABLE_DIR, "site_law.json")
+SITE_LAW_FITS = os.path.join(TABLE_DIR, "site_law_fits.csv")
+
+# Where stage keys from the last run are kept
+MANIFEST_PATH = os.path.join(PROJECT_DIR, "outputs", "pipeline_state.json")
+
+# Terrain stage: "numpy" (terrain_engine, GDAL only) or "qgis" (terrain_bvii_sdi)
+TERRAIN_ENGINE = "numpy"
+
+# Stages to bring up to date (None = all) and whether to ignore the manifest
+TARGETS = None
+FORCE = False
+
+
+# =========================
+# STAGES
+# =========================
+class Stage:
+    """
+    name      stage id
+    run       fn(inputs) → in-memory result; inputs maps dep name → result
+    load      fn() → the same result read back from the stage's outputs
+    deps      upstream stage names whose results and keys feed this stage
+    after     stages that only have to run first (their keys are not used)
+    files     input files outside the pipeline, including the stage's scripts
+              and every local module they import (module_files), so edited
+              constants rerun it (hashed by size + mtime)
+    outputs   files the stage writes
+    params    anything else that should invalidate the stage when changed;
+              a callable is evaluated when the key is computed, i.e. after
+              every upstream stage has run
+    """
+
+    def __init__(self, name, run, load, deps=(), files=(), outputs=(), params=None, after=()):
+        self.name = name
+        self.run = run
+        self.load = load
+        self.deps = tuple(deps)
+        self.after = tuple(after)
+        self.files = tuple(files)
+        self.outputs = tuple(outputs)
+        self.params = params or {}
+
+
+def _read_csv(path):
+    import pandas as pd
+    return pd.read_csv(path)
+
+
+def _write_csv(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, index=False)
+
+
+def run_blast_log(inputs):
+    return _read_csv(BLAST_CSV)
+
+
+def run_demo_coords(inputs):
+    from generate_demo_blast_coords import demo_coords
+    df = demo_coords(inputs["blast_log"].copy())
+    _write_csv(df, DEMO_CSV)
+    return df
+
+
+def run_site_law(inputs):
+    """Calibrated K / alpha; the terrain scripts read them from SITE_LAW_JSON (site_law_params)."""
+    import site_law
+    fits, state = site_law.calibrate(inputs["blast_log"])
+    site_law.save_state(state, SITE_LAW_JSON)
+    _write_csv(fits, SITE_LAW_FITS)
+    return state
+
+
+def load_site_law():
+    from site_law import load_state
+    return load_state(SITE_LAW_JSON)
+
+
+def run_terrain(inputs):
+    """Terrain rasters; returns (slope array, geotransform) for the RDI stage."""
+    if TERRAIN_ENGINE == "qgis":
+        import terrain_bvii_sdi
+        terrain_bvii_sdi.main()
+        return load_terrain()
+
+    import terrain_engine as te
+    os.makedirs(RASTER_DIR, exist_ok=True)
+    dem, gt, proj = te.read_dem(DEM_PATH)
+    x, y, dam_inside = te.dam_point_in_dem(gt, dem.shape, proj)
+    te.warn_dam_outside(dam_inside)
+    layers = te.compute_terrain_layers(dem, gt, (x, y))
+    for name in te.FINAL_OUTPUTS:
+        te.write_raster(os.path.join(RASTER_DIR, name + ".tif"), layers[name], gt, proj, te.layer_nodata(name))
+    return layers["slope_deg"], gt
+
+
+def load_terrain():
+    from terrain_engine import read_dem
+    slope, gt, _ = read_dem(SLOPE_TIF)
+    return slope, gt
+
+
+def run_rdi_terrain(inputs):
+    from raster_sampling import ArrayGrid, inv_geotransform, sample_grid
+    from terrain_rdi_from_slope import SAMPLE_METHOD, terrain_rdi
+
+    df = inputs["demo_coords"].copy()
+    slope, gt = inputs["terrain"]
+    slopes = sample_grid(ArrayGrid(slope), inv_geotransform(gt),
+                         df["Blast_Easting"].to_numpy(float), df["Blast_Northing"].to_numpy(float),
+                         method=SAMPLE_METHOD)
+    df, _ = terrain_rdi(df, slopes)
+    _write_csv(df, RDI_CSV)
+    return df
+
+
+def run_modules_1_2_3(inputs):
+    from compute_modules_1_2_3 import compute_modules
+    df = compute_modules(inputs["blast_log"].copy())
+    _write_csv(df, M123_CSV)
+    return df
+
+
+def run_module4(inputs):
+    from compute_module4_dam_state import compute_module4
+    df, _ = compute_module4(inputs["modules_1_2_3"].copy())
+    _write_csv(df, M4_CSV)
+    return df
+
+
+def script(name):
+    return os.path.join(SCRIPT_DIR, name)
+
+
+def local_imports(path):
+    """Names of the scripts/ modules a script imports (anywhere in the file)."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(a.name.split(".")[0] for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    return {n for n in names if os.path.exists(script(n + ".py"))}
+
+
+def module_files(*modules):
+    """Scripts of `modules` and of every local module they import, transitively."""
+    seen, todo = set(), list(modules)
+    while todo:
+        name = todo.pop()
+        if name not in seen:
+            seen.add(name)
+            todo.extend(local_imports(script(name + ".py")))
+    return [script(n + ".py") for n in sorted(seen)]
+
+
+def terrain_params():
+    """
+    Terrain stage params: the engine and the (K, alpha) it will use, read
+    from SITE_LAW_JSON with the engine's fallback law. terrain_bvii_sdi.py
+    mirrors terrain_engine's K_DEFAULT / ALPHA_DEFAULT / SITE_LAW_SITE and
+    needs QGIS to import, so terrain_engine (NumPy only on import) supplies them.
+    """
+    from site_law import calibrated_law
+    from terrain_engine import ALPHA_DEFAULT, K_DEFAULT, SITE_LAW_SITE
+    K, alpha = calibrated_law(SITE_LAW_JSON, SITE_LAW_SITE, default=(K_DEFAULT, ALPHA_DEFAULT))
+    return {"engine": TERRAIN_ENGINE, "K": K, "alpha": alpha}
+
+
+def stages():
+    """The pipeline DAG, in a valid execution order."""
+    terrain_module = "terrain_bvii_sdi" if TERRAIN_ENGINE == "qgis" else "terrain_engine"
+    return [
+        Stage("blast_log", run_blast_log, lambda: _read_csv(BLAST_CSV), files=[BLAST_CSV]),
+        Stage("demo_coords", run_demo_coords, lambda: _read_csv(DEMO_CSV),
+              deps=["blast_log"], files=module_files("generate_demo_blast_coords"), outputs=[DEMO_CSV]),
+        Stage("site_law", run_site_law, load_site_law,
+              deps=["blast_log"], files=module_files("site_law"), outputs=[SITE_LAW_JSON, SITE_LAW_FITS]),
+        # Keyed on the resolved site law, so a refit that leaves K / alpha
+        # unchanged (e.g. new bands only) does not redo the rasters
+        Stage("terrain", run_terrain, load_terrain,
+              after=["site_law"], files=[DEM_PATH, *module_files(terrain_module)], outputs=[SLOPE_TIF],
+              params=terrain_params),
+        Stage("rdi_terrain", run_rdi_terrain, lambda: _read_csv(RDI_CSV),
+              deps=["demo_coords", "terrain"], files=module_files("terrain_rdi_from_slope", "raster_sampling"),
+              outputs=[RDI_CSV]),
+        Stage("modules_1_2_3", run_modules_1_2_3, lambda: _read_csv(M123_CSV),
+              deps=["blast_log"], files=module_files("compute_modules_1_2_3"), outputs=[M123_CSV]),
+        Stage("module4", run_module4, lambda: _read_csv(M4_CSV),
+              deps=["modules_1_2_3"], files=module_files("compute_module4_dam_state"), outputs=[M4_CSV]),
+    ]
+
+
+# =========================
+# RUNNER
+# =========================
+def file_signature(path):
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+def stage_key(stage, dep_keys):
+    payload = {
+        "stage": stage.name,
+        "params": stage.params() if callable(stage.params) else stage.params,
+        "files": {p: file_signature(p) for p in stage.files},
+        "deps": {d: dep_keys[d] for d in stage.deps},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def load_manifest(path=None):
+    path = path or MANIFEST_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=None):
+    path = path or MANIFEST_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def select(all_stages, targets):
+    """Targets plus everything upstream of them, in DAG order."""
+    if targets is None:
+        return all_stages
+    by_name = {s.name: s for s in all_stages}
+    unknown = set(targets) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown pipeline stages: {sorted(unknown)}")
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].deps + by_name[name].after)
+    return [s for s in all_stages if s.name in needed]
+
+
+def run_pipeline(targets=TARGETS, force=FORCE):
+    """Bring the selected stages up to date. Returns {stage: "ran" | "skipped"}."""
+    plan = select(stages(), targets)
+    manifest = load_manifest()
+    keys, results, loaders, status = {}, {}, {}, {}
+
+    def result(name):
+        if name not in results:
+            results[name] = loaders[name]()
+        return results[name]
+
+    for st in plan:
+        key = stage_key(st, keys)
+        keys[st.name] = key
+        fresh = manifest.get(st.name) == key and all(os.path.exists(p) for p in st.outputs)
+        if fresh and not force:
+            loaders[st.name] = st.load
+            status[st.name] = "skipped"
+            continue
+
+        t0 = time.perf_counter()
+        results[st.name] = st.run({d: result(d) for d in st.deps})
+        manifest[st.name] = key
+        save_manifest(manifest)
+        status[st.name] = "ran"
+        print(f"  {st.name:<14} ran in {time.perf_counter() - t0:.2f} s")
+    return status
+
+
+def main():
+    targets = sys.argv[1:] or TARGETS
+    status = run_pipeline(targets)
+    ran = [n for n, s in status.items() if s == "ran"]
+    print(f"✅ Pipeline up to date: {len(ran)} stage(s) ran, {len(status) - len(ran)} skipped.")
+    for name, s in status.items():
+        print(f"   {name:<14} {s}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# ==========================================================
+# Local query service for proposed blasts
+# Newline-delimited JSON over TCP: {"blasts": [{"easting", "northing",
+# "charge_kg", "holes", "time", ...}]} → predicted PPV, BVII, RDI, SDI (and
+# each blast's increment), Dam_State_M4. SDI continues from the checkpoint
+# as sdi_state.py would apply the blasts ("time" in TIME_COL units).
+# {"op": "reload"} re-reads the checkpoint and rasters. Nothing is written.
+# ==========================================================
+
+import os
+import json
+import socket
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+import sdi_state
+from compute_modules_1_2_3 import (
+    CSV_PATH, DEFAULT_SLOPE_DEG, SDI_GAIN, compute_modules, norm_stats, prepare_inputs,
+)
+from compute_module4_dam_state import STATE_LABELS, dam_state_codes
+from instrumentation import stage
+from raster_mmap import open_raster
+from sdi_timeline import DECAY, decayed_cumsum, real_delta_t
+from terrain_engine import OUT_DIR, site_law_params
+
+# =========================
+# CONFIG
+# =========================
+HOST = "127.0.0.1"
+PORT = 8765
+
+SLOPE_TIF = os.path.join(OUT_DIR, "slope_deg.tif")
+DIST_TIF = os.path.join(OUT_DIR, "distance_to_dam.tif")
+
+BATCH_WINDOW_MS = 5        # wait this long for more requests before evaluating
+MAX_BATCH_BLASTS = 50_000  # evaluate early once this many blasts are queued
+
+
+# =========================
+# MODEL (loaded once)
+# =========================
+class ModelState:
+    """
+    One consistent snapshot of what requests are evaluated against. A reload
+    builds a new one, so a batch in flight keeps the snapshot it started with.
+    t0 is the checkpoint's last blast time (None without timestamps).
+    """
+
+    def __init__(self, stats, sdi0=0.0, t0=None, failure_counter=0, law=None, slope=None, dist=None):
+        self.stats = stats
+        self.sdi0 = sdi0
+        self.t0 = t0
+        self.failure_counter = failure_counter
+        self.law = law
+        self.slope = slope
+        self.dist = dist
+
+
+def load_model_state():
+    """ModelState from the SDI checkpoint, the site law and the rasters."""
+    state = sdi_state.load_state()
+    if state is not None:
+        stats, sdi0, t0 = state["norm_stats"], state["last_sdi"], state.get("last_time")
+        failure_counter = state["failure_counter"]
+    else:
+        # No checkpoint yet: normalize like a full run over the blast log
+        stats, sdi0, t0, failure_counter = norm_stats(prepare_inputs(pd.read_csv(CSV_PATH))), 0.0, None, 0
+
+    return ModelState(
+        stats, sdi0, t0, failure_counter,
+        # Site law as of this load; reload picks up a recalibration
+        law=site_law_params(),
+        slope=open_raster(SLOPE_TIF) if os.path.exists(SLOPE_TIF) else None,
+        dist=open_raster(DIST_TIF) if os.path.exists(DIST_TIF) else None,
+    )
+
+
+def request_sdi(bvii, t, sdi0, t0=None, decay=DECAY):
+    """
+    SDI increments and values of one request's blasts continuing from the
+    checkpoint, as compute_modules does: with times (sorted), Delta_t is the
+    real gap (the first measured from t0) and SDI recovers at `decay`;
+    without, Delta_t = 1 and nothing decays. Returns (increments, SDI).
+    """
+    if t is None:
+        inc = SDI_GAIN * bvii
+        return inc, sdi0 + np.cumsum(inc)
+    inc = SDI_GAIN * bvii * real_delta_t(t, t0)
+    if decay:
+        return inc, decayed_cumsum(inc, t, decay, sdi0, t0)
+    return inc, sdi0 + np.cumsum(inc)
+
+
+class BlastModel:
+    """Evaluates requests against the current ModelState."""
+
+    def __init__(self, state=None):
+        self.state = state or load_model_state()
+
+    def load(self):
+        # Built off to the side, then swapped in with one assignment
+        self.state = load_model_state()
+
+    def validate(self, blasts):
+        """Raise ValueError for a request evaluate() can't handle, before it joins a batch."""
+        s = self.state
+        if not isinstance(blasts, list):
+            raise ValueError("blasts must be a list of objects")
+        for i, blast in enumerate(blasts):
+            if not isinstance(blast, dict):
+                raise ValueError(f"blast {i}: expected an object")
+            for key in ("easting", "northing", "charge_kg"):
+                if key not in blast:
+                    raise ValueError(f"blast {i}: missing {key}")
+            for key in ("easting", "northing", "charge_kg", "distance_m", "charge_factor", "holes", "hole_depth_m",
+                        "time"):
+                if key in blast and (isinstance(blast[key], bool) or not isinstance(blast[key], (int, float))):
+                    raise ValueError(f"blast {i}: {key} must be a number")
+            if not blast["charge_kg"] > 0:
+                raise ValueError(f"blast {i}: charge_kg must be positive")
+            if "distance_m" not in blast and s.dist is None:
+                raise ValueError(f"blast {i}: no distance raster loaded; pass distance_m")
+            if ("time" in blast) != ("time" in blasts[0]):
+                raise ValueError(f"blast {i}: give a time for every blast of a request or for none")
+            if "time" in blast and s.t0 is not None and not blast["time"] >= s.t0:
+                raise ValueError(f"blast {i}: time {blast['time']:g} is before the last applied blast ({s.t0:g})")
+
+    def inputs(self, blasts, s):
+        """Module 1-3 input table for a list of blast dicts, against ModelState s."""
+        df = pd.DataFrame(blasts)
+        xs = df["easting"].to_numpy(float)
+        ys = df["northing"].to_numpy(float)
+        charge = df["charge_kg"].to_numpy(float)
+
+        if "distance_m" in df.columns:
+            dist = df["distance_m"].to_numpy(float)
+        elif s.dist is not None:
+            dist = s.dist.sample(xs, ys)
+        else:
+            raise ValueError("No distance raster loaded; pass distance_m with each blast.")
+
+        slope = s.slope.sample(xs, ys) if s.slope is not None else np.full(len(df), np.nan)
+
+        K, alpha = s.law
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ppv = K * np.power(np.maximum(dist, 1.0) / np.sqrt(charge), -alpha)
+
+        out = pd.DataFrame({
+            "PPV_mm_per_s": ppv,
+            "Distance_from_Dam_m": dist,
+            # Same fallback as Module 3 when slope can't be sampled
+            "Slope_deg": np.where(np.isfinite(slope), slope, DEFAULT_SLOPE_DEG),
+        })
+
+        if "Charge_Factor_kg_per_m" in s.stats:
+            if "charge_factor" in df.columns:
+                cf = df["charge_factor"].to_numpy(float)
+            elif {"holes", "hole_depth_m"} <= set(df.columns):
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    cf = charge / (df["holes"].to_numpy(float) * df["hole_depth_m"].to_numpy(float))
+            else:
+                cf = np.full(len(df), np.nan)
+            # Unknown charge factor contributes nothing, as in Module 1
+            out["Charge_Factor_kg_per_m"] = np.where(np.isfinite(cf), cf, s.stats["Charge_Factor_kg_per_m"][0])
+        return out
+
+    def evaluate(self, batches):
+        """
+        Evaluate several requests' blasts in one pass.
+        batches: list of blast lists. Returns one list of result dicts per request.
+        """
+        s = self.state
+        sizes = [len(b) for b in batches]
+        blasts = [blast for b in batches for blast in b]
+        # BVII / RDI for every blast in one pass; no TIME_COL here, so rows keep request order
+        df = compute_modules(self.inputs(blasts, s), stats=s.stats)
+        bvii = df["BVII"].to_numpy()
+        t = np.array([blast.get("time", np.nan) for blast in blasts], dtype=float)
+
+        # SDI continues from the checkpoint separately for each request, in time order
+        inc, sdi = np.empty(len(df)), np.empty(len(df))
+        states = np.empty(len(df), dtype=object)
+        start = 0
+        for n in sizes:
+            idx = np.arange(start, start + n)
+            timed = n > 0 and "time" in blasts[start]
+            if timed:
+                idx = idx[np.argsort(t[idx], kind="stable")]
+            inc[idx], sdi[idx] = request_sdi(bvii[idx], t[idx] if timed else None, s.sdi0, s.t0, DECAY)
+            codes, _ = dam_state_codes(sdi[idx], s.failure_counter)
+            states[idx] = STATE_LABELS[codes]
+            start += n
+
+        rows = pd.DataFrame({
+            "ppv_mm_per_s": df["PPV_mm_per_s"].to_numpy(),
+            "distance_m": df["Distance_from_Dam_m"].to_numpy(),
+            "slope_deg": df["Slope_deg"].to_numpy(),
+            "bvii": df["BVII"].to_numpy(),
+            "rdi": df["RDI"].to_numpy(),
+            "sdi_increment": inc,
+            "sdi": sdi,
+            "dam_state_m4": states,
+        })
+        rows = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+
+        out, start = [], 0
+        for n in sizes:
+            out.append(rows[start:start + n])
+            start += n
+        return out
+
+
+# =========================
+# MICRO-BATCHING
+# =========================
+class MicroBatcher:
+    """Collects requests for BATCH_WINDOW_MS and evaluates them together."""
+
+    def __init__(self, model, window_ms=BATCH_WINDOW_MS, max_blasts=MAX_BATCH_BLASTS):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_blasts = max_blasts
+        self.queue = asyncio.Queue()
+
+    async def submit(self, blasts):
+        self.model.validate(blasts)         # a bad request fails alone, never its batch
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((blasts, fut))
+        return await fut
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            n = len(pending[0][0])
+            deadline = loop.time() + self.window
+            while n < self.max_blasts:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                n += len(item[0])
+
+            # Evaluated off the event loop so connections keep being served
+            try:
+                with stage("query_service.query_batch", items=n, unit="blasts"):
+                    results = await loop.run_in_executor(
+                        None, self.model.evaluate, [blasts for blasts, _ in pending])
+            except Exception:
+                # Retry one request at a time so only the failing one gets the error
+                results = []
+                for blasts, fut in pending:
+                    try:
+                        results.append((await loop.run_in_executor(None, self.model.evaluate, [blasts]))[0])
+                    except Exception as exc:
+                        if not fut.done():
+                            fut.set_exception(exc)
+                        results.append(None)
+            for (_, fut), res in zip(pending, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+
+# =========================
+# SERVER
+# =========================
+async def handle(reader, writer, batcher):
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            req = json.loads(line)
+            if req.get("op") == "reload":
+                await asyncio.get_running_loop().run_in_executor(None, batcher.model.load)
+                resp = {"ok": True}
+            elif req.get("op") == "ping":
+                resp = {"ok": True}
+            else:
+                blasts = req.get("blasts") or []
+                resp = {"results": await batcher.submit(blasts) if blasts else []}
+        except Exception as exc:
+            resp = {"error": f"{type(exc).__name__}: {exc}"}
+        writer.write((json.dumps(resp) + "\n").encode("utf-8"))
+        await writer.drain()
+    writer.close()
+
+
+async def serve(host=HOST, port=PORT):
+    model = BlastModel()
+    batcher = MicroBatcher(model)
+    worker = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(lambda r, w: handle(r, w, batcher), host, port)
+    s = model.state
+    print(f"✅ Query service listening on {host}:{port} (SDI {s.sdi0:.4f}, failure counter {s.failure_counter})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+def query(blasts, host=HOST, port=PORT, timeout=30.0):
+    """Blocking client: send one request and return its result rows."""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall((json.dumps({"blasts": blasts}) + "\n").encode("utf-8"))
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                break
+            buf += chunk
+    resp = json.loads(buf)
+    if "error" in resp:
+        raise RuntimeError(resp["error"])
+    return resp["results"]
+
+
+def main():
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# ==========================================================
+# Content-addressed cache for derived rasters
+# Slope is keyed on a hash of the DEM bytes and the stage parameters and
+# stored as float64 .npy (NaN = nodata), so a hit returns exactly what a
+# miss computes; scenario sweeps only recompute distance and PPV/BVII.
+# ==========================================================
+
+import os
+import json
+import hashlib
+import numpy as np
+
+from raster_output import load_gdal
+from terrain_engine import (
+    DEM_PATH,
+    OUT_DIR,
+    FINAL_OUTPUTS,
+    bvii_from_layers,
+    dam_point_in_dem,
+    distance_to_cell,
+    horn_slope,
+    layer_nodata,
+    ppv_from_distance,
+    read_dem,
+    warn_dam_outside,
+    world_to_cell,
+    write_raster,
+)
+
+PROJECT_DIR = r"C:\damsafe"
+CACHE_DIR = os.path.join(PROJECT_DIR, "outputs", "cache")
+
+# Total size kept on disk before least-recently-used entries are dropped
+MAX_CACHE_BYTES = 20 * 1024 ** 3
+
+# Bump when a stage's algorithm changes so old entries stop matching
+CACHE_VERSION = 2
+
+# Stage parameters that feed the cache keys
+SLOPE_PARAMS = {"algorithm": "horn", "z_factor": 1.0, "compute_edges": True}
+
+DIGEST_INDEX = "digests.json"
+HASH_CHUNK = 16 * 1024 ** 2
+
+
+def file_digest(path, cache_dir=CACHE_DIR):
+    """
+    SHA-256 of a file's bytes. Digests are remembered per (path, size,
+    mtime) so an unchanged DEM is not re-read on every run.
+    """
+    st = os.stat(path)
+    sig = [st.st_size, st.st_mtime]
+    index_path = os.path.join(cache_dir, DIGEST_INDEX)
+
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    entry = index.get(os.path.abspath(path))
+    if entry and entry["sig"] == sig:
+        return entry["sha256"]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    index[os.path.abspath(path)] = {"sig": sig, "sha256": digest}
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = index_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, index_path)
+    return digest
+
+
+def stage_key(stage, **parts):
+    """Deterministic key for a stage from its inputs and parameters."""
+    blob = json.dumps({"stage": stage, "version": CACHE_VERSION, **parts}, sort_keys=True)
+    return f"{stage}-{hashlib.sha256(blob.encode('utf-8')).hexdigest()[:32]}"
+
+
+class RasterCache:
+    """Arrays stored as .npy under their stage key; file mtime doubles as the LRU clock."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def get(self, key):
+        """Cached array or None; a hit refreshes the entry's LRU time."""
+        p = self.path(key)
+        if not os.path.exists(p):
+            return None
+        os.utime(p, None)
+        return np.load(p)
+
+    def put(self, key, arr):
+        """Store an array atomically, then evict down to max_bytes."""
+        p = self.path(key)
+        tmp = os.path.join(self.cache_dir, key + ".part.npy")
+        np.save(tmp, arr)
+        os.replace(tmp, p)
+        self.evict(keep=p)
+
+    def evict(self, keep=None):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy") or name.endswith(".part.npy"):
+                continue
+            p = os.path.join(self.cache_dir, name)
+            st = os.stat(p)
+            entries.append((st.st_mtime, st.st_size, p))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if p == keep:
+                continue
+            os.remove(p)
+            total -= size
+
+
+def cached_terrain_layers(dem_path, cache=None):
+    """
+    Slope from the cache (computed on miss); distance, PPV and BVII/SDI always fresh.
+    The DEM pixels are only read when the slope stage misses.
+    Returns (layers, gt, proj, dam_inside, hits).
+    """
+    cache = cache or RasterCache()
+
+    ds = load_gdal().Open(dem_path)
+    if ds is None:
+        raise FileNotFoundError(f"❌ DEM failed to load:\n{dem_path}")
+    shape = (ds.RasterYSize, ds.RasterXSize)
+    gt, proj = ds.GetGeoTransform(), ds.GetProjection()
+    ds = None
+
+    x, y, dam_inside = dam_point_in_dem(gt, shape, proj)
+    row, col = world_to_cell(gt, x, y, shape)
+    dem_sha = file_digest(dem_path, cache.cache_dir)
+    hits = []
+
+    slope_key = stage_key("slope", dem=dem_sha, **SLOPE_PARAMS)
+    slope = cache.get(slope_key)
+    if slope is None:
+        dem, _, _ = read_dem(dem_path)
+        slope = horn_slope(dem, gt, z_factor=SLOPE_PARAMS["z_factor"])
+        dem = None
+        cache.put(slope_key, slope)
+    else:
+        hits.append("slope_deg")
+
+    dist = distance_to_cell(shape, gt, row, col)
+    ppv = ppv_from_distance(dist)
+    bvii = bvii_from_layers(ppv, dist, slope)
+
+    layers = {
+        "slope_deg": slope,
+        "distance_to_dam": dist,
+        "ppv_est": ppv,
+        "bvii": bvii,
+        # SDI baseline (SDI = BVII)
+        "sdi": bvii,
+    }
+    return layers, gt, proj, dam_inside, hits
+
+
+def main():
+    if not os.path.exists(DEM_PATH):
+        raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    layers, gt, proj, dam_inside, hits = cached_terrain_layers(DEM_PATH)
+    warn_dam_outside(dam_inside)
+
+    for name in FINAL_OUTPUTS:
+        write_raster(os.path.join(OUT_DIR, name + ".tif"), layers[name], gt, proj, layer_nodata(name))
+
+    print("\n✅ SUCCESS — Outputs created in:")
+    print("   ", OUT_DIR)
+    print("   Reused from cache:", ", ".join(hits) if hits else "none")
+    print("   Cache:", CACHE_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# ==========================================================
+# Memory-mapped raster access
+# Derived rasters are materialized once as .npy (float32, NaN = nodata) with a
+# JSON sidecar for the geotransform, then opened with mmap_mode="r". Each
+# materialization gets a new versioned file, so open maps are never replaced.
+# ==========================================================
+
+import os
+import glob
+import json
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+from raster_output import load_gdal
+from raster_sampling import inv_geotransform, sample_grid, world_to_pixel
+
+PROJECT_DIR = r"C:\damsafe"
+RASTER_DIR = os.path.join(PROJECT_DIR, "outputs", "rasters")
+MMAP_DIR = os.path.join(RASTER_DIR, "mmap")
+
+# Rasters materialized by main()
+LAYERS = ("slope_deg", "distance_to_dam", "ppv_est", "bvii", "sdi")
+
+MMAP_DTYPE = "float32"
+SIDECAR_EXT = ".json"
+
+# Rows copied per GDAL read while materializing
+READ_ROWS = 512
+
+
+def mmap_paths(name, mmap_dir=MMAP_DIR, version=None):
+    """
+    (.npy path, sidecar path) for a layer name. The .npy path is that of
+    `version`, or the one the sidecar currently points to (None if none).
+    """
+    base = os.path.join(mmap_dir, name)
+    meta_path = base + SIDECAR_EXT
+    if version is not None:
+        return f"{base}-{version}.npy", meta_path
+    if not os.path.exists(meta_path):
+        return None, meta_path
+    with open(meta_path, "r", encoding="utf-8") as f:
+        npy = json.load(f).get("npy")
+    return (os.path.join(mmap_dir, npy) if npy else None), meta_path
+
+
+def remove_stale(name, keep, mmap_dir=MMAP_DIR):
+    """
+    Delete older versions of a layer. Versions still mapped by this or another
+    process cannot be deleted on Windows; they are left for the next run.
+    """
+    _open_cached.cache_clear()
+    for path in glob.glob(os.path.join(mmap_dir, glob.escape(name) + "-*.npy")):
+        if os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def source_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+def materialize(tif_path, name=None, mmap_dir=MMAP_DIR, dtype=MMAP_DTYPE):
+    """
+    Copy band 1 of a raster into <mmap_dir>/<name>.npy (+ sidecar) unless
+    an up-to-date copy exists. Returns the .npy path.
+    """
+    name = name or os.path.splitext(os.path.basename(tif_path))[0]
+    npy_path, meta_path = mmap_paths(name, mmap_dir)
+    sig = source_signature(tif_path)
+
+    if npy_path is not None and os.path.exists(npy_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("source") == os.path.abspath(tif_path) and meta.get("source_signature") == sig:
+            return npy_path
+
+    # New version name: readers of the previous .npy keep their map untouched
+    version = hashlib.sha1(json.dumps([os.path.abspath(tif_path), sig, dtype]).encode()).hexdigest()[:12]
+    npy_path, _ = mmap_paths(name, mmap_dir, version)
+
+    ds = load_gdal().Open(tif_path)
+    if ds is None:
+        raise FileNotFoundError("Cannot open raster: " + tif_path)
+    band = ds.GetRasterBand(1)
+    nx, ny = ds.RasterXSize, ds.RasterYSize
+    nodata = band.GetNoDataValue()
+    scale, offset = band.GetScale() or 1.0, band.GetOffset() or 0.0
+
+    os.makedirs(mmap_dir, exist_ok=True)
+    tmp = npy_path + ".tmp.npy"
+    arr = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(ny, nx))
+    for y0 in range(0, ny, READ_ROWS):
+        h = min(READ_ROWS, ny - y0)
+        block = band.ReadAsArray(0, y0, nx, h).astype("float64")
+        if nodata is not None:
+            block[block == nodata] = np.nan
+        if scale != 1.0 or offset != 0.0:
+            block = block * scale + offset
+        arr[y0:y0 + h] = block
+    arr.flush()
+    del arr
+
+    meta = {
+        "geotransform": list(ds.GetGeoTransform()),
+        "projection": ds.GetProjection(),
+        "shape": [ny, nx],
+        "dtype": dtype,
+        "npy": os.path.basename(npy_path),
+        "source": os.path.abspath(tif_path),
+        "source_signature": sig,
+    }
+    ds = None
+
+    os.replace(tmp, npy_path)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    remove_stale(name, npy_path, mmap_dir)
+    return npy_path
+
+
+class MappedRaster:
+    """
+    Read-only memory-mapped raster with its geotransform.
+    Exposes nx / ny / gather like raster_sampling.BlockCache, so the same
+    nearest/bilinear sampling runs on it without any GDAL reads.
+    """
+
+    def __init__(self, npy_path, meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.path = npy_path
+        self.array = np.load(npy_path, mmap_mode="r")
+        self.gt = tuple(meta["geotransform"])
+        self.projection = meta.get("projection", "")
+        self.ny, self.nx = self.array.shape
+        self.inv_gt = inv_geotransform(self.gt)
+        if self.inv_gt is None:
+            raise RuntimeError(f"Raster geotransform is not invertible: {meta_path}")
+
+    def gather(self, rows, cols):
+        """Values at integer (rows, cols) inside the raster, as float64."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        return self.array[rows, cols].astype("float64")
+
+    def sample(self, xs, ys, method="nearest"):
+        """Values at world coordinates; NaN for nodata and out-of-extent points."""
+        return sample_grid(self, self.inv_gt, xs, ys, method)
+
+    def window(self, row0, col0, h, w):
+        """Zero-copy view of a pixel window (clipped to the raster) and its geotransform."""
+        r0, c0 = max(row0, 0), max(col0, 0)
+        r1, c1 = min(row0 + h, self.ny), min(col0 + w, self.nx)
+        gt = self.gt
+        win_gt = (gt[0] + c0 * gt[1] + r0 * gt[2], gt[1], gt[2],
+                  gt[3] + c0 * gt[4] + r0 * gt[5], gt[4], gt[5])
+        return self.array[r0:r1, c0:c1], win_gt
+
+    def window_around(self, x, y, radius):
+        """Zero-copy view of the cells within `radius` (world units) of (x, y)."""
+        px, py = world_to_pixel(self.inv_gt, x, y)
+        rc = int(np.ceil(radius / abs(self.gt[1])))
+        rr = int(np.ceil(radius / abs(self.gt[5])))
+        return self.window(int(np.floor(py)) - rr, int(np.floor(px)) - rc, 2 * rr + 1, 2 * rc + 1)
+
+
+@lru_cache(maxsize=16)
+def _open_cached(npy_path, meta_path):
+    return MappedRaster(npy_path, meta_path)
+
+
+def open_mapped(name, mmap_dir=MMAP_DIR):
+    """
+    MappedRaster for a layer name, shared within the process.
+    Picks up a new version as soon as the layer is re-materialized.
+    """
+    npy_path, meta_path = mmap_paths(name, mmap_dir)
+    if npy_path is None:
+        raise FileNotFoundError(f"Layer not materialized: {name} (in {mmap_dir})")
+    return _open_cached(npy_path, meta_path)
+
+
+def open_raster(tif_path, mmap_dir=MMAP_DIR):
+    """Materialize a GeoTIFF if needed and return its MappedRaster."""
+    name = os.path.splitext(os.path.basename(tif_path))[0]
+    materialize(tif_path, name, mmap_dir)
+    return open_mapped(name, mmap_dir)
+
+
+def main():
+    done = []
+    for name in LAYERS:
+        tif = os.path.join(RASTER_DIR, name + ".tif")
+        if os.path.exists(tif):
+            done.append(materialize(tif, name))
+    print(f"✅ Memory-mapped rasters ready: {len(done)} of {len(LAYERS)}")
+    print("Saved:", MMAP_DIR)
+    for path in done:
+        print("  ", os.path.basename(path))
+
+
+if __name__ == "__main__":
+    main()
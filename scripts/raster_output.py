@@ -0,0 +1,237 @@
+# ==========================================================
+# Raster output profile
+# "cog": tiled, compressed GeoTIFF with overviews (cloud-optimized).
+# "plain": striped, uncompressed Float32 (the original GTiff defaults).
+# Index rasters (BVII / SDI / RDI) can be stored as Float16 or scaled Int16.
+# ==========================================================
+
+import os
+import numpy as np
+
+OUTPUT_PROFILE = "cog"          # "cog" or "plain"
+
+BLOCK_SIZE = 512                # internal tile edge (cells)
+COMPRESS = "DEFLATE"            # "ZSTD" / "LERC_ZSTD" if your GDAL build has them
+OVERVIEW_RESAMPLING = "AVERAGE"
+OVERVIEW_MIN_SIZE = 256         # stop adding overview levels below this many cells
+
+# Precision of the 0..~1 index rasters: "float32", "float16" or "int16"
+# Float16 keeps ~3 significant digits; Int16 stores round(value / scale)
+# with the scale recorded in the band so GDAL readers unscale it.
+INDEX_LAYERS = ("bvii", "sdi", "rdi")
+INDEX_PRECISION = "float32"
+INT16_SCALE = 1e-4              # finest step; range ±3.2767 at this scale
+INT16_NODATA = -32768
+INT16_MAX = 32767
+
+PRECISIONS = ("float32", "float16", "int16")
+
+
+def load_gdal():
+    """Import GDAL on first use, with Python exceptions enabled (future-proof)."""
+    from osgeo import gdal
+    gdal.UseExceptions()
+    return gdal
+
+
+def precision_for(path_or_name):
+    """INDEX_PRECISION for index rasters (by file/layer name), float32 for the rest."""
+    name = os.path.splitext(os.path.basename(path_or_name))[0]
+    return INDEX_PRECISION if name in INDEX_LAYERS else "float32"
+
+
+def int16_scale(arr):
+    """INT16_SCALE, or the coarser step that keeps the largest |value| in range."""
+    with np.errstate(invalid="ignore"):
+        peak = np.nanmax(np.abs(arr)) if np.isfinite(arr).any() else 0.0
+    return max(INT16_SCALE, float(peak) / INT16_MAX)
+
+
+def storage(precision, nodata, scale=INT16_SCALE):
+    """(GDAL type, stored nodata, scale, extra creation options) for a precision."""
+    gdal = load_gdal()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown raster precision: {precision}")
+    if precision == "int16":
+        return gdal.GDT_Int16, INT16_NODATA, scale, []
+    if precision == "float16":
+        # Nodata must survive the round trip to half precision (-9999 → -10000)
+        return gdal.GDT_Float32, float(np.float16(nodata)), None, ["NBITS=16"]
+    return gdal.GDT_Float32, nodata, None, []
+
+
+def encode(arr, precision, nodata, stored_nodata, scale=INT16_SCALE):
+    """
+    Values as written for `precision`; NaN and `nodata` cells → stored nodata.
+    Int16 values outside ±INT16_MAX × scale are clipped, with a warning.
+    """
+    arr = np.asarray(arr, dtype="float64")
+    missing = np.isnan(arr) | (arr == nodata)
+    if precision == "int16":
+        q = np.round(arr / scale)
+        clipped = int(np.count_nonzero(~missing & (np.abs(q) > INT16_MAX)))
+        if clipped:
+            print(f"⚠️ {clipped} cell(s) outside ±{INT16_MAX * scale:g} clipped to the Int16 range "
+                  "(use a coarser scale or float32).")
+        np.clip(q, -INT16_MAX, INT16_MAX, out=q)
+        return np.where(missing, stored_nodata, q).astype("int16")
+    return np.where(missing, stored_nodata, arr).astype("float32")
+
+
+def creation_options(precision="float32"):
+    """GTiff options for the cog profile (COPY_SRC_OVERVIEWS is added by the writers)."""
+    predictor = 2 if precision == "int16" else 3
+    return [
+        "TILED=YES",
+        f"BLOCKXSIZE={BLOCK_SIZE}",
+        f"BLOCKYSIZE={BLOCK_SIZE}",
+        f"COMPRESS={COMPRESS}",
+        f"PREDICTOR={predictor}",
+        "BIGTIFF=IF_SAFER",
+        "NUM_THREADS=ALL_CPUS",
+    ] + storage(precision, 0.0)[3]
+
+
+def overview_levels(nx, ny, min_size=OVERVIEW_MIN_SIZE):
+    """Decimation factors 2, 4, 8, ... until the overview fits in min_size."""
+    levels, f = [], 2
+    while max(nx, ny) / f >= min_size:
+        levels.append(f)
+        f *= 2
+    return levels
+
+
+def _finish_cog(src, path, precision):
+    """Build overviews on `src` and copy it to `path` with the cog layout."""
+    gdal = load_gdal()
+    levels = overview_levels(src.RasterXSize, src.RasterYSize)
+    if levels:
+        src.BuildOverviews(OVERVIEW_RESAMPLING, levels)
+    options = creation_options(precision) + ["COPY_SRC_OVERVIEWS=YES"]
+    out = gdal.GetDriverByName("GTiff").CreateCopy(path, src, options=options)
+    out.FlushCache()
+    out = None
+
+
+def write_cog(path, arr, gt, proj, nodata, precision="float32"):
+    """Write one band with the cog profile. NaN → nodata; Int16 scale fits the data."""
+    gdal = load_gdal()
+    scale = int16_scale(arr) if precision == "int16" else None
+    gdt, stored_nodata, scale, _ = storage(precision, nodata, scale)
+    mem = gdal.GetDriverByName("MEM").Create("", arr.shape[1], arr.shape[0], 1, gdt)
+    mem.SetGeoTransform(gt)
+    mem.SetProjection(proj)
+    band = mem.GetRasterBand(1)
+    band.SetNoDataValue(stored_nodata)
+    if scale is not None:
+        band.SetScale(scale)
+        band.SetOffset(0.0)
+    band.WriteArray(encode(arr, precision, nodata, stored_nodata, scale))
+    _finish_cog(mem, path, precision)
+    mem = None
+
+
+def _create_stage(path, nx, ny, gt, proj, gdt, stored_nodata, scale, extra):
+    """Uncompressed tiled GTiff with the band's nodata/scale set (stored_nodata=None = no nodata)."""
+    gdal = load_gdal()
+    ds = gdal.GetDriverByName("GTiff").Create(path, nx, ny, 1, gdt, options=[
+        "TILED=YES", f"BLOCKXSIZE={BLOCK_SIZE}", f"BLOCKYSIZE={BLOCK_SIZE}", "BIGTIFF=IF_SAFER",
+    ] + extra)
+    ds.SetGeoTransform(gt)
+    ds.SetProjection(proj)
+    band = ds.GetRasterBand(1)
+    if stored_nodata is not None:
+        band.SetNoDataValue(stored_nodata)
+    if scale is not None:
+        band.SetScale(scale)
+        band.SetOffset(0.0)
+    return ds
+
+
+def create_staging(path, nx, ny, gt, proj, nodata, precision=None):
+    """
+    Uncompressed tiled staging file for `path` (path + ".stage.tif"), for
+    writers that produce the raster block by block. Fill it with write_block,
+    then finish_staging. nodata=None = no nodata.
+    precision=None picks it from the file name (precision_for).
+    Int16 is staged as Float32 and quantized in finish_staging, once the
+    largest |value| of the whole raster (and so the scale) is known.
+    """
+    precision = precision or precision_for(path)
+    stage_precision = "float32" if precision == "int16" else precision
+    gdt, stored_nodata, _, extra = storage(stage_precision, nodata if nodata is not None else np.nan)
+    ds = _create_stage(path + ".stage.tif", nx, ny, gt, proj, gdt,
+                       stored_nodata if nodata is not None else None, None, extra)
+    return {"ds": ds, "path": path, "precision": precision, "stage_precision": stage_precision,
+            "nodata": nodata, "stored_nodata": stored_nodata, "peak": 0.0}
+
+
+def write_block(staging, arr, x0, y0):
+    """Encode a block (NaN → nodata) and write it at (x0, y0) of a staging file."""
+    s = staging
+    if s["precision"] == "int16":
+        arr = np.asarray(arr, dtype="float64")
+        valid = np.isfinite(arr) & (arr != s["nodata"])
+        if valid.any():
+            s["peak"] = max(s["peak"], float(np.abs(arr[valid]).max()))
+    s["ds"].GetRasterBand(1).WriteArray(
+        encode(arr, s["stage_precision"], s["nodata"], s["stored_nodata"]), x0, y0)
+
+
+def _quantize_stage(staging):
+    """Int16 copy of a Float32 staging file, scaled to fit its largest |value|."""
+    gdal = load_gdal()
+    s = staging
+    src = s["ds"]
+    nx, ny = src.RasterXSize, src.RasterYSize
+    scale = max(INT16_SCALE, s["peak"] / INT16_MAX)
+    gdt, stored_nodata, scale, extra = storage("int16", 0.0, scale)
+    ds = _create_stage(s["path"] + ".stage16.tif", nx, ny, src.GetGeoTransform(), src.GetProjection(),
+                       gdt, stored_nodata, scale, extra)
+    sband, band = src.GetRasterBand(1), ds.GetRasterBand(1)
+    for y0 in range(0, ny, BLOCK_SIZE):
+        h = min(BLOCK_SIZE, ny - y0)
+        band.WriteArray(encode(sband.ReadAsArray(0, y0, nx, h), "int16", s["stored_nodata"], stored_nodata, scale),
+                        0, y0)
+    s["ds"] = src = None
+    gdal.GetDriverByName("GTiff").Delete(s["path"] + ".stage.tif")
+    return ds, s["path"] + ".stage16.tif"
+
+
+def finish_staging(staging):
+    """Build overviews on the staging file, write the cog to its path and drop the staging file."""
+    gdal = load_gdal()
+    path = staging["path"]
+    if staging["precision"] == "int16":
+        ds, stage_path = _quantize_stage(staging)
+    else:
+        ds, stage_path = staging["ds"], path + ".stage.tif"
+    out_tmp = path + ".cog.tif"
+    _finish_cog(ds, out_tmp, staging["precision"])
+    staging["ds"] = ds = None
+    gdal.GetDriverByName("GTiff").Delete(stage_path)
+    os.replace(out_tmp, path)
+    return path
+
+
+def convert_to_cog(src_path, dst_path=None, precision=None):
+    """
+    Rewrite an existing single-band raster with the cog profile, block by
+    block (memory ~ one block row). dst_path=None replaces the file;
+    precision=None picks it from the file name (precision_for).
+    """
+    gdal = load_gdal()
+    dst_path = dst_path or src_path
+    src = gdal.Open(src_path)
+    sband = src.GetRasterBand(1)
+    nx, ny = src.RasterXSize, src.RasterYSize
+
+    # Uncompressed tiled staging copy; overviews are built on it, then the
+    # final file is written in one pass with overviews ahead of the data
+    staging = create_staging(dst_path, nx, ny, src.GetGeoTransform(), src.GetProjection(),
+                             sband.GetNoDataValue(), precision)
+    for y0 in range(0, ny, BLOCK_SIZE):
+        h = min(BLOCK_SIZE, ny - y0)
+        write_block(staging, sband.ReadAsArray(0, y0, nx, h), 0, y0)
+    src = None
+    return finish_staging(staging)
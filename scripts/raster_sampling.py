@@ -0,0 +1,182 @@
+import numpy as np
+from collections import OrderedDict
+
+# How many decoded blocks a BlockCache keeps before dropping the oldest one
+MAX_CACHED_BLOCKS = 256
+
+
+def inv_geotransform(gt):
+    """
+    Inverse of a GDAL geotransform (as gdal.InvGeoTransform, without GDAL).
+    Returns inverse GT tuple or None when the grid is degenerate.
+    """
+    x0, a, b, y0, d, e = (float(v) for v in gt)
+    det = a * e - b * d
+    if det == 0.0 or not np.isfinite(det):
+        return None
+    ia, ib = e / det, -b / det
+    id_, ie = -d / det, a / det
+    return (-(ia * x0 + ib * y0), ia, ib, -(id_ * x0 + ie * y0), id_, ie)
+
+
+def world_to_pixel(inv_gt, xs, ys):
+    """Map world X/Y arrays to fractional pixel (col, row) arrays in one pass."""
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    px = inv_gt[0] + inv_gt[1] * xs + inv_gt[2] * ys
+    py = inv_gt[3] + inv_gt[4] * xs + inv_gt[5] * ys
+    return px, py
+
+
+class BlockCache:
+    """
+    Reads a raster band in its native GDAL blocks and keeps recently used
+    blocks in memory, so many points falling in the same block cost one read.
+    Nodata cells come back as NaN; scaled bands (e.g. Int16 index rasters)
+    come back unscaled.
+    """
+
+    def __init__(self, band, max_blocks=MAX_CACHED_BLOCKS):
+        self.band = band
+        self.nx = band.XSize
+        self.ny = band.YSize
+        self.bx, self.by = band.GetBlockSize()
+        self.nblocks_x = (self.nx + self.bx - 1) // self.bx
+        self.nodata = band.GetNoDataValue()
+        self.scale = band.GetScale() or 1.0
+        self.offset = band.GetOffset() or 0.0
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()
+
+    def block(self, bi, bj):
+        """Return block (row bi, col bj) as float64, reading it on first use."""
+        key = (bi, bj)
+        if key in self._blocks:
+            self._blocks.move_to_end(key)
+            return self._blocks[key]
+
+        x0, y0 = bj * self.bx, bi * self.by
+        w = min(self.bx, self.nx - x0)
+        h = min(self.by, self.ny - y0)
+        arr = self.band.ReadAsArray(x0, y0, w, h).astype("float64")
+        if self.nodata is not None:
+            arr[arr == self.nodata] = np.nan
+        if self.scale != 1.0 or self.offset != 0.0:
+            arr = arr * self.scale + self.offset
+
+        self._blocks[key] = arr
+        if len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return arr
+
+    def gather(self, rows, cols):
+        """Values at integer (rows, cols), which must lie inside the raster."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        out = np.full(rows.shape, np.nan)
+        if rows.size == 0:
+            return out
+
+        bi = rows // self.by
+        bj = cols // self.bx
+        key = bi * self.nblocks_x + bj
+
+        # Group points by block so each block is visited once
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_key)) + 1]
+        ends = np.r_[starts[1:], len(order)]
+
+        for s, e in zip(starts, ends):
+            idx = order[s:e]
+            i, j = int(bi[idx[0]]), int(bj[idx[0]])
+            arr = self.block(i, j)
+            out[idx] = arr[rows[idx] - i * self.by, cols[idx] - j * self.bx]
+        return out
+
+
+class ArrayGrid:
+    """In-memory 2-D array (NaN = nodata) usable wherever a BlockCache is."""
+
+    def __init__(self, arr):
+        self.array = arr
+        self.ny, self.nx = arr.shape
+
+    def gather(self, rows, cols):
+        return self.array[np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)].astype("float64")
+
+
+def sample_points(ds, xs, ys, method="nearest", band=1, cache=None):
+    """
+    Sample a raster at many world coordinates at once.
+
+    method: "nearest" (value of the containing cell) or "bilinear"
+    (pixel-centre interpolation; nodata neighbours are dropped and the
+    remaining weights renormalised).
+    Returns a float64 array with NaN for nodata and out-of-extent points.
+    """
+    if method not in ("nearest", "bilinear"):
+        raise ValueError(f"Unknown sampling method: {method}")
+
+    inv_gt = inv_geotransform(ds.GetGeoTransform())
+    if inv_gt is None:
+        raise RuntimeError("Raster geotransform is not invertible.")
+
+    if cache is None:
+        cache = BlockCache(ds.GetRasterBand(band))
+    return sample_grid(cache, inv_gt, xs, ys, method)
+
+
+def sample_grid(cache, inv_gt, xs, ys, method="nearest"):
+    """
+    sample_points on any grid exposing nx, ny and gather(rows, cols)
+    (a BlockCache, an ArrayGrid or a raster_mmap.MappedRaster).
+    """
+    if method not in ("nearest", "bilinear"):
+        raise ValueError(f"Unknown sampling method: {method}")
+
+    px, py = world_to_pixel(inv_gt, xs, ys)
+    nx, ny = cache.nx, cache.ny
+
+    inside = np.isfinite(px) & np.isfinite(py) & (px >= 0) & (py >= 0) & (px < nx) & (py < ny)
+    out = np.full(px.shape, np.nan)
+    if not inside.any():
+        return out
+
+    px, py = px[inside], py[inside]
+
+    if method == "nearest":
+        out[inside] = cache.gather(np.floor(py), np.floor(px))
+        return out
+
+    # Bilinear: interpolate between the four surrounding cell centres
+    fx, fy = px - 0.5, py - 0.5
+    c0, r0 = np.floor(fx), np.floor(fy)
+    tx, ty = fx - c0, fy - r0
+
+    c0i = np.clip(c0, 0, nx - 1).astype(np.int64)
+    c1i = np.clip(c0 + 1, 0, nx - 1).astype(np.int64)
+    r0i = np.clip(r0, 0, ny - 1).astype(np.int64)
+    r1i = np.clip(r0 + 1, 0, ny - 1).astype(np.int64)
+
+    vals = np.stack([
+        cache.gather(r0i, c0i),
+        cache.gather(r0i, c1i),
+        cache.gather(r1i, c0i),
+        cache.gather(r1i, c1i),
+    ])
+    weights = np.stack([
+        (1 - tx) * (1 - ty),
+        tx * (1 - ty),
+        (1 - tx) * ty,
+        tx * ty,
+    ])
+
+    valid = ~np.isnan(vals)
+    weights = np.where(valid, weights, 0.0)
+    wsum = weights.sum(axis=0)
+    num = (np.where(valid, vals, 0.0) * weights).sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[inside] = np.where(wsum > 0, num / wsum, np.nan)
+    return out
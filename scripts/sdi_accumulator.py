@@ -0,0 +1,137 @@
+# ==========================================================
+# Cumulative multi-blast SDI raster
+# SDI(cell) = sum over blasts of SDI_GAIN * BVII_blast(cell) * Delta_t
+# Each blast only touches cells inside INFLUENCE_RADIUS_M, so cost
+# grows with affected area, not blasts × full raster.
+# Output: sdi_cumulative.tif
+# ==========================================================
+
+import os
+import numpy as np
+import pandas as pd
+
+from compute_modules_1_2_3 import SDI_GAIN
+from sdi_timeline import TIME_COL, DEFAULT_DT, real_delta_t, time_values
+from terrain_engine import (
+    DEM_PATH,
+    OUT_DIR,
+    PPV_MAX,
+    bvii_from_layers,
+    horn_slope,
+    ppv_from_distance,
+    read_dem,
+    site_law_params,
+    write_raster,
+)
+
+PROJECT_DIR = r"C:\damsafe"
+CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset_DEMOcoords.csv")
+OUT_TIF = os.path.join(OUT_DIR, "sdi_cumulative.tif")
+
+# Cells farther than this from a blast get no contribution from it.
+# At DIST_MAX (2000 m) the BVII distance term has already fallen to 0.
+INFLUENCE_RADIUS_M = 2000.0
+
+# Near field: distances are floored at MIN_DIST_M (so the blast's own cell
+# is not nodata) and PPV is capped at PPV_MAX, where norm(PPV) reaches 1 as
+# in Module 1, so the cells next to a blast cannot dominate the sum.
+MIN_DIST_M = 1.0
+
+# Blast table columns
+X_COL, Y_COL = "Blast_Easting", "Blast_Northing"
+CHARGE_COL = "Total_Explosives_kg"
+# TIME_COL (optional) orders the blasts, gives each its Delta_t gap to the
+# previous blast as in Module 2, and allows an `until` cut-off.
+
+
+def blast_window(gt, shape, x, y, radius):
+    """Row/col slice bounds of the cells within `radius` of (x, y), clipped to the grid."""
+    if gt[2] or gt[4]:
+        raise ValueError("Rotated geotransforms are not supported; warp the DEM to a north-up grid first.")
+    ny, nx = shape
+    # Either pixel size may be negative (south-up / east-left grids)
+    ca, cb = sorted(((x - radius - gt[0]) / gt[1], (x + radius - gt[0]) / gt[1]))
+    ra, rb = sorted(((y + radius - gt[3]) / gt[5], (y - radius - gt[3]) / gt[5]))
+    r0, r1 = int(np.floor(ra)), int(np.floor(rb)) + 1
+    c0, c1 = int(np.floor(ca)), int(np.floor(cb)) + 1
+    return max(r0, 0), min(r1, ny), max(c0, 0), min(c1, nx)
+
+
+def accumulate_sdi(slope, gt, blasts, radius=INFLUENCE_RADIUS_M, gain=SDI_GAIN,
+                   K=None, alpha=None, until=None):
+    """
+    Sum every blast's BVII field into one SDI grid aligned with `slope`.
+
+    blasts: DataFrame with X_COL, Y_COL, CHARGE_COL and optionally TIME_COL.
+    With `until` (TIME_COL units, see sdi_timeline.time_values), only blasts
+    at or before that time count.
+    K / alpha default to site_law_params().
+    Returns (sdi array, number of blasts applied).
+    """
+    if K is None or alpha is None:
+        k, a = site_law_params()
+        K, alpha = (k if K is None else K), (a if alpha is None else alpha)
+    for col in (X_COL, Y_COL, CHARGE_COL):
+        if col not in blasts.columns:
+            raise ValueError(f"Missing column: {col}")
+
+    if TIME_COL in blasts.columns:
+        t = time_values(blasts[TIME_COL])
+        order = np.argsort(t, kind="stable")
+        blasts, t = blasts.iloc[order], t[order]
+        dts = real_delta_t(t)
+        if until is not None:
+            keep = t <= until
+            blasts, dts = blasts[keep], dts[keep]
+    else:
+        dts = np.full(len(blasts), DEFAULT_DT)
+
+    xs = blasts[X_COL].to_numpy(dtype=float)
+    ys = blasts[Y_COL].to_numpy(dtype=float)
+    ws = blasts[CHARGE_COL].to_numpy(dtype=float)
+
+    sdi = np.zeros(slope.shape)
+    applied = 0
+    for x, y, w, dt in zip(xs, ys, ws, dts):
+        if not (np.isfinite(x) and np.isfinite(y) and w > 0):
+            continue
+        r0, r1, c0, c1 = blast_window(gt, slope.shape, x, y, radius)
+        if r0 >= r1 or c0 >= c1:
+            continue
+
+        # Cell-centre distances to the blast inside its window
+        cx = gt[0] + (np.arange(c0, c1) + 0.5) * gt[1]
+        cy = gt[3] + (np.arange(r0, r1) + 0.5) * gt[5]
+        dist = np.hypot(cy[:, None] - y, cx[None, :] - x)
+
+        ppv = np.minimum(ppv_from_distance(np.maximum(dist, MIN_DIST_M), W=w, K=K, alpha=alpha), PPV_MAX)
+        bvii = bvii_from_layers(ppv, dist, slope[r0:r1, c0:c1])
+
+        keep = (dist <= radius) & np.isfinite(bvii)
+        sdi[r0:r1, c0:c1] += np.where(keep, gain * bvii * dt, 0.0)
+        applied += 1
+
+    sdi[np.isnan(slope)] = np.nan
+    return sdi, applied
+
+
+def main():
+    if not os.path.exists(DEM_PATH):
+        raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
+
+    df = pd.read_csv(CSV_PATH)
+    dem, gt, proj = read_dem(DEM_PATH)
+    slope = horn_slope(dem, gt)
+
+    sdi, applied = accumulate_sdi(slope, gt, df)
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+    write_raster(OUT_TIF, sdi, gt, proj)
+
+    print("✅ Cumulative SDI raster computed.")
+    print("Saved:", OUT_TIF)
+    print(f"Blasts applied: {applied} / {len(df)}  (influence radius {INFLUENCE_RADIUS_M:g} m)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from compute_modules_1_2_3 import compute_modules, norm_stats
+from compute_module4_dam_state import compute_module4
+from sdi_timeline import TIME_COL, time_values
+from table_io import append_partitioned, table_format, write_partitioned, write_table
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
+NEW_BLASTS_CSV = os.path.join(PROJECT_DIR, "data", "new_blasts.csv")
+
+OUT_DIR = os.path.join(PROJECT_DIR, "outputs", "tables")
+M123_CSV = os.path.join(OUT_DIR, "modules_1_2_3_outputs.csv")
+M4_CSV = os.path.join(OUT_DIR, "module4_dam_state.csv")
+STATE_PATH = os.path.join(OUT_DIR, "sdi_state.json")
+
+STATE_VERSION = 1
+
+M4_COLUMNS = ["Dam_State_M4", "Failure_Flag_M4"]
+
+
+# =========================
+# STATE CHECKPOINT
+# =========================
+# The checkpoint holds everything needed to continue the SDI series:
+#   rows             blasts applied so far
+#   last_sdi         SDI after the last blast
+#   last_time        time of the last blast (TIME_COL units), None without timestamps
+#   failure_counter  Module 4 consecutive-exceedance count
+#   norm_stats       {column: [min, max]} used to normalize every row
+#   last_applied     [file, size, mtime] of the last appended blast file
+# Normalization ranges are frozen at the last full rebuild so rows that are
+# already written never change; new values outside the range clip to 0..1.
+def load_state(path=None):
+    """Read the checkpoint, or None if there isn't one yet."""
+    path = path or STATE_PATH
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != STATE_VERSION:
+        raise ValueError(f"Unsupported SDI state version in {path}: {state.get('version')}")
+    state["norm_stats"] = {c: tuple(v) for c, v in state["norm_stats"].items()}
+    return state
+
+
+def save_state(state, path=None):
+    """Write the checkpoint atomically (temp file + rename)."""
+    path = path or STATE_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def state_from_outputs(df, stats, failure_counter):
+    """Checkpoint describing a Module 1-4 table that ends at its last row."""
+    return {
+        "version": STATE_VERSION,
+        "rows": int(len(df)),
+        "last_sdi": float(df["SDI"].iloc[-1]) if len(df) else 0.0,
+        "last_time": last_time(df),
+        "failure_counter": int(failure_counter),
+        "norm_stats": {c: list(v) for c, v in stats.items()},
+        "last_applied": None,
+    }
+
+
+def last_time(df):
+    """Latest blast time in df, or None if it has no timestamps."""
+    if TIME_COL not in df.columns or not len(df):
+        return None
+    t = time_values(df[TIME_COL])
+    return float(np.nanmax(t)) if np.isfinite(t).any() else None
+
+
+# =========================
+# TABLE UPDATES
+# =========================
+# A .parquet output is a dataset partitioned by blast day (table_io), so an
+# append only writes files for the new rows; read it back with read_table.
+def write_rows(df, path):
+    """Write a whole output table (CSV or partitioned Parquet dataset)."""
+    if table_format(path) == "parquet":
+        write_partitioned(df, path)
+    else:
+        write_table(df, path)
+
+
+def append_rows(df, path):
+    """Append rows to an output table, keeping a CSV's existing header order."""
+    if table_format(path) == "parquet":
+        append_partitioned(df, path)
+    elif os.path.exists(path):
+        cols = list(pd.read_csv(path, nrows=0).columns)
+        df.reindex(columns=cols).to_csv(path, mode="a", header=False, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def rebuild(csv_path=None):
+    """Full recompute from the whole blast log; rewrites both tables and the checkpoint."""
+    df = pd.read_csv(csv_path or CSV_PATH)
+    df = compute_modules(df)
+    stats = norm_stats(df)
+
+    write_rows(df, M123_CSV)
+
+    df, failure_counter = compute_module4(df)
+    write_rows(df, M4_CSV)
+
+    state = state_from_outputs(df, stats, failure_counter)
+    save_state(state)
+    return df, state
+
+
+def apply_new_blasts(new_df, state):
+    """
+    Run Modules 1-4 on new rows only, continuing from the checkpoint.
+    Returns (new output rows, updated state); state is not saved here.
+    Raises ValueError if a new blast is older than the checkpoint: it would
+    change every SDI value already written, so it needs a full rebuild.
+    """
+    t0 = state.get("last_time")
+    if t0 is not None and TIME_COL in new_df.columns:
+        early = time_values(new_df[TIME_COL]) < t0
+        if early.any():
+            raise ValueError(
+                f"{int(early.sum())} new blast(s) are older than the last applied blast; "
+                f"add them to {CSV_PATH} and run a full rebuild instead of an append."
+            )
+
+    out = compute_modules(new_df, stats=state["norm_stats"], sdi0=state["last_sdi"],
+                          t0=state.get("last_time"))
+    out, failure_counter = compute_module4(out, state["failure_counter"])
+
+    state = dict(state)
+    state["rows"] = state["rows"] + len(out)
+    if len(out):
+        state["last_sdi"] = float(out["SDI"].iloc[-1])
+        t = last_time(out)
+        state["last_time"] = t if t is not None else state.get("last_time")
+    state["failure_counter"] = int(failure_counter)
+    return out, state
+
+
+def file_signature(path):
+    """[name, size, mtime] used to avoid applying the same file twice."""
+    st = os.stat(path)
+    return [os.path.basename(path), st.st_size, st.st_mtime]
+
+
+def append(new_csv=None):
+    """Apply a file of newly recorded blasts and append them to both tables."""
+    new_csv = new_csv or NEW_BLASTS_CSV
+    state = load_state()
+    if state is None:
+        raise FileNotFoundError(f"No SDI state at {STATE_PATH}. Run a full rebuild first.")
+
+    sig = file_signature(new_csv)
+    if state.get("last_applied") == sig:
+        print("⚠️ New blast file already applied, nothing to do:", new_csv)
+        return pd.DataFrame(), state
+
+    new_df = pd.read_csv(new_csv)
+    out, state = apply_new_blasts(new_df, state)
+    state["last_applied"] = sig
+
+    append_rows(out.drop(columns=M4_COLUMNS), M123_CSV)
+    append_rows(out, M4_CSV)
+    save_state(state)
+    return out, state
+
+
+def main():
+    if load_state() is None or not os.path.exists(NEW_BLASTS_CSV):
+        df, state = rebuild()
+        print("✅ Full rebuild: Modules 1-4 recomputed from", CSV_PATH)
+    else:
+        df, state = append()
+        print(f"✅ Appended {len(df)} new blast(s) from", NEW_BLASTS_CSV)
+
+    print("Saved:", M123_CSV)
+    print("Saved:", M4_CSV)
+    print("State:", STATE_PATH)
+    print(f"Rows: {state['rows']}  Last SDI: {state['last_sdi']:.4f}  Failure counter: {state['failure_counter']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# ==========================================================
+# Time-indexed SDI engine
+#   SDI(t_n) = SDI(t_n-1) * exp(-DECAY * Delta_t_n) + SDI_GAIN * BVII_n * Delta_t_n
+# with Delta_t from the real gaps between timestamps.
+# ==========================================================
+
+import os
+import numpy as np
+import pandas as pd
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+M123_CSV = os.path.join(PROJECT_DIR, "outputs", "tables", "modules_1_2_3_outputs.csv")
+
+TIME_COL = "Blast_Time"     # same column sdi_accumulator.py sorts on
+TIME_UNIT = "D"             # Delta_t and DECAY are per day
+DEFAULT_DT = 1.0            # Delta_t of the first blast (no earlier one to measure from)
+
+# Recovery rate per TIME_UNIT (0 = damage never recovers, plain cumulative sum).
+# A half-life h gives DECAY = ln(2) / h.
+DECAY = 0.0
+
+WINDOWS = (7, 30, 90)       # dashboard windows, in TIME_UNIT
+
+# Largest exponent used inside one vectorized segment (exp(700) overflows)
+MAX_EXP = 500.0
+
+
+def decay_from_half_life(half_life):
+    return np.log(2.0) / float(half_life)
+
+
+def time_values(series):
+    """Timestamps as float TIME_UNITs since the epoch; numeric columns pass through."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=float)
+    ts = pd.to_datetime(series)
+    ns = ts.to_numpy(dtype="datetime64[ns]").astype("int64").astype(float)
+    out = ns / pd.Timedelta(1, unit=TIME_UNIT).value
+    out[ts.isna().to_numpy()] = np.nan
+    return out
+
+
+def order_by_time(df, time_col=TIME_COL):
+    """Blasts sorted by timestamp (stable, so same-time blasts keep file order)."""
+    return df.sort_values(time_col, kind="stable")
+
+
+def real_delta_t(t, t0=None, default=DEFAULT_DT):
+    """Gap to the previous blast; the first one uses t0 (last known blast) or `default`."""
+    t = np.asarray(t, dtype=float)
+    dt = np.empty_like(t)
+    if t.size:
+        dt[0] = t[0] - t0 if t0 is not None else default
+        dt[1:] = np.diff(t)
+    return np.where(np.isfinite(dt), dt, default)
+
+
+def decayed_cumsum(increments, t, decay=DECAY, s0=0.0, t0=None):
+    """
+    Running S_n = S_n-1 * exp(-decay * (t_n - t_n-1)) + inc_n, in O(n).
+
+    The coefficient changes with every gap, so instead of a fixed-coefficient
+    filter this uses the closed form S_n = exp(-decay t_n) * sum exp(decay t_k) inc_k,
+    rebased every MAX_EXP / decay time units to stay in float range.
+    s0 is the SDI at t0 (defaults to the first blast time).
+    """
+    inc = np.asarray(increments, dtype=float)
+    if decay == 0:
+        return s0 + np.cumsum(inc)
+
+    t = np.asarray(t, dtype=float)
+    out = np.empty_like(inc)
+    carry, ref = float(s0), (t[0] if t0 is None and t.size else t0)
+    start = 0
+    while start < t.size:
+        # Rebase on this segment's first blast so every exponent is in [0, MAX_EXP]
+        carry *= np.exp(-decay * (t[start] - ref))
+        ref = t[start]
+        end = int(np.searchsorted(t, ref + MAX_EXP / decay, side="right"))
+        rel = t[start:end] - ref
+        acc = carry + np.cumsum(inc[start:end] * np.exp(decay * rel))
+        out[start:end] = acc * np.exp(-decay * rel)
+        carry, ref = out[end - 1], t[end - 1]
+        start = end
+    return out
+
+
+# =========================
+# TIMELINE
+# =========================
+class SDITimeline:
+    """
+    SDI series indexed by blast time.
+
+    times must be TIME_UNIT floats (see time_values); increments are
+    SDI_GAIN * BVII * Delta_t per blast. s0/t0 carry in SDI from before
+    the first blast. Queries accept scalars or arrays of times.
+    """
+
+    def __init__(self, times, increments, decay=DECAY, s0=0.0, t0=None):
+        times = np.asarray(times, dtype=float)
+        order = np.argsort(times, kind="stable")
+        self.t = times[order]
+        self.inc = np.asarray(increments, dtype=float)[order]
+        self.decay = float(decay)
+        self.s0 = float(s0)
+        self.t0 = t0 if t0 is not None else (self.t[0] if self.t.size else 0.0)
+        self.sdi = decayed_cumsum(self.inc, self.t, self.decay, self.s0, self.t0)
+
+    def extend(self, times, increments):
+        """Merge new blasts. In-order data is appended; late arrivals recompute from their slot."""
+        times = np.asarray(times, dtype=float)
+        increments = np.asarray(increments, dtype=float)
+        if not times.size:
+            return self
+        order = np.argsort(times, kind="stable")
+        times, increments = times[order], increments[order]
+
+        # Insert position of the earliest new blast; everything before it is unchanged
+        pos = int(np.searchsorted(self.t, times[0], side="right"))
+        merged_t = np.concatenate([self.t[pos:], times])
+        merged_inc = np.concatenate([self.inc[pos:], increments])
+        order = np.argsort(merged_t, kind="stable")
+        merged_t, merged_inc = merged_t[order], merged_inc[order]
+
+        s_prev, t_prev = (self.sdi[pos - 1], self.t[pos - 1]) if pos else (self.s0, self.t0)
+        tail = decayed_cumsum(merged_inc, merged_t, self.decay, s_prev, t_prev)
+
+        self.t = np.concatenate([self.t[:pos], merged_t])
+        self.inc = np.concatenate([self.inc[:pos], merged_inc])
+        self.sdi = np.concatenate([self.sdi[:pos], tail])
+        return self
+
+    def _state_before(self, T):
+        """(SDI, time) of the last blast at/before T; s0/t0 when there is none."""
+        T = np.asarray(T, dtype=float)
+        i = np.searchsorted(self.t, T, side="right") - 1
+        if not self.t.size:
+            return np.full(T.shape, self.s0), np.full(T.shape, self.t0)
+        j = np.maximum(i, 0)
+        return np.where(i >= 0, self.sdi[j], self.s0), np.where(i >= 0, self.t[j], self.t0)
+
+    def _decayed(self, s, t_from, T):
+        if self.decay == 0:
+            return s
+        return s * np.exp(-self.decay * np.maximum(T - t_from, 0.0))
+
+    def sdi_at(self, T):
+        """SDI at time(s) T, including recovery since the last blast."""
+        s, t = self._state_before(T)
+        return self._decayed(s, t, np.asarray(T, dtype=float))
+
+    def window(self, T, length):
+        """
+        Damage at T contributed by blasts in (T - length, T], e.g.
+        window(now, 30) = "SDI from the last 30 days". Without decay this
+        is a plain difference of running sums.
+        """
+        T = np.asarray(T, dtype=float)
+        s_hi, t_hi = self._state_before(T)
+        s_lo, t_lo = self._state_before(T - length)
+        return self._decayed(s_hi, t_hi, T) - self._decayed(s_lo, t_lo, T)
+
+    def count(self, T, length):
+        """Number of blasts in (T - length, T]."""
+        T = np.asarray(T, dtype=float)
+        return np.searchsorted(self.t, T, side="right") - np.searchsorted(self.t, T - length, side="right")
+
+
+def timeline_from_table(df, decay=DECAY, time_col=TIME_COL, s0=0.0, t0=None):
+    """Timeline from a Modules 1-3 table (BVII and Delta_t, gain as in Module 2)."""
+    from compute_modules_1_2_3 import SDI_GAIN
+    inc = SDI_GAIN * df["BVII"].to_numpy(float) * df["Delta_t"].to_numpy(float)
+    return SDITimeline(time_values(df[time_col]), inc, decay=decay, s0=s0, t0=t0)
+
+
+def main():
+    df = pd.read_csv(M123_CSV)
+    if TIME_COL not in df.columns:
+        raise ValueError(f"{M123_CSV} has no {TIME_COL} column; windowed SDI needs blast timestamps.")
+
+    tl = timeline_from_table(df)
+    now = tl.t[-1]
+    print(f"✅ SDI timeline: {tl.t.size} blasts, decay {tl.decay:g} per {TIME_UNIT}.")
+    print(f"SDI now: {float(tl.sdi_at(now)):.4f}")
+    for w in WINDOWS:
+        print(f"  last {w:>4} {TIME_UNIT}: SDI {float(tl.window(now, w)):10.4f}  ({int(tl.count(now, w))} blasts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# ==========================================================
+# Weight / threshold sensitivity sweep for Modules 1-4
+# Every configuration's BVII, RDI and SDI come from one matrix product,
+# and Dam_State / Dam_State_M4 are classified for all configs at once.
+# Output: one row per configuration with its state distribution
+# ==========================================================
+
+import os
+import itertools
+import numpy as np
+import pandas as pd
+
+import compute_modules_1_2_3 as m123
+import compute_module4_dam_state as m4
+from compute_modules_1_2_3 import inv_distance_norm, minmax, norm_stats, prepare_inputs
+from sdi_timeline import DECAY, TIME_COL, decayed_cumsum, order_by_time, real_delta_t, time_values
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
+OUT_CSV = os.path.join(PROJECT_DIR, "outputs", "tables", "sensitivity_sweep.csv")
+
+# Values to sweep; parameters left out stay at their module constants
+PARAM_GRID = {
+    "W_PPV": [0.55, 0.65, 0.75],
+    "W_DIST": [0.15, 0.25, 0.35],
+    "W_CHARGE": [0.0, 0.10, 0.20],
+    "SDI_GAIN": [0.5, 1.0, 1.5],
+    "Tsafe": [40, 50, 60],
+    "Twarn": [100, 120, 140],
+    "Tcrit": [180, 200, 220],
+    "FAILURE_PERSISTENCE": [2, 3, 5],
+}
+
+# Configurations evaluated per matrix product (memory ~ blasts × CONFIG_BATCH)
+CONFIG_BATCH = 2048
+
+DAM_STATES = ["Safe", "Warning", "Critical", "Failed"]
+LEVELS = ["Low", "Moderate", "High"]
+LEVEL_BINS = [0.33, 0.66]      # same cut points as BVII_Level / RDI_Level
+
+
+def nominal_config():
+    """Current module constants as one configuration."""
+    return {
+        "W_PPV": m123.W_PPV, "W_DIST": m123.W_DIST, "W_CHARGE": m123.W_CHARGE,
+        "W_RDI_PPV": m123.W_RDI_PPV, "W_RDI_DIST": m123.W_RDI_DIST, "W_RDI_SLOPE": m123.W_RDI_SLOPE,
+        "SDI_GAIN": m123.SDI_GAIN,
+        "Tsafe": m123.Tsafe, "Twarn": m123.Twarn, "Tcrit": m123.Tcrit,
+        "SDI_SAFE": m4.SDI_SAFE, "SDI_WARNING": m4.SDI_WARNING,
+        "FAILURE_PERSISTENCE": m4.FAILURE_PERSISTENCE,
+    }
+
+
+def config_grid(grid=None):
+    """Cartesian product of `grid` over the nominal config; row 0 is the nominal config."""
+    grid = PARAM_GRID if grid is None else grid
+    base = nominal_config()
+    unknown = set(grid) - set(base)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+
+    names = list(grid)
+    rows = [base]
+    for values in itertools.product(*(grid[k] for k in names)):
+        rows.append({**base, **dict(zip(names, values))})
+    configs = pd.DataFrame(rows, columns=list(base))
+    configs["FAILURE_PERSISTENCE"] = configs["FAILURE_PERSISTENCE"].astype(int)
+    return configs
+
+
+# =========================
+# FEATURES (normalized once)
+# =========================
+def blast_order(df):
+    """Blasts in Module 2 order: sorted by TIME_COL when present, else row order."""
+    df = prepare_inputs(df)
+    return order_by_time(df) if TIME_COL in df.columns else df
+
+
+def feature_matrix(df, stats=None):
+    """
+    (ppv_n, dist_risk, charge_n, slope_n) per blast as an (n × 4) array,
+    normalized exactly as in compute_modules. df must be in blast_order().
+    """
+    if stats is None:
+        stats = norm_stats(df)
+    n = len(df)
+    ppv_n = minmax(df["PPV_mm_per_s"], bounds=stats["PPV_mm_per_s"]).to_numpy()
+    dist_risk = inv_distance_norm(df["Distance_from_Dam_m"], bounds=stats["Distance_from_Dam_m"]).to_numpy()
+    if "Charge_Factor_kg_per_m" in df.columns and "Charge_Factor_kg_per_m" in stats:
+        charge_n = minmax(df["Charge_Factor_kg_per_m"], bounds=stats["Charge_Factor_kg_per_m"]).to_numpy()
+    else:
+        charge_n = np.zeros(n)
+    slope_n = minmax(df["Slope_deg"], bounds=stats["Slope_deg"]).to_numpy()
+    return np.column_stack([ppv_n, dist_risk, charge_n, slope_n])
+
+
+def cumulative_features(F, df, decay=DECAY):
+    """
+    Column j = the Module 2 SDI series of a BVII equal to feature j, with the
+    same Delta_t and decay as compute_modules. SDI is linear in BVII, so
+    every config's SDI is SDI_GAIN * (this @ weights).
+    """
+    if TIME_COL not in df.columns:
+        return np.cumsum(F, axis=0)      # Delta_t = 1, no timestamps to decay over
+    t = np.fmax.accumulate(time_values(df[TIME_COL]))
+    inc = F * real_delta_t(t)[:, None]
+    if not decay:
+        return np.cumsum(inc, axis=0)
+    return np.column_stack([decayed_cumsum(inc[:, j], t, decay) for j in range(F.shape[1])])
+
+
+def weight_matrices(configs):
+    """(features × configs) weight matrices for BVII and RDI."""
+    zeros = np.zeros(len(configs))
+    bvii_w = np.vstack([configs["W_PPV"], configs["W_DIST"], configs["W_CHARGE"], zeros])
+    rdi_w = np.vstack([configs["W_RDI_PPV"], configs["W_RDI_DIST"], zeros, configs["W_RDI_SLOPE"]])
+    return bvii_w, rdi_w
+
+
+def level_fractions(x):
+    """
+    Fraction of blasts per Low/Moderate/High level, per config column.
+    Bins are right-closed like pd.cut; weights summing above 1 can push an
+    index past 1.01, which pd.cut leaves unlabeled but here counts as High.
+    """
+    lvl = np.searchsorted(LEVEL_BINS, x, side="left")
+    return np.stack([(lvl == k).mean(axis=0) for k in range(len(LEVELS))], axis=1)
+
+
+# =========================
+# SWEEP
+# =========================
+def sweep(df, configs=None, batch=CONFIG_BATCH):
+    """
+    Evaluate Modules 1-4 for every configuration (row of `configs`).
+    Returns configs with state fractions, final SDI and first-failure
+    event per config, plus d_<column> = change from row 0 (nominal).
+    """
+    configs = config_grid() if configs is None else configs.reset_index(drop=True)
+    df = blast_order(df.copy())
+    F = feature_matrix(df)
+    # SDI = SDI_GAIN * accumulate(BVII) = SDI_GAIN * (accumulate(F) @ W): accumulated once, not per config
+    F_cum = cumulative_features(F, df)
+    n = F.shape[0]
+
+    parts = []
+    for start in range(0, len(configs), batch):
+        cfg = configs.iloc[start:start + batch]
+        bvii_w, rdi_w = weight_matrices(cfg)
+
+        bvii = F @ bvii_w
+        rdi = F @ rdi_w
+        sdi = (F_cum @ bvii_w) * cfg["SDI_GAIN"].to_numpy()
+
+        thresholds = cfg[["Tsafe", "Twarn", "Tcrit"]].to_numpy(float)
+        state = sum((sdi >= thresholds[:, k]).astype(np.int8) for k in range(3))
+        codes, _ = m4.dam_state_codes(
+            sdi,
+            safe=cfg["SDI_SAFE"].to_numpy(float),
+            warning=cfg["SDI_WARNING"].to_numpy(float),
+            persistence=cfg["FAILURE_PERSISTENCE"].to_numpy(),
+        )
+
+        out = pd.DataFrame(index=cfg.index)
+        for k, name in enumerate(DAM_STATES):
+            out[f"P_{name}"] = (state == k).mean(axis=0)
+        for k, name in enumerate(m4.STATE_LABELS):
+            out[f"P_M4_{name}"] = (codes == k).mean(axis=0)
+        for prefix, x in (("BVII", bvii), ("RDI", rdi)):
+            frac = level_fractions(x)
+            for k, name in enumerate(LEVELS):
+                out[f"P_{prefix}_{name}"] = frac[:, k]
+
+        out["Final_SDI"] = sdi[-1] if n else 0.0
+        failed = codes == m4.FAILED
+        out["First_Failure_Event"] = np.where(failed.any(axis=0), failed.argmax(axis=0), -1) if n else -1
+        parts.append(out)
+
+    result = pd.concat(parts)
+    metrics = [c for c in result.columns if c.startswith("P_")] + ["Final_SDI"]
+    for c in metrics:
+        result[f"d_{c}"] = result[c] - result[c].iloc[0]
+    return pd.concat([configs, result], axis=1)
+
+
+def main():
+    df = pd.read_csv(CSV_PATH)
+    configs = config_grid()
+    result = sweep(df, configs)
+
+    os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
+    result.to_csv(OUT_CSV, index=False)
+
+    print(f"✅ Sensitivity sweep completed: {len(configs)} configurations × {len(df)} blasts.")
+    print("Saved:", OUT_CSV)
+    print("\nNominal state distribution:")
+    print(result.iloc[0][[c for c in result.columns if c.startswith("P_")]])
+    print("\nLargest shifts in P_Failed / P_M4_Failed:")
+    print(result.reindex(result["d_P_M4_Failed"].abs().sort_values(ascending=False).index).head(10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+# ==========================================================
+# Site-law calibration: PPV = K * (D / sqrt(W))^(-alpha)
+# Log-log least squares per site and per time window, kept as sufficient
+# statistics so new blasts are appended without refitting the whole log.
+# Output: SITE_LAW_JSON (read by terrain_engine via calibrated_law())
+# ==========================================================
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from sdi_timeline import TIME_COL, time_values
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
+NEW_BLASTS_CSV = os.path.join(PROJECT_DIR, "data", "new_blasts.csv")
+
+OUT_DIR = os.path.join(PROJECT_DIR, "outputs", "tables")
+SITE_LAW_JSON = os.path.join(OUT_DIR, "site_law.json")
+FITS_CSV = os.path.join(OUT_DIR, "site_law_fits.csv")
+
+PPV_COL = "PPV_mm_per_s"
+DIST_COL = "Distance_from_Dam_m"
+CHARGE_COL = "Total_Explosives_kg"
+SITE_COL = "Site"            # optional; without it every blast is site ALL_SITES
+ALL_SITES = "all"
+
+WINDOW_DAYS = 30             # window length in TIME_UNIT (see sdi_timeline.py)
+WINDOW_ROWS = 100            # window length in blasts when there are no timestamps
+
+MIN_BLASTS = 5               # fewer blasts than this → no fit (NaN)
+
+N_BOOT = 1000
+BAND = (2.5, 97.5)           # percentile band
+BOOT_CHUNK = 200             # bootstrap replicates evaluated per block
+SEED = 42
+
+# Upper design line: log10(K) + DESIGN_Z * residual sigma (1.645 → 95 % non-exceedance)
+DESIGN_Z = 1.645
+
+# K / alpha handed to the raster PPV stage: "fit" (mean line) or "upper" (design line)
+RASTER_LAW = "fit"
+# A fit is only handed on if it attenuates (alpha > 0) and explains at least this much
+MIN_R2 = 0.3
+
+STATE_VERSION = 1
+N_STATS = 6
+LAW_FIELDS = ("K", "alpha", "K_upper", "r2", "sigma_log", "K_lo", "K_hi", "alpha_lo", "alpha_hi")
+
+
+# =========================
+# SUFFICIENT STATISTICS
+# =========================
+def log_terms(df):
+    """(x, y, usable) = log10 scaled distance, log10 PPV and the rows valid for the fit."""
+    d = df[DIST_COL].to_numpy(dtype=float)
+    w = df[CHARGE_COL].to_numpy(dtype=float)
+    ppv = df[PPV_COL].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.log10(d / np.sqrt(w))
+        y = np.log10(ppv)
+    return x, y, np.isfinite(x) & np.isfinite(y)
+
+
+def group_sums(x, y, codes, n_groups):
+    """Sufficient statistics per group code → (n_groups, 6)."""
+    terms = (np.ones_like(x), x, y, x * x, x * y, y * y)
+    return np.stack([np.bincount(codes, weights=t, minlength=n_groups) for t in terms], axis=1)
+
+
+def fit_from_sums(s, min_blasts=MIN_BLASTS):
+    """
+    Closed-form log-log fit for every row of an (..., 6) sums array.
+    Returns {K, alpha, r2, sigma_log, K_upper, n} as arrays of shape s.shape[:-1].
+    """
+    n, sx, sy, sxx, sxy, syy = np.moveaxis(np.asarray(s, dtype=float), -1, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cxx = sxx - sx * sx / n
+        cxy = sxy - sx * sy / n
+        cyy = syy - sy * sy / n
+        slope = cxy / cxx
+        log_k = (sy - slope * sx) / n
+        sse = np.maximum(cyy - slope * cxy, 0.0)
+        sigma = np.sqrt(sse / (n - 2))
+        r2 = 1.0 - sse / cyy
+
+    bad = (n < max(min_blasts, 3)) | ~(cxx > 0)
+    log_k, slope, sigma, r2 = (np.where(bad, np.nan, v) for v in (log_k, slope, sigma, r2))
+    return {
+        "K": 10.0 ** log_k,
+        "alpha": -slope,
+        "r2": r2,
+        "sigma_log": sigma,
+        "K_upper": 10.0 ** (log_k + DESIGN_Z * sigma),
+        "n": n,
+    }
+
+
+def bootstrap_bands(x, y, n_boot=N_BOOT, band=BAND, seed=SEED, chunk=BOOT_CHUNK):
+    """
+    Percentile bands of K and alpha from case-resampling bootstrap: each
+    block draws `chunk` resamples at once and fits them from their sums.
+    Returns {K_lo, K_hi, alpha_lo, alpha_hi}.
+    """
+    n = len(x)
+    if n < MIN_BLASTS:
+        return {"K_lo": np.nan, "K_hi": np.nan, "alpha_lo": np.nan, "alpha_hi": np.nan}
+    rng = np.random.default_rng(seed)
+    ks, alphas = [], []
+    for b0 in range(0, n_boot, chunk):
+        idx = rng.integers(0, n, size=(min(chunk, n_boot - b0), n))
+        xb, yb = x[idx], y[idx]
+        s = np.stack([np.full(len(idx), float(n)), xb.sum(1), yb.sum(1),
+                      (xb * xb).sum(1), (xb * yb).sum(1), (yb * yb).sum(1)], axis=1)
+        fit = fit_from_sums(s)
+        ks.append(fit["K"])
+        alphas.append(fit["alpha"])
+    ks, alphas = np.concatenate(ks), np.concatenate(alphas)
+    k_lo, k_hi = np.nanpercentile(ks, band)
+    a_lo, a_hi = np.nanpercentile(alphas, band)
+    return {"K_lo": k_lo, "K_hi": k_hi, "alpha_lo": a_lo, "alpha_hi": a_hi}
+
+
+# =========================
+# GROUPS
+# =========================
+def site_labels(df):
+    if SITE_COL in df.columns:
+        return df[SITE_COL].astype(str).to_numpy()
+    return np.full(len(df), ALL_SITES, dtype=object)
+
+
+def window_labels(df, row0=0):
+    """Window index per blast: WINDOW_DAYS bins of TIME_COL, else WINDOW_ROWS blocks of log rows."""
+    if TIME_COL in df.columns:
+        t = time_values(df[TIME_COL])
+        return np.where(np.isfinite(t), np.floor(t / WINDOW_DAYS), -1).astype(np.int64)
+    return (row0 + np.arange(len(df))) // WINDOW_ROWS
+
+
+def table_sums(df, row0=0):
+    """
+    Sufficient statistics of a blast table.
+    Returns ({site: sums}, {site: {window: sums}}) with sums as 6-lists;
+    ALL_SITES covers every usable blast.
+    """
+    x, y, ok = log_terms(df)
+    sites = site_labels(df)[ok]
+    windows = window_labels(df, row0)[ok]
+    x, y = x[ok], y[ok]
+
+    by_site, by_window = {}, {}
+    for label, mask in [(ALL_SITES, slice(None))] + [(s, sites == s) for s in np.unique(sites) if s != ALL_SITES]:
+        w_keys, codes = np.unique(windows[mask], return_inverse=True)
+        per_window = group_sums(x[mask], y[mask], codes, len(w_keys))
+        by_site[label] = per_window.sum(axis=0).tolist()
+        by_window[label] = {str(k): v.tolist() for k, v in zip(w_keys, per_window)}
+    return by_site, by_window
+
+
+def merge_sums(state, by_site, by_window):
+    """Add new sufficient statistics into the state (in place)."""
+    for site, s in by_site.items():
+        old = state["sites"].get(site, [0.0] * N_STATS)
+        state["sites"][site] = [a + b for a, b in zip(old, s)]
+    for site, windows in by_window.items():
+        dst = state["windows"].setdefault(site, {})
+        for w, s in windows.items():
+            old = dst.get(w, [0.0] * N_STATS)
+            dst[w] = [a + b for a, b in zip(old, s)]
+
+
+# =========================
+# FITS
+# =========================
+def fit_table(state):
+    """One row per site (Window = "all") and per site window, fitted from the state's sums."""
+    keys, sums = [], []
+    for site, s in state["sites"].items():
+        keys.append((site, "all"))
+        sums.append(s)
+    for site, windows in state["windows"].items():
+        for w in sorted(windows, key=int):
+            keys.append((site, w))
+            sums.append(windows[w])
+
+    fits = fit_from_sums(np.array(sums, dtype=float).reshape(-1, N_STATS))
+    df = pd.DataFrame(keys, columns=["Site", "Window"])
+    for col, v in fits.items():
+        df[col] = v
+    df["n"] = df["n"].astype(int)
+
+    bands = state.get("bands", {})
+    for col in ("K_lo", "K_hi", "alpha_lo", "alpha_hi"):
+        df[col] = [bands.get(f"{s}|{w}", {}).get(col, np.nan) for s, w in keys]
+    return df
+
+
+def site_bands(df, row0=0):
+    """Bootstrap bands for every site and site window of a blast table, keyed "site|window"."""
+    x, y, ok = log_terms(df)
+    sites = site_labels(df)[ok]
+    windows = window_labels(df, row0)[ok]
+    x, y = x[ok], y[ok]
+
+    bands = {}
+    for site in [ALL_SITES] + [s for s in np.unique(sites) if s != ALL_SITES]:
+        mask = np.ones(len(x), dtype=bool) if site == ALL_SITES else sites == site
+        bands[f"{site}|all"] = bootstrap_bands(x[mask], y[mask])
+        for w in np.unique(windows[mask]):
+            m = mask & (windows == w)
+            bands[f"{site}|{w}"] = bootstrap_bands(x[m], y[m])
+    return {k: {c: float(v) for c, v in b.items()} for k, b in bands.items()}
+
+
+# =========================
+# STATE
+# =========================
+# site_law.json holds:
+#   rows          blasts folded in so far
+#   sites         {site: [n, Σx, Σy, Σx², Σxy, Σy²]}
+#   windows       {site: {window: sums}}
+#   bands         {"site|window": {K_lo, K_hi, alpha_lo, alpha_hi}} from the last rebuild
+#   laws          {site: {K, alpha, K_upper, ...}} whole-history fit per site
+#   last_applied  [file, size, mtime] of the last appended blast file
+def new_state():
+    return {"version": STATE_VERSION, "rows": 0, "sites": {}, "windows": {}, "bands": {}, "laws": {},
+            "last_applied": None}
+
+
+def load_state(path=None):
+    path = path or SITE_LAW_JSON
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != STATE_VERSION:
+        raise ValueError(f"Unsupported site-law state version in {path}: {state.get('version')}")
+    return state
+
+
+def save_state(state, path=None):
+    """Write the state atomically (temp file + rename)."""
+    path = path or SITE_LAW_JSON
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def refresh_laws(state):
+    """Recompute the per-site laws from the sums. Returns the fit table."""
+    fits = fit_table(state)
+    whole = fits[fits["Window"] == "all"]
+    state["laws"] = {}
+    for r in whole.to_dict(orient="records"):
+        law = {c: (None if pd.isna(r[c]) else float(r[c])) for c in LAW_FIELDS}
+        law["n"] = int(r["n"])
+        state["laws"][r["Site"]] = law
+    return fits
+
+
+def usable(law):
+    """True if a fitted law may replace the placeholder constants."""
+    return (law is not None and law.get("K") is not None and law.get("alpha") is not None
+            and law["alpha"] > 0 and (law.get("r2") or 0.0) >= MIN_R2)
+
+
+def calibrated_law(path=None, site=None, default=(None, None), law=RASTER_LAW):
+    """
+    (K, alpha) for `site` (None → ALL_SITES) from the calibration file;
+    `default` when there is no file or no usable fit yet.
+    law: "fit" (mean line) or "upper" (K_upper design line).
+    """
+    state = load_state(path)
+    if state is None:
+        return default
+    fit = state.get("laws", {}).get(site or ALL_SITES)
+    if not usable(fit):
+        return default
+    k = fit["K_upper"] if law == "upper" and fit.get("K_upper") is not None else fit["K"]
+    return k, fit["alpha"]
+
+
+# =========================
+# RUNS
+# =========================
+def calibrate(df):
+    """Fits, with bootstrap bands, for a whole blast log. Returns (fit table, state)."""
+    state = new_state()
+    merge_sums(state, *table_sums(df))
+    state["rows"] = int(len(df))
+    state["bands"] = site_bands(df)
+    return refresh_laws(state), state
+
+
+def rebuild(csv_path=None):
+    """Fit from the whole blast log and rewrite the state."""
+    fits, state = calibrate(pd.read_csv(csv_path or CSV_PATH))
+    save_state(state)
+    return fits, state
+
+
+def append(new_csv=None):
+    """Fold a file of newly recorded blasts into the sums and refit (no new bootstrap)."""
+    new_csv = new_csv or NEW_BLASTS_CSV
+    state = load_state()
+    if state is None:
+        raise FileNotFoundError(f"No site-law state at {SITE_LAW_JSON}. Run a full rebuild first.")
+
+    st = os.stat(new_csv)
+    sig = [os.path.basename(new_csv), st.st_size, st.st_mtime]
+    if state.get("last_applied") == sig:
+        print("⚠️ New blast file already applied, nothing to do:", new_csv)
+        return fit_table(state), state
+
+    new_df = pd.read_csv(new_csv)
+    merge_sums(state, *table_sums(new_df, row0=state["rows"]))
+    state["rows"] += int(len(new_df))
+    state["last_applied"] = sig
+    fits = refresh_laws(state)
+    save_state(state)
+    return fits, state
+
+
+def main():
+    if load_state() is None or not os.path.exists(NEW_BLASTS_CSV):
+        fits, state = rebuild()
+        print("✅ Site law calibrated from", CSV_PATH)
+    else:
+        fits, state = append()
+        print("✅ Site law updated with new blasts from", NEW_BLASTS_CSV)
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+    fits.to_csv(FITS_CSV, index=False)
+    print("Saved:", FITS_CSV)
+    print("State:", SITE_LAW_JSON)
+    for site, fit in state["laws"].items():
+        if fit["K"] is None:
+            print(f"   {site}: not enough blasts to fit ({fit['n']})")
+            continue
+        print(f"   {site}: K = {fit['K']:.1f}  alpha = {fit['alpha']:.3f}  "
+              f"(R² {fit['r2']:.3f}, n {fit['n']}, K_upper {fit['K_upper']:.1f})"
+              + ("" if usable(fit) else "  — not used for rasters (alpha <= 0 or R² < MIN_R2)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import shutil
+import numpy as np
+import pandas as pd
+
+from sdi_timeline import TIME_COL, TIME_UNIT, time_values
+
+# =========================
+# SCHEMAS
+# =========================
+LEVELS = ["Low", "Moderate", "High"]
+
+# Label columns are stored as ordered categoricals (dictionary-encoded in Parquet)
+CATEGORIES = {
+    "BVII_Level": LEVELS,
+    "RDI_Level": LEVELS,
+    "Dam_State": ["Safe", "Warning", "Critical", "Failed"],
+    "Dam_State_M4": ["Intact", "Damaged", "Failed"],
+}
+
+INT_COLUMNS = ["Number_of_Holes", "Failure_Flag_M4"]
+
+# Row of the blast in the source log: join key between columnar stage outputs
+# (Modules 1-3 may reorder rows by Blast_Time)
+KEY_COL = "Blast_Row"
+
+# Columns each stage actually reads (column projection)
+STAGE_INPUTS = {
+    "modules_1_2_3": [KEY_COL, "PPV_mm_per_s", "Distance_from_Dam_m", "Charge_Factor_kg_per_m", "Slope_deg",
+                      "Blast_Time"],
+    "module3_terrain": [KEY_COL, "PPV_mm_per_s", "Distance_from_Dam_m", "Blast_Easting", "Blast_Northing"],
+    "module4": [KEY_COL, "SDI"],
+}
+
+# Columns each stage adds (what it needs to write in columnar mode)
+STAGE_OUTPUTS = {
+    "modules_1_2_3": [KEY_COL, "Slope_deg", "BVII", "BVII_Level", "Delta_t", "SDI", "Dam_State", "RDI", "RDI_Level"],
+    "module3_terrain": [KEY_COL, "Slope_deg", "RDI", "RDI_Level"],
+    "module4": [KEY_COL, "Dam_State_M4", "Failure_Flag_M4"],
+}
+
+# Partition column for append-friendly Parquet datasets (day of TIME_COL)
+DATE_COL = "Blast_Date"
+UNDATED = "undated"    # partition of rows without a time
+
+
+def table_format(path):
+    """'parquet' for .parquet files or dataset directories, else 'csv'."""
+    if path.endswith(".parquet") or os.path.isdir(path):
+        return "parquet"
+    return "csv"
+
+
+def apply_schema(df):
+    """
+    Cast known label columns to categoricals and flag columns to ints (in place).
+    Raises ValueError on a label outside the column's categories.
+    """
+    for col, cats in CATEGORIES.items():
+        if col in df.columns:
+            values = df[col].astype("object")
+            unknown = set(values.dropna().unique()) - set(cats)
+            if unknown:
+                raise ValueError(f"Unknown {col} label(s) {sorted(map(str, unknown))}; expected one of {cats}")
+            df[col] = pd.Categorical(values, categories=cats, ordered=True)
+    for col in INT_COLUMNS:
+        if col in df.columns and df[col].notna().all():
+            df[col] = df[col].astype("int64")
+    return df
+
+
+def read_table(path, columns=None, filters=None):
+    """
+    Read a CSV or Parquet table, optionally only `columns`.
+    filters (Parquet only) are pyarrow predicates, e.g. [("Blast_Date", ">=", "2024-01-01")].
+    Columns in `columns` that the table doesn't have are skipped.
+    """
+    if table_format(path) == "parquet":
+        if columns is not None:
+            import pyarrow.dataset as ds
+            have = set(ds.dataset(path, partitioning="hive").schema.names)
+            columns = [c for c in columns if c in have]
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+    else:
+        if filters is not None:
+            raise ValueError("filters are only supported for Parquet tables.")
+        usecols = None
+        if columns is not None:
+            have = set(pd.read_csv(path, nrows=0).columns)
+            usecols = [c for c in columns if c in have]
+        df = pd.read_csv(path, usecols=usecols)
+        if usecols is not None:
+            df = df[usecols]
+    return apply_schema(df)
+
+
+def stage_inputs(path, stage, out_path):
+    """
+    Input table of a stage. With a Parquet out_path only the columns the stage
+    uses are read, plus KEY_COL (numbered here if the source has none);
+    otherwise the whole table.
+    """
+    if table_format(out_path) != "parquet":
+        return read_table(path)
+    df = read_table(path, columns=STAGE_INPUTS[stage])
+    if KEY_COL not in df.columns:
+        df.insert(0, KEY_COL, np.arange(len(df)))
+    return df
+
+
+def write_stage(df, path, stage):
+    """Write a stage's table: KEY_COL + the columns it adds for Parquet, everything for CSV."""
+    write_table(df, path, columns=STAGE_OUTPUTS[stage] if table_format(path) == "parquet" else None)
+
+
+def write_table(df, path, columns=None):
+    """Write a whole table (CSV or single Parquet file), optionally only `columns`."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    if table_format(path) == "parquet":
+        apply_schema(df.copy()).to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def append_partitioned(df, root, time_col=TIME_COL, columns=None):
+    """
+    Append rows to a Parquet dataset partitioned by the day of time_col (hive
+    layout: root/Blast_Date=YYYY-MM-DD/part-<ns>-<uuid>-0.parquet). Rows without
+    a time go to Blast_Date=undated. Existing files are never rewritten, so
+    appending costs O(new rows); file names sort in write order.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns and c != DATE_COL]]
+    df = apply_schema(df.copy())
+    if time_col in df.columns:
+        day = pd.to_datetime(time_values(df[time_col]), unit=TIME_UNIT)
+        df[DATE_COL] = np.where(day.isna(), UNDATED, day.strftime("%Y-%m-%d"))
+    else:
+        df[DATE_COL] = UNDATED
+
+    os.makedirs(root, exist_ok=True)
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        root,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([(DATE_COL, pa.string())]), flavor="hive"),
+        basename_template=f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def write_partitioned(df, root, time_col=TIME_COL, columns=None):
+    """Replace the Parquet dataset at root with df (see append_partitioned)."""
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    elif os.path.exists(root):
+        os.remove(root)
+    append_partitioned(df, root, time_col=time_col, columns=columns)
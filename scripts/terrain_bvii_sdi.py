@@ -36,6 +36,10 @@ from qgis.analysis import QgsNativeAlgorithms
 from processing.core.Processing import Processing
 from processing.algs.gdal.GdalAlgorithmProvider import GdalAlgorithmProvider
 
+import raster_output
+from instrumentation import stage
+from site_law import calibrated_law
+
 
 # =========================
 # CONFIG (EDIT IF NEEDED)
@@ -55,8 +59,14 @@ PROJECT_CRS = "EPSG:32643"
 
 # ---- Scenario blast params (placeholders, tune later) ----
 W_charge_kg = 50
-K = 1500
-alpha = 1.6
+K_DEFAULT = 1500
+ALPHA_DEFAULT = 1.6
+
+# Calibrated site law (site_law.py) replaces the placeholder K / alpha above
+# once a usable fit exists; SITE_LAW_SITE picks a per-site fit (None = all blasts).
+# Resolved when the script runs (site_law_params), not on import.
+SITE_LAW_JSON = os.path.join(PROJECT_DIR, "outputs", "tables", "site_law.json")
+SITE_LAW_SITE = None
 
 # BVII weights
 w_ppv, w_dist, w_slope = 0.6, 0.25, 0.15
@@ -67,12 +77,23 @@ DIST_MIN, DIST_MAX = 0.0, 2000.0
 SLOPE_MIN, SLOPE_MAX = 0.0, 30.0
 
 
+def site_law_params():
+    """(K, alpha) from the current site-law calibration, or the placeholders."""
+    return calibrated_law(SITE_LAW_JSON, SITE_LAW_SITE, default=(K_DEFAULT, ALPHA_DEFAULT))
+
+
 def ensure_provider(reg, provider_id, provider_obj):
     """Add provider only if not present (avoids duplicate warnings)."""
     if reg.providerById(provider_id) is None:
         reg.addProvider(provider_obj)
 
 
+def run_alg(step, alg_id, params, pixels):
+    """processing.run wrapped in a timed stage record named after the step."""
+    with stage(f"terrain_bvii_sdi.{step}", items=pixels, unit="pixels"):
+        return processing.run(alg_id, params)
+
+
 def main():
     if not os.path.exists(DEM_PATH):
         raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
@@ -97,6 +118,9 @@ def main():
     # Set project CRS to DEM CRS for safe raster operations
     QgsProject.instance().setCrs(dem.crs())
 
+    # Cell count, for per-stage throughput records
+    npix = dem.width() * dem.height()
+
     # ----------------------------------------------------------
     # Determine a valid dam point IN DEM EXTENT
     # ----------------------------------------------------------
@@ -131,14 +155,14 @@ def main():
     # 1) Slope (degrees)
     # ----------------------------------------------------------
     slope_out = os.path.join(OUT_DIR, "slope_deg.tif")
-    processing.run("gdal:slope", {
+    run_alg("slope", "gdal:slope", {
         "INPUT": dem,
         "BAND": 1,
         "AS_PERCENT": False,
         "COMPUTE_EDGES": True,
         "Z_FACTOR": 1.0,
         "OUTPUT": slope_out
-    })
+    }, npix)
     slope_r = QgsRasterLayer(slope_out, "slope")
     if not slope_r.isValid():
         raise RuntimeError("❌ Slope raster failed.")
@@ -147,7 +171,7 @@ def main():
     # 2) Rasterize dam point onto DEM grid (robust)
     # ----------------------------------------------------------
     dam_ras = os.path.join(OUT_DIR, "dam_raster.tif")
-    processing.run("gdal:rasterize", {
+    run_alg("dam_raster", "gdal:rasterize", {
         "INPUT": dam_layer,
         "FIELD": None,
         "BURN": 1,
@@ -162,7 +186,7 @@ def main():
         "OPTIONS": "",
         "EXTRA": "",
         "OUTPUT": dam_ras
-    })
+    }, npix)
 
     dam_r = QgsRasterLayer(dam_ras, "dam")
     if not dam_r.isValid():
@@ -172,7 +196,7 @@ def main():
     # 3) Distance to dam (proximity)
     # ----------------------------------------------------------
     dist_out = os.path.join(OUT_DIR, "distance_to_dam.tif")
-    processing.run("gdal:proximity", {
+    run_alg("distance", "gdal:proximity", {
         "INPUT": dam_ras,
         "BAND": 1,
         "VALUES": "1",
@@ -183,7 +207,7 @@ def main():
         "OPTIONS": "",
         "EXTRA": "",
         "OUTPUT": dist_out
-    })
+    }, npix)
 
     dist_r = QgsRasterLayer(dist_out, "distance")
     if not dist_r.isValid():
@@ -194,16 +218,17 @@ def main():
     # PPV = K * (D / sqrt(W))^(-alpha)
     # ----------------------------------------------------------
     ppv_out = os.path.join(OUT_DIR, "ppv_est.tif")
+    K, alpha = site_law_params()
     expr_ppv = f"{K} * ((\"distance@1\" / sqrt({W_charge_kg})) ^ (-{alpha}))"
 
-    processing.run("qgis:rastercalculator", {
+    run_alg("ppv", "qgis:rastercalculator", {
         "EXPRESSION": expr_ppv,
         "LAYERS": [dist_r],
         "CRS": dem.crs(),
         "EXTENT": dem.extent(),
         "CELL_SIZE": dem.rasterUnitsPerPixelX(),
         "OUTPUT": ppv_out
-    })
+    }, npix)
 
     ppv_r = QgsRasterLayer(ppv_out, "ppv")
     if not ppv_r.isValid():
@@ -219,14 +244,14 @@ def main():
         f"{w_slope} * ((\"slope@1\" - {SLOPE_MIN}) / ({SLOPE_MAX}-{SLOPE_MIN}))"
     )
 
-    processing.run("qgis:rastercalculator", {
+    run_alg("bvii", "qgis:rastercalculator", {
         "EXPRESSION": expr_bvii,
         "LAYERS": [ppv_r, dist_r, slope_r],
         "CRS": dem.crs(),
         "EXTENT": dem.extent(),
         "CELL_SIZE": dem.rasterUnitsPerPixelX(),
         "OUTPUT": bvii_out
-    })
+    }, npix)
 
     bvii_r = QgsRasterLayer(bvii_out, "bvii")
     if not bvii_r.isValid():
@@ -236,14 +261,26 @@ def main():
     # 6) SDI baseline (SDI = BVII)
     # ----------------------------------------------------------
     sdi_out = os.path.join(OUT_DIR, "sdi.tif")
-    processing.run("qgis:rastercalculator", {
+    run_alg("sdi", "qgis:rastercalculator", {
         "EXPRESSION": "\"bvii@1\"",
         "LAYERS": [bvii_r],
         "CRS": dem.crs(),
         "EXTENT": dem.extent(),
         "CELL_SIZE": dem.rasterUnitsPerPixelX(),
         "OUTPUT": sdi_out
-    })
+    }, npix)
+
+    # ----------------------------------------------------------
+    # 7) Output profile: tiled + compressed + overviews (see raster_output.py)
+    # The processing algorithms above write plain GTiffs; rewrite them once here.
+    # ----------------------------------------------------------
+    if raster_output.OUTPUT_PROFILE == "cog":
+        # Drop the layers first so their file handles don't block the rewrite (Windows)
+        slope_r = dam_r = dist_r = ppv_r = bvii_r = None
+        for path in (slope_out, dam_ras, dist_out, ppv_out, bvii_out, sdi_out):
+            name = os.path.splitext(os.path.basename(path))[0]
+            with stage(f"terrain_bvii_sdi.cog_output.{name}", items=npix, unit="pixels"):
+                raster_output.convert_to_cog(path)
 
     print("\n✅ SUCCESS — Outputs created in:")
     print("   ", OUT_DIR)
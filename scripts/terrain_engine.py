@@ -0,0 +1,277 @@
+# ==========================================================
+# Headless terrain engine (NumPy + GDAL, no QGIS needed)
+# Same products as terrain_bvii_sdi.py, computed in memory:
+#  slope_deg, dam_raster, distance_to_dam, ppv_est, bvii, sdi
+# Only FINAL_OUTPUTS are written unless WRITE_INTERMEDIATES = True
+# ==========================================================
+
+import os
+import numpy as np
+
+import raster_output
+from site_law import calibrated_law
+
+# =========================
+# CONFIG (EDIT IF NEEDED) — mirrors terrain_bvii_sdi.py
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+DEM_PATH = os.path.join(PROJECT_DIR, r"data\dem\processed\bhavanisagar_dem_utm.tif")
+
+OUT_DIR = os.path.join(PROJECT_DIR, "outputs", "rasters")
+
+# Try Bhavanisagar dam (WGS84 lat/lon) — if outside DEM, engine auto-uses DEM center
+DAM_LAT = 11.470833
+DAM_LON = 77.113889
+
+# ---- Scenario blast params (placeholders, tune later) ----
+W_charge_kg = 50
+K_DEFAULT = 1500
+ALPHA_DEFAULT = 1.6
+
+# Calibrated site law (site_law.py) replaces the placeholder K / alpha above
+# once a usable fit exists; SITE_LAW_SITE picks a per-site fit (None = all blasts).
+# Resolved at call time (site_law_params), so a recalibration is picked up.
+SITE_LAW_JSON = os.path.join(PROJECT_DIR, "outputs", "tables", "site_law.json")
+SITE_LAW_SITE = None
+
+# BVII weights
+w_ppv, w_dist, w_slope = 0.6, 0.25, 0.15
+
+# Normalization ranges (placeholders)
+PPV_MIN, PPV_MAX = 0.0, 50.0
+DIST_MIN, DIST_MAX = 0.0, 2000.0
+SLOPE_MIN, SLOPE_MAX = 0.0, 30.0
+
+ALL_OUTPUTS = ("slope_deg", "dam_raster", "distance_to_dam", "ppv_est", "bvii", "sdi")
+# Written on every run (slope_deg feeds terrain_rdi_from_slope.py)
+FINAL_OUTPUTS = ("slope_deg", "bvii", "sdi")
+# Set True to also write dam_raster, distance_to_dam and ppv_est
+WRITE_INTERMEDIATES = False
+
+# Nodata written for float outputs (distance keeps 0 like gdal:proximity)
+NODATA = -9999.0
+
+
+# =========================
+# HELPERS
+# =========================
+def read_dem(path):
+    """Read band 1 as float64 with nodata as NaN. Returns (array, geotransform, projection WKT)."""
+    ds = raster_output.load_gdal().Open(path)
+    if ds is None:
+        raise FileNotFoundError(f"❌ DEM failed to load:\n{path}")
+    band = ds.GetRasterBand(1)
+    arr = band.ReadAsArray().astype("float64")
+    nodata = band.GetNoDataValue()
+    if nodata is not None:
+        arr[arr == nodata] = np.nan
+    return arr, ds.GetGeoTransform(), ds.GetProjection()
+
+
+def horn_slope(dem, gt, z_factor=1.0):
+    """
+    Slope in degrees with Horn's 3x3 kernel, as gdal:slope with COMPUTE_EDGES.
+    Neighbours outside the grid (or nodata) take the centre value; nodata
+    centres stay NaN.
+    """
+    ew = abs(gt[1])
+    ns = abs(gt[5])
+
+    p = np.pad(dem, 1, mode="constant", constant_values=np.nan)
+    c = p[1:-1, 1:-1]
+
+    def nb(dr, dc):
+        v = p[1 + dr: p.shape[0] - 1 + dr, 1 + dc: p.shape[1] - 1 + dc]
+        return np.where(np.isnan(v), c, v)
+
+    a, b, cc = nb(-1, -1), nb(-1, 0), nb(-1, 1)
+    d, f = nb(0, -1), nb(0, 1)
+    g, h, i = nb(1, -1), nb(1, 0), nb(1, 1)
+
+    dzdx = ((cc + 2 * f + i) - (a + 2 * d + g)) / (8.0 * ew)
+    dzdy = ((g + 2 * h + i) - (a + 2 * b + cc)) / (8.0 * ns)
+
+    slope = np.degrees(np.arctan(z_factor * np.hypot(dzdx, dzdy)))
+    slope[np.isnan(c)] = np.nan
+    return slope
+
+
+def extent_of(gt, shape):
+    """(xmin, ymin, xmax, ymax) of a north-up grid."""
+    ny, nx = shape
+    x0, x1 = gt[0], gt[0] + nx * gt[1]
+    y0, y1 = gt[3], gt[3] + ny * gt[5]
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def dam_point_in_dem(gt, shape, proj_wkt, lat=DAM_LAT, lon=DAM_LON):
+    """
+    Transform the dam lat/lon into the DEM CRS (pooled coords transformer).
+    Returns (x, y, inside); falls back to the DEM center when outside.
+    """
+    from coords import WGS84, get_transformer
+
+    if not proj_wkt:
+        raise ValueError("DEM has no projection; cannot place the dam lat/lon on it.")
+    x, y = (float(v) for v in get_transformer(WGS84, proj_wkt).transform(lon, lat))
+
+    xmin, ymin, xmax, ymax = extent_of(gt, shape)
+    inside = xmin <= x <= xmax and ymin <= y <= ymax
+    if not inside:
+        x, y = (xmin + xmax) / 2.0, (ymin + ymax) / 2.0
+    return x, y, inside
+
+
+def warn_dam_outside(dam_inside):
+    """The one warning printed when dam_point_in_dem fell back to the DEM center."""
+    if not dam_inside:
+        print("⚠️ WARNING: Given dam lat/lon is outside DEM extent — used DEM CENTER as demo dam point.")
+
+
+def world_to_cell(gt, x, y, shape):
+    """Row/col of the cell containing (x, y), clamped into the grid."""
+    col = int(np.floor((x - gt[0]) / gt[1]))
+    row = int(np.floor((y - gt[3]) / gt[5]))
+    return min(max(row, 0), shape[0] - 1), min(max(col, 0), shape[1] - 1)
+
+
+def distance_to_cell(shape, gt, row, col, row_off=0, col_off=0):
+    """
+    Euclidean distance (georeferenced units) from every cell centre to the
+    centre of (row, col), like gdal:proximity on a single burned cell.
+    row_off/col_off place a sub-window of `shape` inside the full grid.
+    """
+    rr = (np.arange(shape[0]) + row_off - row) * abs(gt[5])
+    cc = (np.arange(shape[1]) + col_off - col) * abs(gt[1])
+    return np.hypot(rr[:, None], cc[None, :])
+
+
+def site_law_params(path=None, site=None):
+    """(K, alpha) from the current site-law calibration, or the placeholders."""
+    return calibrated_law(path or SITE_LAW_JSON, site or SITE_LAW_SITE, default=(K_DEFAULT, ALPHA_DEFAULT))
+
+
+def ppv_from_distance(dist, W=W_charge_kg, K=None, alpha=None):
+    """
+    PPV = K * (D / sqrt(W))^(-alpha); the dam cell itself (D = 0) is nodata.
+    K / alpha default to site_law_params().
+    """
+    if K is None or alpha is None:
+        k, a = site_law_params()
+        K = k if K is None else K
+        alpha = a if alpha is None else alpha
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ppv = np.asarray(K * np.power(dist / np.sqrt(W), -alpha))
+    ppv[np.asarray(dist) <= 0] = np.nan
+    return ppv
+
+
+def bvii_from_layers(ppv, dist, slope):
+    """
+    BVII = w_ppv*norm(PPV) + w_dist*(1 - norm(D)) + w_slope*norm(slope),
+    folded into one linear combination evaluated in place.
+    """
+    a_ppv = w_ppv / (PPV_MAX - PPV_MIN)
+    a_dist = -w_dist / (DIST_MAX - DIST_MIN)
+    a_slope = w_slope / (SLOPE_MAX - SLOPE_MIN)
+    const = w_dist - a_ppv * PPV_MIN - a_dist * DIST_MIN - a_slope * SLOPE_MIN
+
+    out = np.multiply(ppv, a_ppv)
+    out += const
+    out += a_dist * dist
+    out += a_slope * slope
+    return out
+
+
+def compute_window_layers(dem, gt, dam_rc, row_off=0, col_off=0, halo=0, law=None):
+    """
+    Pipeline layers for a window of the DEM.
+
+    dem may carry `halo` extra cells on every side (NaN outside the raster)
+    so the slope kernel sees the same neighbours as a whole-raster run;
+    the returned layers cover only the inner window starting at
+    (row_off, col_off) of the full grid. dam_rc is the dam cell in the full grid.
+    law: (K, alpha); None = site_law_params().
+    """
+    slope = horn_slope(dem, gt)
+    if halo:
+        slope = slope[halo:-halo, halo:-halo]
+    shape = slope.shape
+
+    row, col = dam_rc
+    dam = np.zeros(shape, dtype="float32")
+    if row_off <= row < row_off + shape[0] and col_off <= col < col_off + shape[1]:
+        dam[row - row_off, col - col_off] = 1.0
+
+    dist = distance_to_cell(shape, gt, row, col, row_off, col_off)
+    K, alpha = law or site_law_params()
+    ppv = ppv_from_distance(dist, K=K, alpha=alpha)
+    bvii = bvii_from_layers(ppv, dist, slope)
+
+    return {
+        "slope_deg": slope,
+        "dam_raster": dam,
+        "distance_to_dam": dist,
+        "ppv_est": ppv,
+        "bvii": bvii,
+        # SDI baseline (SDI = BVII)
+        "sdi": bvii,
+    }
+
+
+def compute_terrain_layers(dem, gt, dam_xy, law=None):
+    """All pipeline layers for one DEM array and dam point (DEM CRS)."""
+    dam_rc = world_to_cell(gt, dam_xy[0], dam_xy[1], dem.shape)
+    return compute_window_layers(dem, gt, dam_rc, law=law)
+
+
+def write_raster(path, arr, gt, proj, nodata=NODATA):
+    """
+    Write a single-band GeoTIFF, NaN → nodata. Uses the raster_output
+    profile: tiled/compressed with overviews ("cog", index rasters at
+    INDEX_PRECISION) or striped Float32 ("plain").
+    """
+    if raster_output.OUTPUT_PROFILE == "cog":
+        raster_output.write_cog(path, arr, gt, proj, nodata, raster_output.precision_for(path))
+        return
+    gdal = raster_output.load_gdal()
+    drv = gdal.GetDriverByName("GTiff")
+    ds = drv.Create(path, arr.shape[1], arr.shape[0], 1, gdal.GDT_Float32)
+    ds.SetGeoTransform(gt)
+    ds.SetProjection(proj)
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    band.WriteArray(np.where(np.isnan(arr), nodata, arr).astype("float32"))
+    band.FlushCache()
+    ds = None
+
+
+def layer_nodata(name):
+    """Nodata used for each product (matches the QGIS chain)."""
+    return 0.0 if name in ("dam_raster", "distance_to_dam") else NODATA
+
+
+def main():
+    if not os.path.exists(DEM_PATH):
+        raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    dem, gt, proj = read_dem(DEM_PATH)
+
+    x, y, dam_inside = dam_point_in_dem(gt, dem.shape, proj)
+    warn_dam_outside(dam_inside)
+
+    layers = compute_terrain_layers(dem, gt, (x, y))
+
+    names = list(ALL_OUTPUTS) if WRITE_INTERMEDIATES else list(FINAL_OUTPUTS)
+    for name in names:
+        write_raster(os.path.join(OUT_DIR, name + ".tif"), layers[name], gt, proj, layer_nodata(name))
+
+    print("\n✅ SUCCESS — Outputs created in:")
+    print("   ", OUT_DIR)
+    for name in names:
+        print("  ", name + ".tif")
+
+
+if __name__ == "__main__":
+    main()
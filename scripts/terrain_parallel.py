@@ -0,0 +1,207 @@
+# ==========================================================
+# Multi-core raster pipeline: tiles × scenarios on a process pool
+# DEM, slope and distance are shared with the workers through shared memory.
+# Outputs: <OUT_DIR>/scenarios/<name>/{ppv_est,bvii,sdi}.tif
+# ==========================================================
+
+import os
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from terrain_engine import (
+    DEM_PATH,
+    OUT_DIR,
+    W_charge_kg,
+    bvii_from_layers,
+    dam_point_in_dem,
+    distance_to_cell,
+    horn_slope,
+    ppv_from_distance,
+    read_dem,
+    site_law_params,
+    warn_dam_outside,
+    world_to_cell,
+    write_raster,
+)
+from terrain_tiles import iter_windows
+
+# Scenario variants (charge design × attenuation constants);
+# K / alpha None = the calibrated site law (terrain_engine.site_law_params)
+SCENARIOS = [
+    {"name": "baseline", "W_charge_kg": W_charge_kg, "K": None, "alpha": None},
+]
+
+# Sweep instead of SCENARIOS: every combination of these (None = no sweep)
+SWEEP_CHARGES_KG = None     # e.g. [25, 50, 100]
+SWEEP_K = (None,)
+SWEEP_ALPHA = (None,)
+
+# Tile edge in cells for splitting work across processes
+TILE_SIZE = 512
+
+# None → os.cpu_count()
+MAX_WORKERS = None
+
+SCENARIO_OUTPUTS = ("ppv_est", "bvii", "sdi")
+
+
+def scenario_law(sc, law=None):
+    """(K, alpha) of a scenario; None entries come from `law` (default site_law_params())."""
+    if sc["K"] is not None and sc["alpha"] is not None:
+        return sc["K"], sc["alpha"]
+    k, a = law or site_law_params()
+    return (k if sc["K"] is None else sc["K"]), (a if sc["alpha"] is None else sc["alpha"])
+
+
+def scenario_grid(charges_kg, Ks=(None,), alphas=(None,)):
+    """Every combination of charge, K and alpha (None = calibrated) as a scenario list."""
+    law = site_law_params() if None in Ks or None in alphas else None
+    out = []
+    for w, k, a in itertools.product(charges_kg, Ks, alphas):
+        k, a = scenario_law({"K": k, "alpha": a}, law)
+        out.append({"name": f"W{w:g}_K{k:g}_a{a:g}", "W_charge_kg": w, "K": k, "alpha": a})
+    return out
+
+
+def configured_scenarios():
+    """The SWEEP_* grid when SWEEP_CHARGES_KG is set, else SCENARIOS."""
+    if SWEEP_CHARGES_KG:
+        return scenario_grid(SWEEP_CHARGES_KG, SWEEP_K, SWEEP_ALPHA)
+    return SCENARIOS
+
+
+# =========================
+# SHARED MEMORY
+# =========================
+def create_shared(shape, dtype="float64"):
+    """Allocate a shared-memory block and an ndarray view on it."""
+    dtype = np.dtype(dtype)
+    size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return shm, arr
+
+
+# Worker-side {key: (name, shape, dtype)}, set once per process by _init_worker()
+_SPECS = {}
+
+
+def _init_worker(specs):
+    _SPECS.update(specs)
+
+
+def _attached(keys, fn, *args):
+    """fn(*shared arrays for keys, *args) with the blocks mapped only for this call."""
+    blocks = [shared_memory.SharedMemory(name=_SPECS[k][0]) for k in keys]
+    try:
+        views = [np.ndarray(_SPECS[k][1], dtype=np.dtype(_SPECS[k][2]), buffer=shm.buf)
+                 for k, shm in zip(keys, blocks)]
+        return fn(*views, *args)
+    finally:
+        views = None
+        for shm in blocks:
+            shm.close()
+
+
+def _slope_window(dem, slope, dist, x0, y0, w, h, gt, dam_rc):
+    """Slope + distance for one window, written into the shared grids."""
+    ny, nx = dem.shape
+
+    # Window plus 1-cell halo; NaN beyond the raster edge (as in terrain_tiles)
+    win = np.full((h + 2, w + 2), np.nan)
+    rx0, ry0 = max(x0 - 1, 0), max(y0 - 1, 0)
+    rx1, ry1 = min(x0 + w + 1, nx), min(y0 + h + 1, ny)
+    win[ry0 - y0 + 1: ry1 - y0 + 1, rx0 - x0 + 1: rx1 - x0 + 1] = dem[ry0:ry1, rx0:rx1]
+
+    slope[y0:y0 + h, x0:x0 + w] = horn_slope(win, gt)[1:-1, 1:-1]
+    dist[y0:y0 + h, x0:x0 + w] = distance_to_cell((h, w), gt, dam_rc[0], dam_rc[1], y0, x0)
+
+
+def _scenario_window(slope, dist, ppv_out, bvii_out, x0, y0, w, h, W, k, a):
+    """PPV + BVII of the current scenario for one window, written into the shared outputs."""
+    d = dist[y0:y0 + h, x0:x0 + w]
+    ppv = ppv_from_distance(d, W=W, K=k, alpha=a)
+    ppv_out[y0:y0 + h, x0:x0 + w] = ppv
+    bvii_out[y0:y0 + h, x0:x0 + w] = bvii_from_layers(ppv, d, slope[y0:y0 + h, x0:x0 + w])
+
+
+def _slope_task(args):
+    _attached(("dem", "slope", "dist"), _slope_window, *args)
+
+
+def _scenario_task(args):
+    _attached(("slope", "dist", "ppv", "bvii"), _scenario_window, *args)
+
+
+def run_parallel(dem, gt, proj, dam_rc, out_root, scenarios=SCENARIOS, tile=TILE_SIZE,
+                 max_workers=MAX_WORKERS):
+    """
+    Evaluate every scenario over the DEM grid on a process pool and write
+    <out_root>/<name>/{ppv_est,bvii,sdi}.tif. Scenarios run one after the
+    other through the same shared output grids, so memory does not grow
+    with the number of scenarios. Returns the scenario directories.
+    """
+    ny, nx = dem.shape
+    workers = max_workers or os.cpu_count() or 1
+    law = site_law_params()
+    blocks = []
+    arrays = {}
+    try:
+        specs = {}
+        for key, dtype in (("dem", "float64"), ("slope", "float64"), ("dist", "float64"),
+                           ("ppv", "float32"), ("bvii", "float32")):
+            shm, arr = create_shared((ny, nx), dtype)
+            blocks.append(shm)
+            specs[key] = (shm.name, (ny, nx), dtype)
+            arrays[key] = arr
+        arrays["dem"][:] = dem
+
+        windows = list(iter_windows(nx, ny, tile))
+        chunksize = max(1, len(windows) // (4 * workers))
+        dirs = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs,)) as pool:
+            # Stage 1: terrain grids shared by every scenario
+            list(pool.map(_slope_task, [(x0, y0, w, h, gt, dam_rc) for x0, y0, w, h in windows],
+                          chunksize=chunksize))
+
+            # Stage 2: tiles of one scenario at a time, written out before the next
+            for sc in scenarios:
+                k, a = scenario_law(sc, law)
+                tasks = [(x0, y0, w, h, sc["W_charge_kg"], k, a) for x0, y0, w, h in windows]
+                list(pool.map(_scenario_task, tasks, chunksize=chunksize))
+
+                sc_dir = os.path.join(out_root, sc["name"])
+                os.makedirs(sc_dir, exist_ok=True)
+                # SDI baseline (SDI = BVII)
+                layers = {"ppv_est": arrays["ppv"], "bvii": arrays["bvii"], "sdi": arrays["bvii"]}
+                for out in SCENARIO_OUTPUTS:
+                    write_raster(os.path.join(sc_dir, out + ".tif"), layers[out], gt, proj)
+                dirs.append(sc_dir)
+        return dirs
+    finally:
+        arrays = arr = layers = None
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def main():
+    if not os.path.exists(DEM_PATH):
+        raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
+
+    dem, gt, proj = read_dem(DEM_PATH)
+    x, y, dam_inside = dam_point_in_dem(gt, dem.shape, proj)
+    warn_dam_outside(dam_inside)
+    dam_rc = world_to_cell(gt, x, y, dem.shape)
+
+    out_root = os.path.join(OUT_DIR, "scenarios")
+    dirs = run_parallel(dem, gt, proj, dam_rc, out_root, configured_scenarios())
+
+    print(f"\n✅ SUCCESS — {len(dirs)} scenario(s) computed in parallel.")
+    print("   ", out_root)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 import os
+import numpy as np
 import pandas as pd
-from osgeo import gdal
 
-# Make GDAL raise Python exceptions (future-proof)
-gdal.UseExceptions()
+from compute_modules_1_2_3 import inv_distance_norm, minmax
+from instrumentation import stage
+from normalization import make_normalizers, table_bounds
+from raster_mmap import open_raster
+from raster_output import load_gdal
+from raster_sampling import sample_points
+from table_io import stage_inputs, write_stage
 
 PROJECT_DIR = r"C:\damsafe"
 CSV_PATH = os.path.join(PROJECT_DIR, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset_DEMOcoords.csv")
 SLOPE_TIF = os.path.join(PROJECT_DIR, "outputs", "rasters", "slope_deg.tif")
+# A .parquet OUT_CSV reads only the needed columns and writes only Slope_deg/RDI/RDI_Level
 OUT_CSV = os.path.join(PROJECT_DIR, "outputs", "tables", "module3_rdi_terrain.csv")
 os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
 
@@ -16,102 +22,73 @@ W_PPV = 0.60
 W_DIST = 0.25
 W_SLOPE = 0.15
 
+# Slope sampling: "nearest" (cell value) or "bilinear"
+SAMPLE_METHOD = "nearest"
 
-def minmax(s):
-    s = s.astype(float)
-    mn, mx = s.min(), s.max()
-    if mx - mn == 0:
-        return s * 0.0
-    return (s - mn) / (mx - mn)
+# Slope access: "gdal" (block reads) or "mmap" (materialized .npy, see raster_mmap.py)
+SLOPE_ACCESS = "gdal"
 
+# Normalization ranges, as in normalization.py: "running" = this table's own
+# min/max, "fixed" = FIXED_RANGES, "quantile" = the frozen NORM_STATE sketches
+NORM_MODE = "running"
 
-def inv_dist_norm(d):
-    return 1.0 - minmax(d)
 
-
-def inv_geotransform(gt):
+def terrain_rdi(df, slopes, normalizers=None):
     """
-    Robust inverse geotransform across GDAL versions.
-    Returns inverse GT tuple or None.
+    Terrain-based RDI from per-blast slope samples (NaN = no sample; filled
+    with the median). Adds Slope_deg / RDI / RDI_Level to df.
+    normalizers: {column: normalizer} from normalization.py (default: NORM_MODE).
+    Returns (df, number of filled samples).
     """
-    inv = gdal.InvGeoTransform(gt)
-
-    # Possible return styles:
-    # 1) (success_bool, inv_gt)
-    # 2) inv_gt only
-    # 3) (inv_gt, success_bool) in some builds (rare)
-    if isinstance(inv, tuple) and len(inv) == 2 and isinstance(inv[0], (bool, int)):
-        ok, inv_gt = inv
-        return inv_gt if ok else None
-    if isinstance(inv, tuple) and len(inv) == 2 and isinstance(inv[1], (bool, int)):
-        inv_gt, ok = inv
-        return inv_gt if ok else None
-    if isinstance(inv, tuple) and len(inv) == 6:
-        return inv
-
-    return None
+    missing = int(np.isnan(slopes).sum())
 
+    s_series = pd.Series(slopes, index=df.index, dtype="float64")
+    if s_series.notna().sum() == 0:
+        raise RuntimeError("All slope samples are None. Check that blast coordinates fall inside the slope raster extent.")
 
-def sample_raster(ds, x, y):
-    gt = ds.GetGeoTransform()
-    inv_gt = inv_geotransform(gt)
-    if inv_gt is None:
-        return None
+    df["Slope_deg"] = s_series.fillna(s_series.median())
 
-    # Pixel coordinates
-    px = int(inv_gt[0] + inv_gt[1] * x + inv_gt[2] * y)
-    py = int(inv_gt[3] + inv_gt[4] * x + inv_gt[5] * y)
+    # Compute terrain-based RDI
+    with stage("terrain_rdi_from_slope.normalization", items=len(df)):
+        stats = table_bounds(df, normalizers or make_normalizers(NORM_MODE))
+        ppv_n = minmax(df["PPV_mm_per_s"], bounds=stats["PPV_mm_per_s"])
+        dist_risk = inv_distance_norm(df["Distance_from_Dam_m"], bounds=stats["Distance_from_Dam_m"])
+        slope_n = minmax(df["Slope_deg"], bounds=stats["Slope_deg"])
 
-    if px < 0 or py < 0 or px >= ds.RasterXSize or py >= ds.RasterYSize:
-        return None
+    with stage("terrain_rdi_from_slope.rdi", items=len(df)):
+        df["RDI"] = (W_PPV * ppv_n) + (W_DIST * dist_risk) + (W_SLOPE * slope_n)
 
-    band = ds.GetRasterBand(1)
-    arr = band.ReadAsArray(px, py, 1, 1)
-    if arr is None:
-        return None
-    return float(arr[0, 0])
+    with stage("terrain_rdi_from_slope.rdi_labels", items=len(df)):
+        df["RDI_Level"] = pd.cut(df["RDI"], [-0.01, 0.33, 0.66, 1.01], labels=["Low", "Moderate", "High"])
+    return df, missing
 
 
 def main():
-    df = pd.read_csv(CSV_PATH)
+    with stage("terrain_rdi_from_slope.csv_load") as rec:
+        df = stage_inputs(CSV_PATH, "module3_terrain", OUT_CSV)
+        rec["items"] = len(df)
 
     # Required columns
     for col in ["PPV_mm_per_s", "Distance_from_Dam_m", "Blast_Easting", "Blast_Northing"]:
         if col not in df.columns:
             raise ValueError(f"Missing column: {col}")
 
-    ds = gdal.Open(SLOPE_TIF)
-    if ds is None:
-        raise FileNotFoundError("Cannot open slope raster: " + SLOPE_TIF)
-
-    slopes = []
-    missing = 0
-
-    for _, r in df.iterrows():
-        x = float(r["Blast_Easting"])
-        y = float(r["Blast_Northing"])
-        s = sample_raster(ds, x, y)
-        if s is None:
-            missing += 1
-            slopes.append(None)
-        else:
-            slopes.append(s)
-
-    s_series = pd.Series(slopes, dtype="float64")
-    if s_series.notna().sum() == 0:
-        raise RuntimeError("All slope samples are None. Check that blast coordinates fall inside the slope raster extent.")
-
-    df["Slope_deg"] = s_series.fillna(s_series.median())
-
-    # Compute terrain-based RDI
-    ppv_n = minmax(df["PPV_mm_per_s"])
-    dist_risk = inv_dist_norm(df["Distance_from_Dam_m"])
-    slope_n = minmax(df["Slope_deg"])
-
-    df["RDI"] = (W_PPV * ppv_n) + (W_DIST * dist_risk) + (W_SLOPE * slope_n)
-    df["RDI_Level"] = pd.cut(df["RDI"], [-0.01, 0.33, 0.66, 1.01], labels=["Low", "Moderate", "High"])
-
-    df.to_csv(OUT_CSV, index=False)
+    xs = df["Blast_Easting"].to_numpy(dtype=float)
+    ys = df["Blast_Northing"].to_numpy(dtype=float)
+    if SLOPE_ACCESS == "mmap":
+        slope_r = open_raster(SLOPE_TIF)
+        with stage("terrain_rdi_from_slope.raster_sampling", items=len(xs), unit="points"):
+            slopes = slope_r.sample(xs, ys, method=SAMPLE_METHOD)
+    else:
+        ds = load_gdal().Open(SLOPE_TIF)
+        if ds is None:
+            raise FileNotFoundError("Cannot open slope raster: " + SLOPE_TIF)
+        with stage("terrain_rdi_from_slope.raster_sampling", items=len(xs), unit="points"):
+            slopes = sample_points(ds, xs, ys, method=SAMPLE_METHOD)
+    df, missing = terrain_rdi(df, slopes)
+
+    with stage("terrain_rdi_from_slope.write", items=len(df)):
+        write_stage(df, OUT_CSV, "module3_terrain")
 
     print("✅ Module 3 Terrain-based RDI computed.")
     print("Saved:", OUT_CSV)
@@ -0,0 +1,151 @@
+# ==========================================================
+# Tiled / windowed terrain pipeline for large DEMs
+# Streams the DEM tile by tile (with a 1-cell halo for the slope
+# kernel) and writes each tile straight into tiled GeoTIFF outputs.
+# Peak memory ~ a few float64 copies of one tile, not of the raster.
+# ==========================================================
+
+import os
+import numpy as np
+
+import raster_output
+from terrain_engine import (
+    DEM_PATH,
+    OUT_DIR,
+    ALL_OUTPUTS,
+    FINAL_OUTPUTS,
+    WRITE_INTERMEDIATES,
+    compute_window_layers,
+    dam_point_in_dem,
+    layer_nodata,
+    site_law_params,
+    warn_dam_outside,
+    world_to_cell,
+)
+
+# Tile edge in cells (multiple of 16 so it doubles as the GeoTIFF block size)
+TILE_SIZE = 1024
+
+# Extra cells read around each tile; Horn slope needs 1
+HALO = 1
+
+TILED_OPTIONS = ["TILED=YES", "BIGTIFF=IF_SAFER"]
+
+
+def iter_windows(nx, ny, tile=TILE_SIZE):
+    """Yield (x0, y0, w, h) windows covering an nx × ny raster in row-major order."""
+    for y0 in range(0, ny, tile):
+        for x0 in range(0, nx, tile):
+            yield x0, y0, min(tile, nx - x0), min(tile, ny - y0)
+
+
+def read_window(band, x0, y0, w, h, halo=HALO):
+    """
+    Read a window plus `halo` cells on each side as float64.
+    Cells outside the raster and nodata cells are NaN.
+    """
+    nx, ny = band.XSize, band.YSize
+    out = np.full((h + 2 * halo, w + 2 * halo), np.nan)
+
+    rx0, ry0 = max(x0 - halo, 0), max(y0 - halo, 0)
+    rx1, ry1 = min(x0 + w + halo, nx), min(y0 + h + halo, ny)
+    arr = band.ReadAsArray(rx0, ry0, rx1 - rx0, ry1 - ry0).astype("float64")
+
+    nodata = band.GetNoDataValue()
+    if nodata is not None:
+        arr[arr == nodata] = np.nan
+
+    oy, ox = ry0 - (y0 - halo), rx0 - (x0 - halo)
+    out[oy:oy + arr.shape[0], ox:ox + arr.shape[1]] = arr
+    return out
+
+
+def create_tiled_output(path, nx, ny, gt, proj, nodata, tile=TILE_SIZE):
+    """Create an internally tiled Float32 GeoTIFF whose blocks match the processing tiles."""
+    gdal = raster_output.load_gdal()
+    drv = gdal.GetDriverByName("GTiff")
+    options = TILED_OPTIONS + [f"BLOCKXSIZE={tile}", f"BLOCKYSIZE={tile}"]
+    ds = drv.Create(path, nx, ny, 1, gdal.GDT_Float32, options=options)
+    ds.SetGeoTransform(gt)
+    ds.SetProjection(proj)
+    ds.GetRasterBand(1).SetNoDataValue(nodata)
+    return ds
+
+
+def run_tiled(dem_path=DEM_PATH, out_dir=OUT_DIR, names=None, tile=TILE_SIZE):
+    """
+    Run the slope → distance → PPV → BVII → SDI chain tile by tile.
+    Returns (output paths, dam_inside).
+    """
+    if tile % 16:
+        raise ValueError("tile must be a multiple of 16 (GeoTIFF block size).")
+    if names is None:
+        names = list(FINAL_OUTPUTS)
+
+    src = raster_output.load_gdal().Open(dem_path)
+    if src is None:
+        raise FileNotFoundError(f"❌ DEM failed to load:\n{dem_path}")
+    band = src.GetRasterBand(1)
+    nx, ny = src.RasterXSize, src.RasterYSize
+    gt, proj = src.GetGeoTransform(), src.GetProjection()
+
+    x, y, dam_inside = dam_point_in_dem(gt, (ny, nx), proj)
+    dam_rc = world_to_cell(gt, x, y, (ny, nx))
+    law = site_law_params()             # one (K, alpha) for every tile
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {name: os.path.join(out_dir, name + ".tif") for name in names}
+    # cog: tiles go straight into the staging files (final storage type);
+    # compression and overviews need the whole raster and are added at the end
+    cog = raster_output.OUTPUT_PROFILE == "cog"
+    if cog:
+        outs = {
+            name: raster_output.create_staging(paths[name], nx, ny, gt, proj, layer_nodata(name))
+            for name in names
+        }
+    else:
+        outs = {
+            name: create_tiled_output(paths[name], nx, ny, gt, proj, layer_nodata(name), tile)
+            for name in names
+        }
+
+    for x0, y0, w, h in iter_windows(nx, ny, tile):
+        dem = read_window(band, x0, y0, w, h)
+        layers = compute_window_layers(dem, gt, dam_rc, row_off=y0, col_off=x0, halo=HALO, law=law)
+        for name in names:
+            arr = layers[name]
+            if cog:
+                raster_output.write_block(outs[name], arr, x0, y0)
+            else:
+                outs[name].GetRasterBand(1).WriteArray(
+                    np.where(np.isnan(arr), layer_nodata(name), arr).astype("float32"), x0, y0
+                )
+    src = None
+
+    if cog:
+        for staging in outs.values():
+            raster_output.finish_staging(staging)
+    else:
+        for ds in outs.values():
+            ds.FlushCache()
+    outs = None
+    return paths, dam_inside
+
+
+def main():
+    if not os.path.exists(DEM_PATH):
+        raise FileNotFoundError(f"❌ DEM not found:\n{DEM_PATH}")
+
+    names = list(ALL_OUTPUTS) if WRITE_INTERMEDIATES else list(FINAL_OUTPUTS)
+    paths, dam_inside = run_tiled(names=names)
+
+    warn_dam_outside(dam_inside)
+
+    print(f"\n✅ SUCCESS — Tiled outputs ({TILE_SIZE}x{TILE_SIZE}) created in:")
+    print("   ", OUT_DIR)
+    for path in paths.values():
+        print("  ", os.path.basename(path))
+
+
+if __name__ == "__main__":
+    main()
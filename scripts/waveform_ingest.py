@@ -0,0 +1,237 @@
+# ==========================================================
+# Geophone waveform ingestion
+# Reads tri-axial velocity traces (.npy / .bin / .parquet + JSON sidecar) in
+# chunks; the highest-PPV trace of each blast replaces PPV_mm_per_s /
+# Time_to_Peak_ms in the blast log before Modules 1-4 run.
+# Outputs: waveform_metrics.csv and the Module 1-4 tables
+# ==========================================================
+
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+
+from compute_modules_1_2_3 import CSV_PATH, compute_modules
+from compute_module4_dam_state import compute_module4
+from instrumentation import stage
+from table_io import read_table, write_table
+
+# =========================
+# CONFIG
+# =========================
+PROJECT_DIR = r"C:\damsafe"
+WAVEFORM_DIR = os.path.join(PROJECT_DIR, "data", "waveforms")
+OUT_DIR = os.path.join(PROJECT_DIR, "outputs", "tables")
+METRICS_CSV = os.path.join(OUT_DIR, "waveform_metrics.csv")
+M123_CSV = os.path.join(OUT_DIR, "modules_1_2_3_waveform.csv")
+M4_CSV = os.path.join(OUT_DIR, "module4_dam_state_waveform.csv")
+
+# Channel order in every file: transverse, vertical, longitudinal
+AXES = ("T", "V", "L")
+
+# Traces processed per chunk. A chunk is CHUNK_TRACES × 3 × samples × 4 bytes;
+# trace_metrics allocates up to about 3.5× that on top of the chunk (the
+# baseline-removed copy, the scratch copies np.median makes, and the spectrum
+# of one axis at a time).
+CHUNK_TRACES = 256
+
+# Conversion of the recorded units to mm/s
+UNIT_SCALE = {"mm/s": 1.0, "m/s": 1000.0, "in/s": 25.4}
+
+SIDECAR_EXT = ".json"
+BLAST_ROW_COL = "Blast_Row"
+
+
+# =========================
+# READERS
+# =========================
+def read_sidecar(path):
+    meta_path = os.path.splitext(path)[0] + SIDECAR_EXT
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError("Waveform sidecar not found: " + meta_path)
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def open_binary(path, meta):
+    """Memory-mapped (traces, 3, samples) view of a .npy or .bin file."""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    dtype = np.dtype(meta.get("dtype", "float32"))
+    n_samples = int(meta["n_samples"])
+    n_traces = os.path.getsize(path) // (dtype.itemsize * len(AXES) * n_samples)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n_traces, len(AXES), n_samples))
+
+
+def iter_chunks(path, meta, chunk=CHUNK_TRACES):
+    """Yield (traces (n, 3, samples) float32, blast rows (n,)) chunk by chunk."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        import pyarrow.compute as pc
+        n_samples = meta.get("n_samples")
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunk, columns=[BLAST_ROW_COL, *AXES]):
+            n = batch.num_rows
+            # Every trace of every axis must have the same length, or the
+            # flattened values would be reshaped across trace boundaries
+            lengths = np.concatenate([pc.list_value_length(batch.column(a)).to_numpy(zero_copy_only=False)
+                                      for a in AXES])
+            expected = int(n_samples) if n_samples is not None else (int(lengths[0]) if n else 0)
+            if n and not (lengths == expected).all():
+                raise ValueError(f"{os.path.basename(path)}: traces of unequal length "
+                                 f"({int(lengths.min())}..{int(lengths.max())} samples, expected {expected})")
+            axes = [batch.column(a).flatten().to_numpy(zero_copy_only=False).reshape(n, expected) for a in AXES]
+            yield np.stack(axes, axis=1).astype(np.float32), batch.column(BLAST_ROW_COL).to_numpy()
+        return
+
+    arr = open_binary(path, meta)
+    rows = np.asarray(meta["blast_rows"], dtype=np.int64)
+    if len(rows) != len(arr):
+        raise ValueError(f"{os.path.basename(path)}: {len(arr)} traces but {len(rows)} blast_rows in sidecar")
+    for i in range(0, len(arr), chunk):
+        yield np.asarray(arr[i:i + chunk], dtype=np.float32), rows[i:i + chunk]
+
+
+# =========================
+# METRICS
+# =========================
+def trace_metrics(v, fs, pretrigger=0):
+    """
+    Peak metrics for a block of tri-axial velocity traces.
+
+    v: (traces, 3, samples) in mm/s. The baseline is removed first: the mean
+    of the pre-trigger samples, or without them the median of the whole
+    trace (a mean would include the blast itself and shift the peak).
+    Time to peak is measured from the trigger. The dominant frequency is the
+    largest non-DC line of the power spectrum summed over the three axes, so
+    it does not depend on which axis happens to peak.
+    Returns {column: (traces,) array}.
+    """
+    n, _, ns = v.shape
+    if pretrigger > 0:
+        v = v - v[..., :pretrigger].mean(axis=-1, keepdims=True)
+    else:
+        v = v - np.median(v, axis=-1, keepdims=True)
+
+    axis_peak = np.maximum(v.max(axis=-1), -v.min(axis=-1))
+    vsum = np.sqrt(np.einsum("ijk,ijk->ik", v, v))
+    i_peak = vsum.argmax(axis=-1)
+    idx = np.arange(n)
+
+    # One axis at a time: a complex spectrum of the whole block is 2-4× its size
+    power = np.zeros((n, ns // 2 + 1))
+    for j in range(v.shape[1]):
+        power += np.abs(np.fft.rfft(v[:, j], axis=-1)) ** 2
+    power[:, 0] = 0.0
+    freq = power.argmax(axis=-1) * fs / ns
+
+    out = {"PPV_mm_per_s": vsum[idx, i_peak].astype(float)}
+    for j, a in enumerate(AXES):
+        out[f"PPV_{a}_mm_per_s"] = axis_peak[:, j].astype(float)
+    out["Time_to_Peak_ms"] = (i_peak - pretrigger) * 1000.0 / fs
+    out["Dominant_Freq_Hz"] = freq
+    return out
+
+
+def ingest_file(path, chunk=CHUNK_TRACES):
+    """Per-trace metrics for one waveform file."""
+    meta = read_sidecar(path)
+    fs = float(meta["sample_rate_hz"])
+    pretrigger = int(meta.get("pretrigger_samples", 0))
+    scale = UNIT_SCALE[meta.get("units", "mm/s")]
+
+    parts = []
+    for traces, rows in iter_chunks(path, meta, chunk):
+        if scale != 1.0:
+            traces = traces * scale
+        m = trace_metrics(traces, fs, pretrigger)
+        parts.append(pd.DataFrame({BLAST_ROW_COL: rows, **m}))
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=[BLAST_ROW_COL])
+    df["Waveform_File"] = os.path.basename(path)
+    return df
+
+
+def waveform_files(wave_dir=WAVEFORM_DIR):
+    files = []
+    for ext in ("*.npy", "*.bin", "*.parquet"):
+        files += glob.glob(os.path.join(wave_dir, ext))
+    return sorted(files)
+
+
+def ingest_dir(wave_dir=WAVEFORM_DIR, chunk=CHUNK_TRACES):
+    """Per-trace metrics for every waveform file in wave_dir."""
+    files = waveform_files(wave_dir)
+    if not files:
+        raise FileNotFoundError(f"❌ No waveform files in:\n{wave_dir}")
+    with stage("waveform_ingest.waveform_metrics", unit="traces") as rec:
+        metrics = pd.concat([ingest_file(p, chunk) for p in files], ignore_index=True)
+        rec["items"] = len(metrics)
+    return metrics
+
+
+# =========================
+# BLAST LOG
+# =========================
+def governing_traces(metrics):
+    """One row per blast: the trace with the highest vector-sum PPV."""
+    order = metrics.sort_values("PPV_mm_per_s", ascending=False, kind="stable")
+    return order.drop_duplicates(BLAST_ROW_COL).sort_values(BLAST_ROW_COL).reset_index(drop=True)
+
+
+def apply_to_blasts(df, metrics):
+    """
+    Overwrite PPV_mm_per_s / Time_to_Peak_ms (and add per-axis peaks and
+    Dominant_Freq_Hz) for every blast with a recorded trace. Blasts without
+    one keep their logged values. Only the metric columns are touched, and an
+    existing column is widened only as far as the new values need.
+    Returns (df, number of blasts updated).
+    """
+    gov = governing_traces(metrics)
+    rows = gov[BLAST_ROW_COL].to_numpy(dtype=np.int64)
+    bad = (rows < 0) | (rows >= len(df))
+    if bad.any():
+        raise ValueError(f"{int(bad.sum())} traces reference rows outside the blast log ({len(df)} rows)")
+
+    for col in gov.columns:
+        if col in (BLAST_ROW_COL, "Waveform_File"):
+            continue
+        new = gov[col].to_numpy(dtype=float)
+        if col not in df.columns:
+            df[col] = np.nan
+        elif not pd.api.types.is_numeric_dtype(df[col]):
+            raise ValueError(f"Blast log column {col} is not numeric ({df[col].dtype})")
+        old = df[col].dtype
+        dtype = np.result_type(old, new.dtype) if isinstance(old, np.dtype) else np.dtype(float)
+        values = df[col].to_numpy(dtype=dtype, copy=True, na_value=np.nan)
+        values[rows] = new
+        df[col] = values
+    return df, len(rows)
+
+
+def main():
+    with stage("waveform_ingest.csv_load") as rec:
+        df = read_table(CSV_PATH)
+        rec["items"] = len(df)
+
+    metrics = ingest_dir()
+    df, updated = apply_to_blasts(df, metrics)
+
+    df = compute_modules(df)
+    with stage("waveform_ingest.dam_state_m4", items=len(df)):
+        df, _ = compute_module4(df)
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+    with stage("waveform_ingest.write", items=len(df)):
+        metrics.to_csv(METRICS_CSV, index=False)
+        write_table(df.drop(columns=["Dam_State_M4", "Failure_Flag_M4"]), M123_CSV)
+        write_table(df, M4_CSV)
+
+    print(f"✅ Waveforms ingested: {len(metrics)} traces, {updated} blasts updated with measured PPV.")
+    print("Saved:", METRICS_CSV)
+    print("Saved:", M123_CSV)
+    print("Saved:", M4_CSV)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+DATA_CSV = os.path.join(ROOT, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset.csv")
+TABLES_DIR = os.path.join(ROOT, "tables")
+
+
+@pytest.fixture
+def blast_log():
+    """The shipped blast log (no timestamps, row order = blast order)."""
+    return pd.read_csv(DATA_CSV)
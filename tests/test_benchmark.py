@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+import benchmark as bench
+
+
+def test_synth_table_uses_demo_extent():
+    df = bench.synth_blast_table(200)
+    assert df["Blast_Easting"].between(bench.XMIN + bench.MARGIN_M, bench.XMAX - bench.MARGIN_M).all()
+    assert df["Blast_Northing"].between(bench.YMIN + bench.MARGIN_M, bench.YMAX - bench.MARGIN_M).all()
+
+
+def test_tiled_benchmark_runs_on_small_dem(tmp_path, monkeypatch):
+    pytest.importorskip("osgeo")
+    monkeypatch.setattr(bench, "BENCH_DIR", str(tmp_path))
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(bench.XMIN, bench.XMAX, 50)
+    ys = rng.uniform(bench.YMIN, bench.YMAX, 50)
+
+    results = []
+    bench.run_tiled_benchmark(results, 96, xs, ys, tile=32)
+    assert [r["bench"] for r in results] == ["raster_chain_tiled", "slope_sampling", "slope_bilinear"]
+    assert all(r["seconds"] > 0 for r in results)
+
+    # The DEM is georeferenced, so the dam lat/lon lands inside it
+    dem_path = str(tmp_path / "dem.tif")
+    bench.write_synth_dem(dem_path, 96, tile=32)
+    _, dam_inside = bench.run_tiled(dem_path, str(tmp_path / "out"), tile=32)
+    assert dam_inside
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import blast_optimizer as bo
+from compute_modules_1_2_3 import Tsafe, norm_stats, prepare_inputs
+
+LAW = (1140.0, 1.6)
+
+
+@pytest.fixture
+def stats(blast_log):
+    return norm_stats(prepare_inputs(blast_log.copy()))
+
+
+def test_bisection_matches_brute_force(stats):
+    dist = np.array([15.0, 60.0, 150.0, 400.0, 900.0, 1800.0])
+    sdi0 = Tsafe - 0.4
+    w = bo.max_safe_charge(dist, stats, sdi0, law=LAW, respect_m4=False)
+
+    grid = np.arange(bo.W_MIN_KG, bo.W_MAX_KG + 0.01, 0.01)
+    ok = bo.sdi_after(grid[None, :], dist[:, None], stats, sdi0, law=LAW) < Tsafe
+    brute = np.where(ok.any(axis=1), np.where(ok, grid, 0.0).max(axis=1), 0.0)
+    # Covers all three outcomes: nothing allowed, an interior limit, the search bound
+    assert w[0] == 0.0 and 0.0 < w[2] < bo.W_MAX_KG and w[-1] == bo.W_MAX_KG
+    np.testing.assert_allclose(w, brute, atol=bo.TOL_KG + 0.01)
+
+    codes = bo.binding_codes(dist, w, respect_m4=False)
+    assert set(bo.BINDING_LABELS[codes]) <= {"Tsafe", "W_MAX_KG"}
+
+
+def test_degenerate_state_names_binding_constraint(stats):
+    with pytest.raises(ValueError, match="Tsafe"):
+        bo.check_state(258.8, 0, respect_m4=False)
+    with pytest.raises(ValueError, match="M4_persistence"):
+        bo.check_state(1.0, bo.FAILURE_PERSISTENCE - 1)
+    bo.check_state(1.0, 0, respect_m4=False)
+
+    w = bo.max_safe_charge(np.array([500.0, np.nan]), stats, 258.8, law=LAW, respect_m4=False)
+    assert w[0] == 0.0 and np.isnan(w[1])
+    assert list(bo.binding_codes(np.array([500.0, np.nan]), w, respect_m4=False)) == [2, 0]
+
+
+def test_design_table_rounds_down_to_whole_holes(stats):
+    dist = np.array([150.0, 400.0, 500.0])
+    w = np.array([23.7, 4.9, np.nan])
+    table = bo.design_table(dist, w, stats, 0.0, law=LAW)
+    assert list(table["Max_Holes"].iloc[:2]) == [4.0, 0.0]
+    assert list(table["Max_Charge_kg"].iloc[:2]) == [4 * bo.CHARGE_PER_HOLE_KG, 0.0]
+    assert np.isnan(table["Max_Charge_kg"].iloc[2])
+
+    # PPV and SDI describe the rounded blast, with the same law as sdi_after
+    ppv = bo.ppv_from_distance(dist[:1], W=np.array([20.0]), K=LAW[0], alpha=LAW[1])
+    assert table["PPV_at_Max_mm_per_s"].iloc[0] == pytest.approx(ppv[0])
+    assert table["SDI_at_Max"].iloc[0] == pytest.approx(bo.sdi_after(20.0, 150.0, stats, 0.0, law=LAW))
+    assert np.isnan(table["PPV_at_Max_mm_per_s"].iloc[1])
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import coords
+from terrain_engine import DAM_LAT, DAM_LON, dam_point_in_dem
+
+
+def test_round_trip():
+    lons = np.array([77.05, 77.11, 77.16])
+    lats = np.array([11.44, 11.47, 11.51])
+    xs, ys = coords.to_utm(lons, lats)
+    back_lon, back_lat = coords.to_lonlat(xs, ys)
+    np.testing.assert_allclose(back_lon, lons, atol=1e-9)
+    np.testing.assert_allclose(back_lat, lats, atol=1e-9)
+    assert coords.get_transformer(coords.WGS84, coords.DEFAULT_UTM) is coords.get_transformer(
+        coords.WGS84, coords.DEFAULT_UTM)
+
+
+def test_utm_zone_selection():
+    assert coords.utm_epsg(77.11, 11.47) == "EPSG:32643"
+    assert coords.utm_epsg(-70.6, -33.4) == "EPSG:32719"
+    assert coords.utm_epsg(180.0, 10.0) == "EPSG:32601"
+    assert coords.utm_epsg_for([77.0, 77.1, np.nan], [11.4, 11.5, 11.6]) == "EPSG:32643"
+    assert coords.utm_epsg_for([np.nan], [np.nan]) is None
+
+
+def test_fill_partial_columns_with_duplicate_index():
+    xs, ys = coords.to_utm([77.10, 77.12], [11.46, 11.48])
+    df = pd.DataFrame({
+        "Blast_Lon": [77.10, "", np.nan, 77.13],
+        "Blast_Lat": [11.46, "", np.nan, 11.49],
+        "Blast_Easting": [np.nan, xs[1], np.nan, 730000.0],
+        "Blast_Northing": ["", ys[1], np.nan, 1270000.0],
+    }, index=[0, 0, 1, 1])
+    df, crs, filled = coords.fill_coordinates(df)
+
+    assert crs == "EPSG:32643" and filled == 2
+    assert list(df.index) == [0, 0, 1, 1]
+    np.testing.assert_allclose(df["Blast_Easting"].iloc[0], xs[0])
+    np.testing.assert_allclose(df["Blast_Northing"].iloc[0], ys[0])
+    np.testing.assert_allclose(df["Blast_Lon"].iloc[1], 77.12, atol=1e-9)
+    np.testing.assert_allclose(df["Blast_Lat"].iloc[1], 11.48, atol=1e-9)
+    assert df.iloc[2].isna().all()                         # nothing to convert from
+    assert df["Blast_Easting"].iloc[3] == 730000.0         # both styles given: left alone
+
+
+def test_dam_point_uses_dem_crs():
+    from pyproj import CRS
+
+    x, y = coords.to_utm([DAM_LON], [DAM_LAT])
+    gt = (float(x[0]) - 500.0, 10.0, 0.0, float(y[0]) + 500.0, 0.0, -10.0)
+    wkt = CRS.from_user_input(coords.DEFAULT_UTM).to_wkt()
+    px, py, inside = dam_point_in_dem(gt, (100, 100), wkt)
+    assert inside and px == pytest.approx(x[0]) and py == pytest.approx(y[0])
+
+    far = (gt[0] + 1e5,) + gt[1:]
+    px, py, inside = dam_point_in_dem(far, (100, 100), wkt)
+    assert not inside and (px, py) == (far[0] + 500.0, gt[3] - 500.0)
+    with pytest.raises(ValueError, match="projection"):
+        dam_point_in_dem(gt, (100, 100), "")
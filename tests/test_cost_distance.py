@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+import cost_distance as cd  # noqa: E402
+
+GT = (1000.0, 10.0, 0.0, 5000.0, 0.0, -10.0)
+
+
+def reference_dijkstra(cost, gt, source):
+    import heapq
+    ny, nx = cost.shape
+    dist = np.full(cost.shape, np.inf)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, (r, c) = heapq.heappop(heap)
+        if d > dist[r, c]:
+            continue
+        for dr, dc in cd.NEIGHBOURS:
+            rr, cc = r + dr, c + dc
+            if 0 <= rr < ny and 0 <= cc < nx and np.isfinite(cost[rr, cc]):
+                step = np.hypot(dr * abs(gt[5]), dc * abs(gt[1]))
+                nd = d + step * 0.5 * (cost[r, c] + cost[rr, cc])
+                if nd < dist[rr, cc]:
+                    dist[rr, cc] = nd
+                    heapq.heappush(heap, (nd, (rr, cc)))
+    return np.where(np.isfinite(dist), dist, np.nan)
+
+
+def test_uniform_cost_is_octile_distance():
+    ny, nx = 15, 20
+    d = cd.cost_distance(np.ones((ny, nx)), GT, [(7, 9)], radius=None)
+    dr, dc = np.abs(np.mgrid[:ny, :nx] - np.array([7, 9])[:, None, None])
+    octile = 10.0 * (np.maximum(dr, dc) - np.minimum(dr, dc)) + 10.0 * np.sqrt(2) * np.minimum(dr, dc)
+    np.testing.assert_allclose(d, octile, rtol=1e-12)
+
+
+def test_cost_distance_matches_reference():
+    rng = np.random.default_rng(0)
+    cost = rng.uniform(1.0, 3.0, (30, 25))
+    cost[rng.random(cost.shape) < 0.1] = np.nan
+    cost[12, 10] = 1.0
+    d = cd.cost_distance(cost, GT, [(12, 10)], radius=None)
+    np.testing.assert_allclose(d, reference_dijkstra(cost, GT, (12, 10)), rtol=1e-12)
+
+
+def test_zero_cost_cells_stay_connected():
+    cost = np.ones((5, 9))
+    cost[:, 4:6] = 0.0          # every edge between the two columns weighs 0
+    d = cd.cost_distance(cost, GT, [(2, 0)], radius=None)
+    assert np.isfinite(d).all()
+    assert d[2, 8] == pytest.approx(reference_dijkstra(cost, GT, (2, 0))[2, 8], abs=1e-6)
+
+
+def test_negative_rock_factor_is_rejected():
+    slope = np.zeros((3, 4))
+    rock = np.ones((3, 4))
+    rock[1, 2] = -0.5
+    with pytest.raises(ValueError, match="(?i)rock"):
+        cd.cost_surface(slope, rock)
+    with pytest.raises(ValueError, match="(?i)cost"):
+        cd.cost_distance(-np.ones((3, 4)), GT, [(0, 0)], radius=None)
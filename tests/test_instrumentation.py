@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+import instrumentation as inst
+
+
+def test_records_are_bounded():
+    assert inst.RECORDS.maxlen == inst.MAX_RECORDS
+    for _ in range(inst.MAX_RECORDS + 5):
+        with inst.stage("noop", items=1):
+            pass
+    assert len(inst.RECORDS) == inst.MAX_RECORDS
+    assert inst.RECORDS[-1]["stage"] == "noop"
+
+
+def test_repeated_stage_keeps_every_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(inst, "PROFILE_MODE", "cprofile")
+    monkeypatch.setattr(inst, "PROFILE_DIR", str(tmp_path))
+    for _ in range(3):
+        with inst.stage("write"):
+            sum(range(1000))
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 3 and all(f.startswith("write-") and f.endswith(".prof") for f in files)
+
+
+def test_stage_records_its_own_rss_change():
+    with inst.stage("test.alloc"):
+        block = bytearray(64 * 1024 ** 2)
+        block[::4096] = b"\x01" * len(block[::4096])
+    rec = inst.RECORDS[-1]
+    if rec["rss_mb"] is None:
+        pytest.skip("RSS is not available on this platform")
+    assert rec["rss_delta_mb"] > 32
+
+    del block
+    with inst.stage("test.noop"):
+        pass
+    assert abs(inst.RECORDS[-1]["rss_delta_mb"]) < 32
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import TABLES_DIR
+from compute_modules_1_2_3 import compute_modules
+from compute_module4_dam_state import (
+    FAILURE_PERSISTENCE, SDI_SAFE, SDI_WARNING, STATE_LABELS, compute_module4, dam_state_codes,
+)
+
+
+def reference_m4(sdi_values, failure_counter=0):
+    """The original Module 4 loop."""
+    states = []
+    for sdi in sdi_values:
+        if sdi < SDI_SAFE:
+            state, failure_counter = "Intact", 0
+        elif sdi < SDI_WARNING:
+            state, failure_counter = "Damaged", 0
+        else:
+            failure_counter += 1
+            state = "Failed" if failure_counter >= FAILURE_PERSISTENCE else "Damaged"
+        states.append(state)
+    return states, failure_counter
+
+
+def test_modules_match_shipped_outputs(blast_log):
+    df = compute_modules(blast_log)
+    ref = pd.read_csv(os.path.join(TABLES_DIR, "modules_1_2_3_outputs.csv"))
+    for col in ("BVII", "SDI", "RDI"):
+        np.testing.assert_allclose(df[col].to_numpy(), ref[col].to_numpy(), rtol=1e-12)
+    assert (df["Dam_State"].to_numpy() == ref["Dam_State"].to_numpy()).all()
+
+
+def test_module4_matches_shipped_outputs(blast_log):
+    df, counter = compute_module4(compute_modules(blast_log))
+    ref = pd.read_csv(os.path.join(TABLES_DIR, "module4_dam_state.csv"))
+    assert (df["Dam_State_M4"].to_numpy() == ref["Dam_State_M4"].to_numpy()).all()
+    assert counter == reference_m4(df["SDI"])[1]
+
+
+@pytest.mark.parametrize("counter0", [0, 1, 2, 5])
+def test_dam_state_codes_match_loop(counter0):
+    rng = np.random.default_rng(0)
+    sdi = rng.choice([0.1, 0.4, 0.7, np.nan], size=2000, p=[0.3, 0.2, 0.45, 0.05])
+    codes, counter = dam_state_codes(sdi, counter0)
+    states, ref_counter = reference_m4(sdi, counter0)
+    assert list(STATE_LABELS[codes]) == states
+    assert counter == ref_counter
+
+
+def test_dam_state_codes_per_channel():
+    rng = np.random.default_rng(1)
+    sdi = rng.uniform(0.0, 1.0, size=(300, 4))
+    counters = np.array([0, 1, 2, 3])
+    codes, out = dam_state_codes(sdi, counters)
+    for j in range(sdi.shape[1]):
+        states, ref_counter = reference_m4(sdi[:, j], counters[j])
+        assert list(STATE_LABELS[codes[:, j]]) == states
+        assert out[j] == ref_counter
+
+
+def test_dam_state_codes_empty():
+    codes, counter = dam_state_codes(np.array([]), 2)
+    assert codes.shape == (0,) and counter == 2
+
+
+def test_out_of_order_timestamps(blast_log):
+    df = blast_log.iloc[:100].copy()
+    df["Blast_Time"] = np.random.default_rng(3).permutation(100).astype(float) * 2.0
+    shuffled = compute_modules(df.copy())
+    ordered = compute_modules(df.sort_values("Blast_Time").reset_index(drop=True))
+    np.testing.assert_allclose(shuffled["SDI"].to_numpy(), ordered["SDI"].to_numpy())
+    assert (shuffled["Delta_t"].iloc[1:] == 2.0).all()
+
+
+def test_blasts_before_t0_rejected(blast_log):
+    df = blast_log.iloc[:20].copy()
+    df["Blast_Time"] = np.arange(20, dtype=float)
+    with pytest.raises(ValueError, match="predate"):
+        compute_modules(df, sdi0=5.0, t0=10.0)
+    out = compute_modules(df.copy(), sdi0=5.0, t0=0.0)
+    assert out["Delta_t"].iloc[0] == 0.0 and (out["Delta_t"] >= 0).all()
@@ -0,0 +1,71 @@
+import numpy as np
+
+import monte_carlo as mc
+from compute_modules_1_2_3 import W_CHARGE, W_DIST, W_PPV, compute_modules
+
+
+def all_draws(df, n_samples, batch, seed, ppv_n):
+    """Every draw's BVII and SDI, from the same random stream as monte_carlo_table."""
+    rng = np.random.default_rng(seed)
+    ref = compute_modules(df.copy())
+    dist_risk = 1.0 - mc.minmax(df["Distance_from_Dam_m"]).to_numpy()
+    charge_n = mc.minmax(df["Charge_Factor_kg_per_m"]).to_numpy()
+    out = []
+    for b0 in range(0, n_samples, batch):
+        ks, alphas, w = mc.draw_parameters(rng, min(batch, n_samples - b0), (W_PPV, W_DIST, W_CHARGE))
+        out.append(w[:, :1] * ppv_n + w[:, 1:2] * dist_risk + w[:, 2:3] * charge_n)
+    bvii = np.concatenate(out)
+    return bvii, np.cumsum(bvii, axis=1), ref
+
+
+def test_measured_ppv_percentiles(blast_log):
+    df = blast_log.iloc[:200].reset_index(drop=True)
+    out = mc.monte_carlo_table(df, n_samples=600, batch=128, seed=7)
+    ppv_n = mc.minmax(df["PPV_mm_per_s"]).to_numpy()
+    bvii, sdi, ref = all_draws(df, 600, 128, 7, ppv_n)
+
+    # Nominal weights reproduce Module 1-2, and the median draw sits close to it
+    np.testing.assert_allclose(W_PPV * ppv_n + W_DIST * (1 - mc.minmax(df["Distance_from_Dam_m"]))
+                               + W_CHARGE * mc.minmax(df["Charge_Factor_kg_per_m"]), ref["BVII"])
+    lo, hi = sdi.min(axis=0), sdi.max(axis=0)
+    width = (np.cumsum(bvii.max(axis=0)) - np.cumsum(bvii.min(axis=0))) / mc.HIST_BINS
+    for p in mc.PERCENTILES:
+        got = out[f"SDI_P{p}"].to_numpy()
+        assert np.all((got >= lo - 1e-9) & (got <= hi + 1e-9))
+        np.testing.assert_allclose(got, np.percentile(sdi, p, axis=0), atol=2 * width.max() + 1e-9)
+
+
+def test_no_draw_is_clipped(blast_log):
+    df = blast_log.iloc[:50].reset_index(drop=True)
+    df.loc[::2, "PPV_mm_per_s"] = np.nan      # half the blasts predicted from the site law
+    out = mc.monte_carlo_table(df, n_samples=300, batch=50, seed=1)
+    assert out.notna().all().all()
+    assert (out["SDI_P95"] >= out["SDI_P5"]).all()
+
+
+def test_raster_percentiles_near_the_dam():
+    from terrain_engine import (
+        DIST_MAX, DIST_MIN, PPV_MAX, PPV_MIN, SLOPE_MAX, SLOPE_MIN, W_charge_kg, site_law_params, w_dist, w_ppv,
+        w_slope,
+    )
+    dist = np.array([[10.0, 300.0], [1500.0, np.nan]])
+    slope = np.full((2, 2), 12.0)
+    out = mc.monte_carlo_raster(dist, slope, n_samples=400, batch=50, seed=3)
+
+    rng = np.random.default_rng(3)
+    d = dist.ravel()
+    draws = []
+    for _ in range(400 // 50):
+        ks, alphas, w = mc.draw_parameters(rng, 50, (w_ppv, w_dist, w_slope), site_law_params())
+        ppv = mc.predicted_ppv(ks, alphas, d, np.full(4, W_charge_kg))
+        ppv_n = np.clip((ppv - PPV_MIN) / (PPV_MAX - PPV_MIN), 0, 1)
+        draws.append(w[:, :1] * ppv_n + w[:, 1:2] * np.clip(1 - (d - DIST_MIN) / (DIST_MAX - DIST_MIN), 0, 1)
+                     + w[:, 2:3] * (12.0 - SLOPE_MIN) / (SLOPE_MAX - SLOPE_MIN))
+    bvii = np.concatenate(draws)[:, :3]
+
+    width = (w_ppv + w_dist + w_slope) / mc.HIST_BINS
+    for p in mc.PERCENTILES:
+        got = out[f"bvii_p{p}"].ravel()
+        np.testing.assert_allclose(got[:3], np.percentile(bvii, p, axis=0), atol=width)
+        assert np.isnan(got[3])
+    assert out["bvii_p95"][0, 0] <= w_ppv + w_dist + w_slope      # 10 m from the dam stays in range
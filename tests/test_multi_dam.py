@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+import multi_dam as md
+
+
+def test_structures_share_normalization():
+    rng = np.random.default_rng(0)
+    n = 300
+    blasts = pd.DataFrame({
+        md.BX_COL: rng.uniform(0.0, 1000.0, n),
+        md.BY_COL: rng.uniform(0.0, 1000.0, n),
+        md.CHARGE_COL: rng.uniform(20.0, 200.0, n),
+        "PPV_mm_per_s": rng.uniform(1.0, 20.0, n),
+        "Charge_Factor_kg_per_m": rng.uniform(1.0, 8.0, n),
+    })
+    # "near" sits among the blasts, "far" 2 km away; both see every blast
+    registry = pd.DataFrame({md.ID_COL: ["near", "far"], md.SX_COL: [500.0, 3000.0],
+                             md.SY_COL: [500.0, 500.0]})
+    out = md.evaluate_structures(blasts, registry, radius=5000.0)
+
+    near, far = out["near"], out["far"]
+    assert len(near) == len(far) == n
+    assert far["SDI"].iloc[-1] < near["SDI"].iloc[-1]
+    # Same blast, same ranges: closer structure → higher BVII for every blast
+    a = near.set_index("Blast_Index").sort_index()
+    b = far.set_index("Blast_Index").sort_index()
+    assert (a["BVII"] > b["BVII"]).all()
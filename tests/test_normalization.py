@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import normalization as nz
+from conftest import DATA_CSV
+from compute_modules_1_2_3 import compute_modules
+
+
+def test_fixed_stream_matches_one_pass(tmp_path, blast_log):
+    out_csv = str(tmp_path / "streamed.csv")
+    rows, sdi = nz.stream_modules(DATA_CSV, out_csv, nz.make_normalizers("fixed"), chunksize=97)
+    ref = compute_modules(blast_log, stats=dict(nz.FIXED_RANGES))
+    out = pd.read_csv(out_csv)
+    assert rows == len(ref)
+    np.testing.assert_allclose(out["SDI"], ref["SDI"], rtol=1e-12)
+    np.testing.assert_allclose(out["RDI"], ref["RDI"], rtol=1e-12)
+    assert sdi == pytest.approx(ref["SDI"].iloc[-1], rel=1e-12)
+
+
+def test_fixed_stream_with_times_matches_one_pass(tmp_path, blast_log):
+    csv = str(tmp_path / "timed.csv")
+    blast_log["Blast_Time"] = 3.0 * np.arange(len(blast_log))
+    blast_log.to_csv(csv, index=False)
+    out_csv = str(tmp_path / "streamed.csv")
+    rows, sdi = nz.stream_modules(csv, out_csv, nz.make_normalizers("fixed"), chunksize=97)
+    ref = compute_modules(blast_log.copy(), stats=dict(nz.FIXED_RANGES))
+    out = pd.read_csv(out_csv)
+    np.testing.assert_allclose(out["Delta_t"], ref["Delta_t"], rtol=1e-12)
+    np.testing.assert_allclose(out["SDI"], ref["SDI"], rtol=1e-12)
+    assert sdi == pytest.approx(ref["SDI"].iloc[-1], rel=1e-12)
+
+    # A later chunk starting before the previous one ended is rejected
+    blast_log.loc[150, "Blast_Time"] = 1.0
+    blast_log.to_csv(csv, index=False)
+    with pytest.raises(ValueError, match="Blast_Time"):
+        nz.stream_modules(csv, out_csv, nz.make_normalizers("fixed"), chunksize=97)
+
+
+def test_running_minmax():
+    norm = nz.RunningMinMax()
+    norm.update([3.0, np.nan, 1.0])
+    norm.update([2.0, 5.0])
+    assert norm.bounds() == (1.0, 5.0)
+
+
+def test_quantile_sketch_accuracy_and_roundtrip():
+    rng = np.random.default_rng(0)
+    v = rng.lognormal(2.0, 1.0, 100_000)
+    sk = nz.QuantileSketch()
+    for part in np.array_split(v, 7):
+        sk.update(part)
+    for q in (0.01, 0.5, 0.99):
+        assert sk.quantile(q) == pytest.approx(np.quantile(v, q), rel=2 * nz.SKETCH_REL_ACC)
+
+    back = nz.QuantileSketch.from_dict(sk.to_dict())
+    assert back.quantile(0.99) == sk.quantile(0.99)
+
+
+def test_normalizer_dict_roundtrip_freezes():
+    q = nz.QuantileRange()
+    q.update(np.arange(100.0))
+    frozen = nz.normalizer_from_dict(q.to_dict())
+    frozen.update(np.full(10, 1e6))
+    assert frozen.bounds() == q.bounds()
+
+
+def test_quantile_two_pass_is_chunk_invariant(tmp_path):
+    outs = []
+    for chunksize in (53, 500):
+        norms = nz.fit_normalizers(DATA_CSV, {c: nz.QuantileRange() for c in nz.NORM_COLUMNS}, chunksize)
+        out_csv = str(tmp_path / f"q{chunksize}.csv")
+        nz.stream_modules(DATA_CSV, out_csv, norms, chunksize=chunksize)
+        outs.append(pd.read_csv(out_csv))
+    np.testing.assert_allclose(outs[0]["SDI"], outs[1]["SDI"], rtol=1e-12)
+
+
+def test_all_nan_bounds():
+    norms = {c: nz.RunningMinMax() for c in nz.NORM_COLUMNS}
+    df = pd.DataFrame({"PPV_mm_per_s": [1.0, 2.0], "Distance_from_Dam_m": [10.0, 20.0],
+                       "Charge_Factor_kg_per_m": [np.nan, np.nan], "Slope_deg": [5.0, 6.0]})
+    stats = nz.table_bounds(df, norms)
+    assert "Charge_Factor_kg_per_m" not in stats
+    df["PPV_mm_per_s"] = np.nan
+    with pytest.raises(ValueError, match="PPV_mm_per_s"):
+        nz.table_bounds(df, {c: nz.RunningMinMax() for c in nz.NORM_COLUMNS})
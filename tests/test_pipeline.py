@@ -0,0 +1,52 @@
+import os
+
+import pipeline
+
+
+def test_stage_files_cover_helper_modules():
+    files = {s.name: {os.path.basename(f) for f in s.files} for s in pipeline.stages()}
+    assert {"compute_modules_1_2_3.py", "sdi_timeline.py", "table_io.py"} <= files["modules_1_2_3"]
+    assert {"normalization.py", "raster_sampling.py"} <= files["rdi_terrain"]
+    assert "raster_output.py" in files["terrain"]
+
+
+def test_stage_key_changes_with_helper(tmp_path, monkeypatch):
+    (tmp_path / "a.py").write_text("import b\n")
+    (tmp_path / "b.py").write_text("X = 1\n")
+    monkeypatch.setattr(pipeline, "SCRIPT_DIR", str(tmp_path))
+    st = pipeline.Stage("a", None, None, files=pipeline.module_files("a"))
+    key = pipeline.stage_key(st, {})
+    (tmp_path / "b.py").write_text("X = 22\n")
+    assert pipeline.stage_key(st, {}) != key
+
+
+def test_terrain_key_follows_calibrated_law(tmp_path, monkeypatch):
+    import pytest
+    import site_law as sl
+    import terrain_engine as te
+    from test_site_law import synthetic_log
+
+    path = str(tmp_path / "site_law.json")
+    monkeypatch.setattr(te, "SITE_LAW_JSON", path)
+    monkeypatch.setattr(pipeline, "SITE_LAW_JSON", path)
+    monkeypatch.setattr(pipeline, "TERRAIN_ENGINE", "numpy")
+    terrain = next(s for s in pipeline.stages() if s.name == "terrain")
+    assert "site_law" not in terrain.deps and "site_law" in terrain.after
+
+    placeholder = pipeline.stage_key(terrain, {})
+    assert te.site_law_params() == (te.K_DEFAULT, te.ALPHA_DEFAULT)
+
+    _, state = sl.calibrate(synthetic_log())
+    sl.save_state(state, path)
+    k, a = te.site_law_params()          # picked up without re-importing
+    assert k == pytest.approx(800.0, rel=0.2) and a == pytest.approx(1.4, rel=0.1)
+    calibrated = pipeline.stage_key(terrain, {})
+    assert calibrated != placeholder
+
+    # A refit with the same law keeps the key
+    sl.save_state(state, path)
+    assert pipeline.stage_key(terrain, {}) == calibrated
+
+    # The QGIS engine's key is computed without importing QGIS
+    monkeypatch.setattr(pipeline, "TERRAIN_ENGINE", "qgis")
+    assert pipeline.terrain_params() == {"engine": "qgis", "K": k, "alpha": a}
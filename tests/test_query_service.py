@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import query_service as qs
+from compute_modules_1_2_3 import SDI_GAIN, compute_modules, norm_stats, prepare_inputs
+from sdi_timeline import TIME_COL
+
+
+@pytest.fixture
+def model(blast_log):
+    stats = norm_stats(prepare_inputs(blast_log.copy()))
+    return qs.BlastModel(qs.ModelState(stats, sdi0=10.0, t0=None, failure_counter=0, law=(1140.0, 1.6)))
+
+
+def _blasts(n, dist=300.0):
+    return [{"easting": 0.0, "northing": 0.0, "charge_kg": 50.0 + i, "distance_m": dist + 10 * i} for i in range(n)]
+
+
+def test_bad_request_fails_alone(model):
+    async def go():
+        batcher = qs.MicroBatcher(model, window_ms=50)
+        worker = asyncio.create_task(batcher.run())
+        try:
+            good = asyncio.create_task(batcher.submit(_blasts(3)))
+            bad = asyncio.create_task(batcher.submit([{"easting": 0.0, "northing": 0.0, "charge_kg": "x"}]))
+            return await asyncio.gather(good, bad, return_exceptions=True)
+        finally:
+            worker.cancel()
+
+    good, bad = asyncio.run(go())
+    assert isinstance(bad, ValueError)
+    assert len(good) == 3
+    inc = np.array([r["sdi_increment"] for r in good])
+    np.testing.assert_allclose(inc, SDI_GAIN * np.array([r["bvii"] for r in good]))
+    np.testing.assert_allclose([r["sdi"] for r in good], 10.0 + np.cumsum(inc))
+
+
+def test_requests_accumulate_separately(model):
+    a, b = model.evaluate([_blasts(2), _blasts(3, dist=500.0)])
+    assert a[0]["sdi"] == pytest.approx(10.0 + a[0]["sdi_increment"])
+    assert b[0]["sdi"] == pytest.approx(10.0 + b[0]["sdi_increment"])
+
+
+def test_timed_requests_decay_like_compute_modules(model, monkeypatch):
+    monkeypatch.setattr(qs, "DECAY", 0.1)
+    model.state.t0 = 100.0
+    blasts = _blasts(3)
+    for blast, t in zip(blasts, (101.0, 103.5, 102.0)):
+        blast["time"] = t
+    (res,) = model.evaluate([blasts])
+
+    df = model.inputs(blasts, model.state)
+    df[TIME_COL] = [b["time"] for b in blasts]
+    ref = compute_modules(df, stats=model.state.stats, sdi0=10.0, t0=100.0, decay=0.1)
+    by_time = dict(zip(ref[TIME_COL], ref["SDI"]))
+    np.testing.assert_allclose([r["sdi"] for r in res], [by_time[b["time"]] for b in blasts], rtol=1e-12)
+    assert res[0]["sdi"] < 10.0 + res[0]["sdi_increment"]       # the checkpoint SDI recovered
+
+    with pytest.raises(ValueError, match="before the last applied blast"):
+        model.validate([dict(blasts[0], time=99.0)])
+    with pytest.raises(ValueError, match="every blast"):
+        model.validate([blasts[0], _blasts(1)[0]])
+
+
+def test_reload_swaps_the_whole_state(model, monkeypatch):
+    old = model.state
+    new = qs.ModelState(old.stats, sdi0=50.0, t0=None, failure_counter=1, law=old.law)
+    monkeypatch.setattr(qs, "load_model_state", lambda: new)
+    model.load()
+    assert model.state is new and old.sdi0 == 10.0
@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+
+from raster_cache import RasterCache, stage_key
+
+
+def test_hit_returns_what_miss_stored(tmp_path):
+    cache = RasterCache(str(tmp_path))
+    arr = np.random.default_rng(0).uniform(0.0, 45.0, (30, 40))
+    arr[3, 4] = np.nan
+    arr[5, 6] = 0.0
+    key = stage_key("slope", dem="abc", z_factor=1.0)
+    assert cache.get(key) is None
+    cache.put(key, arr)
+    back = cache.get(key)
+    assert back.dtype == arr.dtype
+    np.testing.assert_array_equal(back, arr)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    arr = np.zeros((64, 64))
+    cache = RasterCache(str(tmp_path), max_bytes=2.5 * arr.nbytes)
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, arr)
+        os.utime(cache.path(key), (i, i))
+    assert not os.path.exists(cache.path("a"))
+    assert os.path.exists(cache.path("b")) and os.path.exists(cache.path("c"))
@@ -0,0 +1,60 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+import raster_mmap
+
+
+class _Band:
+    def __init__(self, arr):
+        self.arr = arr
+
+    def GetNoDataValue(self):
+        return -9999.0
+
+    def GetScale(self):
+        return None
+
+    def GetOffset(self):
+        return None
+
+    def ReadAsArray(self, x0, y0, w, h):
+        return self.arr[y0:y0 + h, x0:x0 + w]
+
+
+class _Dataset:
+    def __init__(self, arr):
+        self.band = _Band(arr)
+        self.RasterYSize, self.RasterXSize = arr.shape
+
+    def GetRasterBand(self, i):
+        return self.band
+
+    def GetGeoTransform(self):
+        return (0.0, 1.0, 0.0, 10.0, 0.0, -1.0)
+
+    def GetProjection(self):
+        return ""
+
+
+def test_rematerialize_keeps_open_map(tmp_path, monkeypatch):
+    tif = tmp_path / "sdi.tif"
+    tif.write_bytes(b"v1")
+    arr = np.full((4, 5), 1.0)
+    monkeypatch.setattr(raster_mmap, "load_gdal", lambda: SimpleNamespace(Open=lambda path: _Dataset(arr)))
+    mmap_dir = str(tmp_path / "mmap")
+
+    old = raster_mmap.open_raster(str(tif), mmap_dir)
+    assert float(old.array[0, 0]) == 1.0
+
+    arr = np.full((4, 5), 2.0)
+    arr[0, 0] = -9999.0
+    tif.write_bytes(b"version 2")
+    new = raster_mmap.open_raster(str(tif), mmap_dir)
+
+    assert new.path != old.path
+    assert np.isnan(new.array[0, 0]) and float(new.array[1, 1]) == 2.0
+    assert float(old.array[1, 1]) == 1.0            # old map still readable
+    assert raster_mmap.open_mapped("sdi", mmap_dir) is new
+    assert len([f for f in os.listdir(mmap_dir) if f.endswith(".npy")]) <= 2
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import raster_output as ro
+
+
+def test_int16_scale_fits_data():
+    arr = np.array([[0.5, -7.5], [np.nan, 2.0]])
+    scale = ro.int16_scale(arr)
+    assert scale == pytest.approx(7.5 / ro.INT16_MAX)
+    q = ro.encode(arr, "int16", -9999.0, ro.INT16_NODATA, scale)
+    assert q[1, 0] == ro.INT16_NODATA
+    np.testing.assert_allclose(q[~np.isnan(arr)] * scale, arr[~np.isnan(arr)], atol=scale)
+    assert ro.int16_scale(np.array([0.1, 0.2])) == ro.INT16_SCALE
+
+
+def test_int16_clip_warns(capsys):
+    q = ro.encode(np.array([1.0, 5.0, -9999.0]), "int16", -9999.0, ro.INT16_NODATA)
+    assert list(q) == [10000, ro.INT16_MAX, ro.INT16_NODATA]
+    assert "1 cell(s)" in capsys.readouterr().out
+
+
+def test_staged_int16_scale_fits_whole_raster(tmp_path, monkeypatch, capsys):
+    pytest.importorskip("osgeo")
+    monkeypatch.setattr(ro, "BLOCK_SIZE", 16)
+    path = str(tmp_path / "sdi.tif")
+    arr = np.linspace(0.0, 7.5, 32 * 32).reshape(32, 32)
+    arr[0, 0] = np.nan
+
+    staging = ro.create_staging(path, 32, 32, (0.0, 1.0, 0.0, 32.0, 0.0, -1.0), "", -9999.0, "int16")
+    for y0 in (0, 16):
+        for x0 in (0, 16):
+            ro.write_block(staging, arr[y0:y0 + 16, x0:x0 + 16], x0, y0)
+    ro.finish_staging(staging)
+    assert "clipped" not in capsys.readouterr().out
+
+    ds = ro.load_gdal().Open(path)
+    band = ds.GetRasterBand(1)
+    scale = band.GetScale()
+    assert scale == pytest.approx(7.5 / ro.INT16_MAX)
+    q = band.ReadAsArray()
+    assert q[0, 0] == band.GetNoDataValue() == ro.INT16_NODATA
+    np.testing.assert_allclose((q * scale)[1:], arr[1:], atol=scale)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["sdi.tif"]
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sdi_accumulator as acc
+
+GT = (1000.0, 10.0, 0.0, 2000.0, 0.0, -10.0)
+
+
+def blasts():
+    return pd.DataFrame({
+        acc.X_COL: [1205.0, 1400.0, 1333.0],
+        acc.Y_COL: [1795.0, 1600.0, 1717.0],
+        acc.CHARGE_COL: [50.0, 120.0, 80.0],
+    })
+
+
+def test_south_up_grid_matches_north_up():
+    rng = np.random.default_rng(0)
+    slope = rng.uniform(0.0, 30.0, (100, 80))
+    north, n1 = acc.accumulate_sdi(slope, GT, blasts(), radius=300.0)
+
+    flipped_gt = (GT[0], GT[1], 0.0, GT[3] + GT[5] * slope.shape[0], 0.0, -GT[5])
+    south, n2 = acc.accumulate_sdi(slope[::-1], flipped_gt, blasts(), radius=300.0)
+    assert n1 == n2 == 3
+    np.testing.assert_allclose(south[::-1], north)
+
+
+def test_blast_cell_is_finite_and_capped():
+    slope = np.zeros((40, 40))
+    # Blast exactly on a cell centre (distance 0)
+    one = blasts().iloc[:1]
+    sdi, _ = acc.accumulate_sdi(slope, GT, one, radius=200.0)
+    assert np.isfinite(sdi).all()
+    assert sdi.max() <= acc.bvii_from_layers(np.array(acc.PPV_MAX), np.array(0.0), np.array(0.0)) + 1e-12
+
+
+def test_rotated_grid_rejected():
+    with pytest.raises(ValueError):
+        acc.blast_window((0.0, 10.0, 1.0, 0.0, 1.0, -10.0), (10, 10), 5.0, -5.0, 20.0)
+
+
+def test_blasts_weighted_by_real_delta_t():
+    rng = np.random.default_rng(1)
+    slope = rng.uniform(0.0, 30.0, (100, 80))
+    timed = blasts()
+    timed[acc.TIME_COL] = ["2024-01-03", "2024-01-01", "2024-01-06"]
+    sdi, n = acc.accumulate_sdi(slope, GT, timed, radius=300.0)
+    assert n == 3
+
+    # Sorted by time: rows 1, 0, 2 with Delta_t = default, 2 days, 3 days
+    single = [acc.accumulate_sdi(slope, GT, blasts().iloc[[i]], radius=300.0)[0] for i in range(3)]
+    expected = acc.DEFAULT_DT * single[1] + 2.0 * single[0] + 3.0 * single[2]
+    np.testing.assert_allclose(sdi, expected)
+
+    until = acc.time_values(pd.Series(["2024-01-04"]))[0]
+    early, n = acc.accumulate_sdi(slope, GT, timed, radius=300.0, until=until)
+    assert n == 2
+    np.testing.assert_allclose(early, acc.DEFAULT_DT * single[1] + 2.0 * single[0])
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sdi_state
+from compute_modules_1_2_3 import compute_modules, norm_stats
+from compute_module4_dam_state import compute_module4
+
+
+def test_append_continues_full_run(blast_log):
+    full = compute_modules(blast_log.copy())
+    stats = norm_stats(full)
+    full, counter = compute_module4(full)
+
+    head, tail = blast_log.iloc[:350].copy(), blast_log.iloc[350:].reset_index(drop=True)
+    first, c0 = compute_module4(compute_modules(head, stats=stats))
+    state = sdi_state.state_from_outputs(first, stats, c0)
+    out, state = sdi_state.apply_new_blasts(tail, state)
+
+    both = pd.concat([first, out], ignore_index=True)
+    np.testing.assert_allclose(both["SDI"], full["SDI"], rtol=1e-12)
+    assert (both["Dam_State_M4"].to_numpy() == full["Dam_State_M4"].to_numpy()).all()
+    assert state["rows"] == len(full)
+    assert state["failure_counter"] == counter
+    assert state["last_sdi"] == pytest.approx(full["SDI"].iloc[-1], rel=1e-12)
+
+
+def test_state_roundtrip(tmp_path, blast_log):
+    df = compute_modules(blast_log)
+    state = sdi_state.state_from_outputs(df, norm_stats(df), 2)
+    path = str(tmp_path / "state.json")
+    sdi_state.save_state(state, path)
+    loaded = sdi_state.load_state(path)
+    assert loaded["failure_counter"] == 2
+    assert loaded["norm_stats"]["PPV_mm_per_s"] == tuple(state["norm_stats"]["PPV_mm_per_s"])
+
+
+def test_append_rejects_blasts_older_than_checkpoint(blast_log):
+    df = blast_log.copy()
+    df["Blast_Time"] = np.arange(len(df), dtype=float)
+    head, tail = df.iloc[:300].copy(), df.iloc[300:].reset_index(drop=True)
+    first = compute_modules(head)
+    state = sdi_state.state_from_outputs(first, norm_stats(first), 0)
+
+    late = tail.copy()
+    late.loc[5, "Blast_Time"] = 150.0
+    with pytest.raises(ValueError, match="older than the last applied blast"):
+        sdi_state.apply_new_blasts(late, state)
+
+    # Same-time and later blasts are fine
+    out, state = sdi_state.apply_new_blasts(tail, state)
+    assert (out["Delta_t"] >= 0).all()
+    assert state["last_time"] == float(len(df) - 1)
+
+
+def test_append_without_times_keeps_checkpoint_time(blast_log):
+    df = blast_log.copy()
+    df["Blast_Time"] = np.arange(len(df), dtype=float)
+    head, tail = df.iloc[:300].copy(), df.iloc[300:].reset_index(drop=True)
+    first = compute_modules(head)
+    state = sdi_state.state_from_outputs(first, norm_stats(first), 0)
+
+    tail["Blast_Time"] = np.nan
+    _, state = sdi_state.apply_new_blasts(tail, state)
+    assert state["last_time"] == 299.0
+
+
+def test_rebuild_writes_parquet_tables(tmp_path, monkeypatch, blast_log):
+    pytest.importorskip("pyarrow")
+    from table_io import read_table
+
+    csv = tmp_path / "log.csv"
+    blast_log.to_csv(csv, index=False)
+    monkeypatch.setattr(sdi_state, "M123_CSV", str(tmp_path / "m123.parquet"))
+    monkeypatch.setattr(sdi_state, "M4_CSV", str(tmp_path / "m4.parquet"))
+    monkeypatch.setattr(sdi_state, "STATE_PATH", str(tmp_path / "state.json"))
+
+    df, state = sdi_state.rebuild(str(csv))
+    m4 = read_table(sdi_state.M4_CSV)
+    assert len(m4) == state["rows"] == len(blast_log)
+    assert m4["Dam_State_M4"].dtype == "category"
+    np.testing.assert_allclose(m4["SDI"], df["SDI"], rtol=1e-12)
+
+
+def run_rebuild_then_append(tmp_path, monkeypatch, df, ext):
+    head_csv, tail_csv = tmp_path / "log.csv", tmp_path / "new.csv"
+    df.iloc[:300].to_csv(head_csv, index=False)
+    df.iloc[300:].to_csv(tail_csv, index=False)
+    monkeypatch.setattr(sdi_state, "M123_CSV", str(tmp_path / f"m123{ext}"))
+    monkeypatch.setattr(sdi_state, "M4_CSV", str(tmp_path / f"m4{ext}"))
+    monkeypatch.setattr(sdi_state, "STATE_PATH", str(tmp_path / "state.json"))
+    sdi_state.rebuild(str(head_csv))
+    before = {p: p.stat().st_mtime_ns for p in tmp_path.rglob("m4*/**/*.parquet")}
+    sdi_state.append(str(tail_csv))
+    return before
+
+
+def test_parquet_append_only_adds_files(tmp_path, monkeypatch, blast_log):
+    pytest.importorskip("pyarrow")
+    from table_io import read_table
+
+    df = blast_log.copy()
+    df["Blast_Time"] = 19000.0 + 0.25 * np.arange(len(df))
+    (tmp_path / "csv").mkdir()
+    (tmp_path / "pq").mkdir()
+    run_rebuild_then_append(tmp_path / "csv", monkeypatch, df, ".csv")
+    csv = pd.read_csv(sdi_state.M4_CSV)
+    before = run_rebuild_then_append(tmp_path / "pq", monkeypatch, df, ".parquet")
+
+    after = {p: p.stat().st_mtime_ns for p in (tmp_path / "pq").rglob("m4*/**/*.parquet")}
+    assert before and all(after[p] == t for p, t in before.items())
+    assert len(after) > len(before)
+
+    pq = read_table(sdi_state.M4_CSV).sort_values("Blast_Time", kind="stable")
+    assert pq["Blast_Date"].nunique() == int(np.ceil(len(df) / 4))
+    np.testing.assert_allclose(pq["SDI"], csv["SDI"], rtol=1e-12)
+    assert (pq["Dam_State_M4"].astype(str).to_numpy() == csv["Dam_State_M4"].to_numpy()).all()
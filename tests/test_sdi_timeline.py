@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from sdi_timeline import MAX_EXP, SDITimeline, decayed_cumsum, real_delta_t
+
+
+def reference_cumsum(inc, t, decay, s0=0.0, t0=None):
+    out, s, prev = [], s0, (t[0] if t0 is None else t0)
+    for x, ti in zip(inc, t):
+        s = s * np.exp(-decay * (ti - prev)) + x
+        out.append(s)
+        prev = ti
+    return np.array(out)
+
+
+@pytest.mark.parametrize("decay", [0.0, 0.01, 0.5])
+def test_decayed_cumsum_matches_loop(decay):
+    rng = np.random.default_rng(0)
+    t = np.cumsum(rng.exponential(3.0, size=5000))
+    inc = rng.uniform(0.0, 1.0, size=t.size)
+    np.testing.assert_allclose(decayed_cumsum(inc, t, decay), reference_cumsum(inc, t, decay), rtol=1e-9)
+
+
+def test_decayed_cumsum_rebases_long_series():
+    # Spans many MAX_EXP / decay segments; the plain closed form would overflow
+    decay = 1.0
+    t = np.linspace(0.0, 20 * MAX_EXP, 4001)
+    inc = np.ones_like(t)
+    np.testing.assert_allclose(decayed_cumsum(inc, t, decay, s0=2.0, t0=-1.0),
+                               reference_cumsum(inc, t, decay, s0=2.0, t0=-1.0), rtol=1e-9)
+
+
+def test_real_delta_t():
+    t = np.array([5.0, 7.0, np.nan, 12.0])
+    np.testing.assert_array_equal(real_delta_t(t, t0=4.0), [1.0, 2.0, 1.0, 1.0])
+    assert real_delta_t(t)[0] == 1.0
+
+
+def test_timeline_queries():
+    t = np.array([0.0, 1.0, 3.0, 10.0])
+    inc = np.array([1.0, 2.0, 3.0, 4.0])
+    decay = 0.1
+    tl = SDITimeline(t, inc, decay)
+    ref = reference_cumsum(inc, t, decay)
+    np.testing.assert_allclose(tl.sdi_at(t), ref)
+    # Between blasts the SDI only decays
+    assert tl.sdi_at(5.0) == pytest.approx(ref[2] * np.exp(-decay * 2.0))
+    # Half-open window (T - length, T]
+    assert tl.count(10.0, 7.0) == 1
+    assert tl.count(10.0, 7.5) == 2
+    assert tl.window(10.0, 7.5) == pytest.approx(ref[3] - ref[1] * np.exp(-decay * 9.0))
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sensitivity as sens
+from compute_modules_1_2_3 import compute_modules
+from compute_module4_dam_state import compute_module4
+
+
+@pytest.mark.parametrize("with_time", [False, True])
+def test_nominal_config_matches_modules(blast_log, with_time):
+    df = blast_log.iloc[:300].copy()
+    if with_time:
+        rng = np.random.default_rng(5)
+        df["Blast_Time"] = rng.permutation(300) * rng.uniform(0.5, 3.0)
+    ref, _ = compute_module4(compute_modules(df.copy()))
+
+    grid = {"W_PPV": [0.5, 0.65]}
+    out = sens.sweep(df, sens.config_grid(grid))
+    nominal = out.iloc[0]
+    assert nominal["Final_SDI"] == pytest.approx(ref["SDI"].iloc[-1], rel=1e-9)
+    for name in ("Intact", "Damaged", "Failed"):
+        assert nominal[f"P_M4_{name}"] == pytest.approx((ref["Dam_State_M4"] == name).mean())
+    for name in sens.DAM_STATES:
+        assert nominal[f"P_{name}"] == pytest.approx((ref["Dam_State"] == name).mean())
+    assert isinstance(out, pd.DataFrame) and len(out) == 3
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import site_law as sl
+
+
+def synthetic_log(n=400, K=800.0, alpha=1.4, noise=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    d = rng.uniform(50.0, 1500.0, n)
+    w = rng.uniform(20.0, 400.0, n)
+    ppv = K * (d / np.sqrt(w)) ** -alpha * 10 ** rng.normal(0.0, noise, n)
+    return pd.DataFrame({sl.DIST_COL: d, sl.CHARGE_COL: w, sl.PPV_COL: ppv})
+
+
+def test_fit_from_sums_matches_polyfit():
+    df = synthetic_log()
+    x, y, ok = sl.log_terms(df)
+    s = sl.group_sums(x[ok], y[ok], np.zeros(ok.sum(), dtype=np.int64), 1)[0]
+    fit = sl.fit_from_sums(s)
+    slope, intercept = np.polyfit(x, y, 1)
+    assert fit["alpha"] == pytest.approx(-slope, rel=1e-10)
+    assert fit["K"] == pytest.approx(10 ** intercept, rel=1e-10)
+    assert fit["r2"] == pytest.approx(np.corrcoef(x, y)[0, 1] ** 2, rel=1e-10)
+
+
+def test_fit_from_sums_too_few_blasts():
+    df = synthetic_log(n=sl.MIN_BLASTS - 1)
+    x, y, _ = sl.log_terms(df)
+    fit = sl.fit_from_sums(sl.group_sums(x, y, np.zeros(len(x), dtype=np.int64), 1)[0])
+    assert np.isnan(fit["K"]) and np.isnan(fit["alpha"])
+
+
+def test_appended_sums_equal_full_fit():
+    df = synthetic_log()
+    full = sl.new_state()
+    sl.merge_sums(full, *sl.table_sums(df))
+
+    inc = sl.new_state()
+    sl.merge_sums(inc, *sl.table_sums(df.iloc[:150]))
+    sl.merge_sums(inc, *sl.table_sums(df.iloc[150:], row0=150))
+
+    a, b = sl.fit_table(full), sl.fit_table(inc)
+    assert list(a["Window"]) == list(b["Window"])
+    np.testing.assert_allclose(a["K"], b["K"], rtol=1e-9)
+    np.testing.assert_allclose(a["alpha"], b["alpha"], rtol=1e-9)
+
+
+def test_shipped_log_is_not_usable_for_calibration(blast_log):
+    # PPV in the demo log is not driven by scaled distance (alpha ~ -0.04,
+    # R^2 ~ 0.002), so the fit must not replace the placeholder constants
+    x, y, ok = sl.log_terms(blast_log)
+    fit = sl.fit_from_sums(sl.group_sums(x[ok], y[ok], np.zeros(ok.sum(), dtype=np.int64), 1)[0])
+    assert np.isfinite(fit["K"]) and np.isfinite(fit["alpha"])
+    assert fit["r2"] < sl.MIN_R2
+    assert not sl.usable(fit)
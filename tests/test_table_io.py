@@ -0,0 +1,55 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import table_io as tio  # noqa: E402
+from conftest import DATA_CSV  # noqa: E402
+from compute_modules_1_2_3 import compute_modules  # noqa: E402
+from compute_module4_dam_state import compute_module4  # noqa: E402
+
+
+def test_columnar_stages_join_on_key(tmp_path):
+    m123_path = str(tmp_path / "m123.parquet")
+    m4_path = str(tmp_path / "m4.parquet")
+
+    df = tio.stage_inputs(DATA_CSV, "modules_1_2_3", m123_path)
+    assert list(df[tio.KEY_COL]) == list(range(len(df)))
+    tio.write_stage(compute_modules(df), m123_path, "modules_1_2_3")
+
+    m4, _ = compute_module4(tio.stage_inputs(m123_path, "module4", m4_path))
+    tio.write_stage(m4, m4_path, "module4")
+
+    out = tio.read_table(m4_path)
+    assert list(out.columns) == tio.STAGE_OUTPUTS["module4"]
+    full, _ = compute_module4(compute_modules(pd.read_csv(DATA_CSV)))
+    joined = full.reset_index(drop=True).join(out.set_index(tio.KEY_COL), rsuffix="_pq")
+    assert (joined["Dam_State_M4"].astype(str) == joined["Dam_State_M4_pq"].astype(str)).all()
+
+
+def test_csv_stage_reads_whole_table(tmp_path):
+    df = tio.stage_inputs(DATA_CSV, "module4", str(tmp_path / "out.csv"))
+    assert tio.KEY_COL not in df.columns
+    assert len(df.columns) == len(pd.read_csv(DATA_CSV, nrows=0).columns)
+
+
+def test_unknown_category_raises():
+    df = pd.DataFrame({"Dam_State_M4": ["Intact", "Broken", np.nan]})
+    with pytest.raises(ValueError, match="Broken"):
+        tio.apply_schema(df)
+
+
+def test_partitioned_dataset_splits_by_blast_day(tmp_path):
+    root = str(tmp_path / "sdi.parquet")
+    df = pd.DataFrame({"Blast_Time": ["2024-03-01 09:00", "2024-03-01 15:00", None, "2024-03-02 10:00"],
+                       "SDI": [1.0, 2.0, 3.0, 4.0]})
+    tio.write_partitioned(df, root)
+    tio.append_partitioned(df.iloc[[3]], root)
+
+    out = tio.read_table(root)
+    assert sorted(os.listdir(root)) == ["Blast_Date=2024-03-01", "Blast_Date=2024-03-02", "Blast_Date=undated"]
+    assert out["SDI"].tolist() == [1.0, 2.0, 4.0, 4.0, 3.0]
+    day = tio.read_table(root, filters=[("Blast_Date", "=", "2024-03-02")])
+    assert len(day) == 2
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from raster_sampling import ArrayGrid, inv_geotransform, sample_grid
+
+GT = (1000.0, 10.0, 0.0, 5000.0, 0.0, -10.0)
+
+
+def test_sample_grid_nearest_and_bilinear():
+    arr = np.arange(20.0).reshape(4, 5)
+    inv = inv_geotransform(GT)
+    xs = np.array([1005.0, 1045.0, 900.0, 1010.0])
+    ys = np.array([4995.0, 4965.0, 4995.0, 4990.0])
+    near = sample_grid(ArrayGrid(arr), inv, xs, ys)
+    np.testing.assert_array_equal(near[:2], [arr[0, 0], arr[3, 4]])
+    assert np.isnan(near[2])
+    # Corner shared by four cell centres → their mean
+    bil = sample_grid(ArrayGrid(arr), inv, xs[3:], ys[3:], method="bilinear")
+    assert bil[0] == pytest.approx(arr[:2, :2].mean())
+
+
+def test_terrain_rdi_matches_shipped_table():
+    import os
+    import pandas as pd
+    from conftest import ROOT, TABLES_DIR
+    from terrain_rdi_from_slope import terrain_rdi
+
+    ref = pd.read_csv(os.path.join(TABLES_DIR, "module3_rdi_terrain.csv"))
+    df = pd.read_csv(os.path.join(ROOT, "data", "Bhavani_Sagar_Controlled_Blasting_Dataset_DEMOcoords.csv"))
+    df, missing = terrain_rdi(df, ref["Slope_deg"].to_numpy(float))
+    assert missing == 0
+    np.testing.assert_allclose(df["RDI"], ref["RDI"], rtol=1e-12)
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+import terrain_parallel as tp
+from terrain_engine import bvii_from_layers, distance_to_cell, horn_slope, ppv_from_distance
+
+GT = (1000.0, 10.0, 0.0, 5000.0, 0.0, -10.0)
+
+
+def test_parallel_matches_serial(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    dem = rng.uniform(100.0, 200.0, (70, 90))
+    dam_rc = (30, 40)
+    written = {}
+    monkeypatch.setattr(tp, "write_raster",
+                        lambda path, arr, gt, proj: written.__setitem__(path, np.array(arr)))
+
+    scenarios = tp.scenario_grid([25.0, 100.0], Ks=(1140.0,), alphas=(1.3, 1.6))
+    dirs = tp.run_parallel(dem, GT, "", dam_rc, str(tmp_path), scenarios, tile=32, max_workers=2)
+    assert len(dirs) == len(scenarios)
+
+    slope = horn_slope(dem, GT)
+    dist = distance_to_cell(dem.shape, GT, *dam_rc)
+    for sc, d in zip(scenarios, dirs):
+        ppv = ppv_from_distance(dist, W=sc["W_charge_kg"], K=sc["K"], alpha=sc["alpha"])
+        bvii = bvii_from_layers(ppv, dist, slope)
+        np.testing.assert_allclose(written[os.path.join(d, "ppv_est.tif")], ppv, rtol=1e-6)
+        np.testing.assert_allclose(written[os.path.join(d, "bvii.tif")], bvii, rtol=1e-6, atol=1e-7)
@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import waveform_ingest as wi
+
+FS = 1000.0
+
+
+def _burst(carrier_hz, width_s, n=2, ns=1000, offset=0.5):
+    t = np.arange(ns) / FS
+    v = np.full((n, 3, ns), offset, dtype=np.float32)
+    pulse = 10.0 * np.exp(-((t - 0.3) / width_s) ** 2)
+    if carrier_hz:
+        pulse *= np.cos(2 * np.pi * carrier_hz * (t - 0.3))
+    v[:, 1] += pulse.astype(np.float32)
+    return v, np.abs(pulse).max()
+
+
+def test_offset_removed_without_pretrigger():
+    # One-sided pulse: the whole-trace mean would include it and cut the peak
+    v, peak = _burst(0.0, 0.05)
+    np.testing.assert_allclose(wi.trace_metrics(v, FS)["PPV_mm_per_s"], peak, rtol=1e-3)
+
+
+def test_dominant_frequency():
+    v, _ = _burst(40.0, 0.02)
+    np.testing.assert_allclose(wi.trace_metrics(v, FS)["Dominant_Freq_Hz"], 40.0, atol=1.0)
+
+
+def test_unequal_parquet_traces_rejected(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa.table({
+        wi.BLAST_ROW_COL: [0, 1],
+        **{a: [[0.0, 1.0, 2.0], [0.0, 1.0]] for a in wi.AXES},
+    })
+    path = str(tmp_path / "w.parquet")
+    pq.write_table(table, path)
+    (tmp_path / "w.json").write_text(json.dumps({"sample_rate_hz": FS}))
+    with pytest.raises(ValueError, match="unequal length"):
+        wi.ingest_file(path)
+
+
+def test_apply_touches_only_metric_columns():
+    df = pd.DataFrame({"PPV_mm_per_s": [1.0, 2.0, 3.0], "Site": ["a", "b", "c"], "Holes": [4, 5, 6]})
+    metrics = pd.DataFrame({wi.BLAST_ROW_COL: [1], "PPV_mm_per_s": [9.0], "Waveform_File": ["x.npy"]})
+    dtypes = df.dtypes.copy()
+    df, n = wi.apply_to_blasts(df, metrics)
+    assert n == 1
+    assert list(df["PPV_mm_per_s"]) == [1.0, 9.0, 3.0]
+    assert df["Site"].dtype == dtypes["Site"] and df["Holes"].dtype == dtypes["Holes"]
+
+
+def test_time_to_peak_counts_from_trigger():
+    ns, pre = 1000, 100
+    v = np.full((2, 3, ns), 0.5, dtype=np.float32)
+    v[:, 2, 400] += 8.0
+    m = wi.trace_metrics(v, FS, pretrigger=pre)
+    np.testing.assert_allclose(m["Time_to_Peak_ms"], (400 - pre) * 1000.0 / FS)
+    np.testing.assert_allclose(m["PPV_mm_per_s"], 8.0, rtol=1e-6)
+    np.testing.assert_allclose(m["PPV_L_mm_per_s"], 8.0, rtol=1e-6)
+
+
+@pytest.mark.parametrize("ext", [".npy", ".bin"])
+def test_binary_files_are_read_in_chunks(tmp_path, ext):
+    v, peak = _burst(0.0, 0.05, n=5)
+    path = str(tmp_path / f"w{ext}")
+    meta = {"sample_rate_hz": FS, "n_samples": v.shape[-1], "dtype": "float32", "blast_rows": [4, 3, 2, 1, 0]}
+    if ext == ".npy":
+        np.save(path, v)
+    else:
+        v.tofile(path)
+    (tmp_path / "w.json").write_text(json.dumps(meta))
+
+    df = wi.ingest_file(path, chunk=2)
+    assert list(df[wi.BLAST_ROW_COL]) == [4, 3, 2, 1, 0]
+    np.testing.assert_allclose(df["PPV_mm_per_s"], peak, rtol=1e-3)
+
+    meta["blast_rows"] = [0, 1, 2]
+    (tmp_path / "w.json").write_text(json.dumps(meta))
+    with pytest.raises(ValueError, match="5 traces but 3 blast_rows"):
+        wi.ingest_file(path)